@@ -4,3 +4,26 @@ from django.apps import AppConfig
 class ApiConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'api'
+
+    def ready(self):
+        from django.contrib.auth import get_user_model
+        from django.db.models.signals import post_delete, post_save, pre_delete
+
+        from .authentication import invalidate_user_status
+        from .models import Annotation, Project
+        from .readcache import project_changed
+        from .stats import annotation_deleted, annotation_saved, project_deleting
+
+        from . import checks  # noqa: F401  (enregistre les vérifications de manage.py check)
+
+        # Une désactivation ou une suppression révoque immédiatement les jetons sur ce processus
+        User = get_user_model()
+        post_save.connect(invalidate_user_status, sender=User, dispatch_uid='api_user_status_save')
+        post_delete.connect(invalidate_user_status, sender=User, dispatch_uid='api_user_status_delete')
+        # Cache de lecture : détail du projet et liste de son propriétaire, après le commit
+        post_save.connect(project_changed, sender=Project, dispatch_uid='api_read_cache_project_save')
+        post_delete.connect(project_changed, sender=Project, dispatch_uid='api_read_cache_project_delete')
+        # Compteurs de UserWorkspaceStats, mis à jour dans la transaction de l'écriture
+        pre_delete.connect(project_deleting, sender=Project, dispatch_uid='api_stats_project_delete')
+        post_save.connect(annotation_saved, sender=Annotation, dispatch_uid='api_stats_annotation_save')
+        post_delete.connect(annotation_deleted, sender=Annotation, dispatch_uid='api_stats_annotation_delete')
@@ -0,0 +1,153 @@
+import json
+
+from asgiref.sync import sync_to_async
+from django.http import HttpResponse
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework import status
+from rest_framework.exceptions import (
+    APIException, NotAuthenticated, NotFound, ParseError, AuthenticationFailed, Throttled,
+)
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework_simplejwt.exceptions import InvalidToken
+
+from .authentication import CookieJWTAuthentication
+from .conditional import has_validators, set_validators, conditional_response
+from . import readcache
+from .models import Project
+from .pagination import ProjectCursorPagination
+from .serializers import ProjectSerializer, ProjectSummarySerializer
+from .throttling import bucket_wait, user_key
+from .views import ProjectViewSet, create_annotation, save_project_update
+
+# Les méthodes moins sollicitées restent servies par les vues DRF synchrones
+project_list_view = ProjectViewSet.as_view({'get': 'list', 'post': 'create'})
+project_detail_view = ProjectViewSet.as_view({
+    'get': 'retrieve', 'put': 'update', 'patch': 'partial_update', 'delete': 'destroy',
+})
+
+
+def render(data, status_code=status.HTTP_200_OK):
+    return HttpResponse(JSONRenderer().render(data), status=status_code, content_type='application/json')
+
+
+def render_error(exc):
+    response = render({'detail': exc.detail}, exc.status_code)
+    if getattr(exc, 'wait', None):
+        response['Retry-After'] = str(int(exc.wait))
+    return response
+
+
+async def get_user(request):
+    """Équivalent asynchrone de CookieJWTAuthentication : retourne None sans cookie d'accès."""
+    authentication = CookieJWTAuthentication()
+    raw_token = authentication.get_raw_token(request)
+    if raw_token is None:
+        return None
+    try:
+        token = authentication.get_validated_token(raw_token)
+        return await sync_to_async(authentication.get_user)(token)
+    except (InvalidToken, AuthenticationFailed):
+        raise AuthenticationFailed('Token invalide ou expiré')
+
+
+def parse_body(request):
+    try:
+        return json.loads(request.body or b'{}')
+    except ValueError:
+        raise ParseError()
+
+
+@csrf_exempt
+async def project_list(request):
+    if request.method != 'GET':
+        return await sync_to_async(project_list_view)(request)
+    try:
+        user = await get_user(request)
+        queryset = Project.objects.none()
+        if user is not None:
+            queryset = Project.objects.filter(user=user).defer('editor_content').order_by('-created_at')
+        paginator = ProjectCursorPagination()
+        page = await sync_to_async(paginator.paginate_queryset)(queryset, Request(request))
+    except APIException as exc:
+        return render_error(exc)
+    return render(paginator.get_paginated_response(ProjectSummarySerializer(page, many=True).data).data)
+
+
+@csrf_exempt
+async def project_detail(request, pk):
+    if request.method not in ('GET', 'PUT', 'PATCH'):
+        return await sync_to_async(project_detail_view)(request, pk=pk)
+    try:
+        user = await get_user(request)
+        if request.method == 'GET':
+            if user is None:
+                raise NotFound()
+            cache = readcache.get_cache() if readcache.enabled() else None
+            if cache is not None:
+                key = readcache.project_key(pk)
+                version, entry = await sync_to_async(cache.get)('project', key)
+                if entry is not None and entry['user_id'] == user.pk:
+                    validators = entry['validators']
+                    return (
+                        conditional_response(request, validators)
+                        or set_validators(render(entry['data']), validators)
+                    )
+            queryset = Project.objects.filter(user=user)
+            conditional = has_validators(request)
+            if conditional:
+                queryset = queryset.defer('editor_content')
+            try:
+                project = await queryset.aget(pk=pk)
+            except Project.DoesNotExist:
+                raise NotFound()
+            response = conditional_response(request, project)
+            if response is not None:
+                return response
+            if conditional:
+                await project.arefresh_from_db(fields=['editor_content'])
+            elif project.chunked:
+                # Les morceaux d'un contenu découpé sont lus au premier accès, hors de la boucle d'événements
+                await sync_to_async(lambda: project.editor_content)()
+            data = ProjectSerializer(project).data
+            entry = readcache.project_entry(project, data) if cache is not None else None
+            if entry is not None:
+                await sync_to_async(cache.set)(key, version, entry)
+            return set_validators(render(data), project)
+
+        if user is None:
+            raise NotAuthenticated()
+        data = parse_body(request)
+        return await sync_to_async(update_project)(request, user, pk, data, request.method == 'PATCH')
+    except APIException as exc:
+        return render_error(exc)
+
+
+def update_project(request, user, pk, data, partial):
+    # Même limite que ProjectViewSet pour les sauvegardes
+    wait = bucket_wait(ProjectViewSet.throttle_scope, user_key(user))
+    if wait:
+        raise Throttled(wait)
+    project = Project.objects.filter(user=user, pk=pk).defer('editor_content').first()
+    if project is None:
+        return render({'detail': NotFound.default_detail}, status.HTTP_404_NOT_FOUND)
+    serializer = ProjectSerializer(project, data=data, partial=partial)
+    if not serializer.is_valid():
+        return render(serializer.errors, status.HTTP_400_BAD_REQUEST)
+    project = save_project_update(serializer, user, request)
+    return set_validators(render(serializer.data), project)
+
+
+@csrf_exempt
+async def add_annotation(request):
+    if request.method != 'POST':
+        return render({'detail': 'Méthode non autorisée'}, status.HTTP_405_METHOD_NOT_ALLOWED)
+    try:
+        user = await get_user(request)
+        data = parse_body(request)
+    except APIException as exc:
+        return render_error(exc)
+
+    # Même validation et même construction que la vue synchrone, en un seul passage dans le fil des vues
+    body, status_code = await sync_to_async(create_annotation)(data, user)
+    return render(body, status_code)
@@ -1,6 +1,52 @@
 from rest_framework_simplejwt.authentication import JWTAuthentication
 from rest_framework_simplejwt.exceptions import InvalidToken, AuthenticationFailed
+from rest_framework_simplejwt.settings import api_settings
 from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+from channels.db import database_sync_to_async
+from channels.middleware import BaseMiddleware
+
+# Durée pendant laquelle le statut actif d'un utilisateur est réutilisé sans requête
+USER_STATUS_TTL = getattr(settings, 'JWT_USER_STATUS_TTL', 60)
+
+
+def _status_key(user_id):
+    return f'auth:user-active:{user_id}'
+
+
+def is_user_active(user_id):
+    """Statut actif de l'utilisateur, mis en cache ; un utilisateur supprimé est considéré comme révoqué."""
+    key = _status_key(user_id)
+    active = cache.get(key)
+    if active is None:
+        User = get_user_model()
+        active = bool(User.objects.filter(pk=user_id).values_list('is_active', flat=True).first())
+        cache.set(key, active, USER_STATUS_TTL)
+    return active
+
+
+def invalidate_user_status(sender, instance, **kwargs):
+    cache.delete(_status_key(instance.pk))
+
+
+def token_user(validated_token):
+    """Utilisateur construit à partir des claims du jeton, sans requête.
+
+    Les champs absents du jeton sont différés : ils ne sont chargés que si une vue y accède.
+    """
+    User = get_user_model()
+    claims = {
+        User._meta.pk.attname: validated_token[api_settings.USER_ID_CLAIM],
+        User.USERNAME_FIELD: validated_token['username'],
+        'is_active': True,
+    }
+    # from_db attend les valeurs dans l'ordre des champs du modèle
+    fields = [field.attname for field in User._meta.concrete_fields if field.attname in claims]
+    return User.from_db(DEFAULT_DB_ALIAS, fields, [claims[field] for field in fields])
+
 
 class CookieJWTAuthentication(JWTAuthentication):
     def get_raw_token(self, request):
@@ -17,3 +63,32 @@ class CookieJWTAuthentication(JWTAuthentication):
             raise AuthenticationFailed('Token invalide ou expiré') from e
 
         return self.get_user(validated_token), validated_token
+
+    def get_user(self, validated_token):
+        # Les jetons sans nom d'utilisateur (émis hors de MyTokenObtainPairSerializer) passent par la base
+        if not getattr(settings, 'JWT_STATELESS_USER', False) or 'username' not in validated_token:
+            return super().get_user(validated_token)
+        if api_settings.USER_ID_CLAIM not in validated_token:
+            raise InvalidToken("Le jeton ne contient pas d'identifiant utilisateur")
+        if not is_user_active(validated_token[api_settings.USER_ID_CLAIM]):
+            raise AuthenticationFailed('Utilisateur inactif ou supprimé')
+        return token_user(validated_token)
+
+
+class CookieJWTAuthMiddleware(BaseMiddleware):
+    """Authentifie les connexions WebSocket à partir du cookie JWT, comme CookieJWTAuthentication."""
+
+    async def __call__(self, scope, receive, send):
+        scope = dict(scope)
+        scope['user'] = await database_sync_to_async(self.get_user)(scope)
+        return await super().__call__(scope, receive, send)
+
+    def get_user(self, scope):
+        raw_token = scope.get('cookies', {}).get(settings.SIMPLE_JWT['AUTH_COOKIE'])
+        if raw_token is None:
+            return AnonymousUser()
+        authentication = CookieJWTAuthentication()
+        try:
+            return authentication.get_user(authentication.get_validated_token(raw_token))
+        except (InvalidToken, AuthenticationFailed):
+            return AnonymousUser()
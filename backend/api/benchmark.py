@@ -0,0 +1,1454 @@
+import asyncio
+import gc
+import http.client
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from http.cookies import SimpleCookie
+from urllib.parse import urlencode, urlsplit
+
+import django
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser, User
+from django.core.cache import caches
+from django.db import connection, connections
+from django.db.backends.signals import connection_created
+from django.db.models.functions import Length
+from django.test import Client, RequestFactory
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.utils import timezone
+
+from . import lexical
+from .authentication import CookieJWTAuthentication, invalidate_user_status
+from .jobs import Worker, enqueue_once
+from .jsonpatch import apply_patch
+from .metrics import count_query
+from .models import Annotation, Job, Project, ProjectDerivedData, Text, UserWorkspaceStats
+from .revisions import reconstruct_content, record_revision
+from .serializers import MyTokenObtainPairSerializer, ProjectSerializer
+from .throttling import LOCAL_MAX_BUCKETS, BucketThrottle, CacheBucketStore, LocalBucketStore, parse_rate
+from .views import save_project_update
+from .workspace import WorkspaceImporter
+
+# Les comptes de mesure sont reconnaissables à leur préfixe et remplacés à chaque génération
+USER_PREFIX = 'bench_'
+PASSWORD = 'Bench-mesure-1!'
+WORDS = (
+    'le la les un une des du de et à en dans pour par sur avec sans sous vers chez nuit jour scène '
+    'acte porte fenêtre regard voix silence lettre maison rue ville mer ciel temps main cœur parole'
+).split()
+PERCENTILES = (50, 90, 95, 99)
+# Annotations envoyées par requête d'import en lot
+BULK_BATCH = 500
+
+
+def _sentence(rng, words):
+    return ' '.join(rng.choice(WORDS) for _ in range(words)).capitalize() + '.'
+
+
+def _text(text):
+    return {'type': 'text', 'text': text, 'format': 0, 'detail': 0, 'mode': 'normal', 'style': '', 'version': 1}
+
+
+def lexical_document(rng, size_kb, comments=0):
+    """Document Lexical d'environ `size_kb` Ko : titres, paragraphes et `comments` nœuds de commentaire.
+
+    Chaque bloc commence par un nœud texte, que le scénario d'autosauvegarde modifie.
+    """
+    blocks = []
+    size = 0
+    while size < size_kb * 1024 or not blocks:
+        if len(blocks) % 40 == 0:
+            block = {'type': 'heading', 'tag': 'h2', 'children': [_text(f'Scène {len(blocks) // 40 + 1}')]}
+        else:
+            block = {'type': 'paragraph', 'children': [_text(_sentence(rng, rng.randint(20, 80)))]}
+        block.update({'direction': 'ltr', 'format': '', 'indent': 0, 'version': 1})
+        blocks.append(block)
+        size += len(json.dumps(block, ensure_ascii=False))
+
+    paragraphs = [block for block in blocks if block['type'] == 'paragraph']
+    for block in rng.sample(paragraphs, min(comments, len(paragraphs))):
+        block['children'].append({
+            'type': 'comment',
+            'uuid': f'{rng.getrandbits(64):016x}',
+            'comments': [{'author': 'bench', 'content': _sentence(rng, 8)}],
+            'children': [_text(_sentence(rng, 4))],
+        })
+    return json.dumps(
+        {'root': {'type': 'root', 'children': blocks, 'direction': 'ltr', 'format': '', 'indent': 0, 'version': 1}},
+        ensure_ascii=False, separators=(',', ':'),
+    )
+
+
+def seed(users=5, projects=10, doc_kb=50, comments=5, annotations=20, random_seed=0, allow_destructive=False):
+    """Génère un jeu de données reproductible ; les comptes de mesure précédents sont supprimés.
+
+    La suppression s'applique à la base configurée : hors DEBUG, elle doit être autorisée explicitement.
+    """
+    if not (settings.DEBUG or allow_destructive):
+        raise ValueError(
+            f"La génération supprime les comptes {USER_PREFIX}* de la base {connection.settings_dict['NAME']} "
+            "et leurs données : refusée hors DEBUG sans autorisation explicite"
+        )
+    rng = random.Random(random_seed)
+    User.objects.filter(username__startswith=USER_PREFIX).delete()
+    counts = {'users': 0, 'projects': 0, 'annotations': 0}
+    for user_index in range(users):
+        user = User.objects.create_user(
+            f'{USER_PREFIX}{user_index}', f'{USER_PREFIX}{user_index}@example.com', PASSWORD,
+        )
+        counts['users'] += 1
+        for project_index in range(projects):
+            content = lexical_document(rng, doc_kb, comments)
+            # save() calcule résumé, index des commentaires et données dérivées comme en production
+            project = Project.objects.create(
+                user=user, title=f'Projet {project_index + 1}', description=_sentence(rng, 12),
+                editor_content=content,
+            )
+            counts['projects'] += 1
+            if not annotations:
+                continue
+            texts = Text.objects.bulk_create([Text(content=_sentence(rng, 6)) for _ in range(annotations)])
+            created = Annotation.objects.bulk_create([
+                Annotation(
+                    user=user, project=project, text=text, title=_sentence(rng, 3)[:255],
+                    description=_sentence(rng, 15), start_index=start, end_index=start + len(text.content),
+                    selected_text=text.content,
+                )
+                for text, start in zip(texts, sorted(rng.randrange(len(content) // 2) for _ in texts))
+            ])
+            Annotation.objects.filter(id__in=[annotation.id for annotation in created]).update_search_vectors()
+            counts['annotations'] += len(created)
+    return counts
+
+
+class LiveResponse:
+    def __init__(self, status_code, content):
+        self.status_code = status_code
+        self.content = content
+
+    def json(self):
+        return json.loads(self.content)
+
+
+class LiveClient:
+    """Client HTTP vers un serveur lancé à part (gunicorn, uvicorn), avec l'interface utile de django.test.Client.
+
+    La connexion est gardée ouverte entre deux requêtes, comme celle d'un navigateur.
+    """
+
+    def __init__(self, url):
+        parts = urlsplit(url)
+        self.connection_class = http.client.HTTPSConnection if parts.scheme == 'https' else http.client.HTTPConnection
+        self.netloc = parts.netloc
+        self.prefix = parts.path.rstrip('/')
+        self.cookies = SimpleCookie()
+        self.connection = None
+
+    def request(self, method, path, data=None, content_type=None):
+        body = None
+        headers = {}
+        if data is not None and method == 'GET':
+            path = f'{path}?{urlencode(data)}'
+        elif data is not None:
+            body = json.dumps(data, ensure_ascii=False).encode('utf-8')
+            headers['Content-Type'] = content_type or 'application/json'
+        if self.cookies:
+            headers['Cookie'] = '; '.join(f'{name}={morsel.value}' for name, morsel in self.cookies.items())
+        for attempt in range(2):
+            if self.connection is None:
+                self.connection = self.connection_class(self.netloc, timeout=60)
+            try:
+                self.connection.request(method, self.prefix + path, body=body, headers=headers)
+                response = self.connection.getresponse()
+                content = response.read()
+                break
+            except (http.client.HTTPException, ConnectionError):
+                # Connexion fermée par le serveur entre deux requêtes : une seule nouvelle tentative
+                self.connection.close()
+                self.connection = None
+                if attempt:
+                    raise
+        for header in response.headers.get_all('Set-Cookie') or []:
+            self.cookies.load(header)
+        return LiveResponse(response.status, content)
+
+    def get(self, path, data=None):
+        return self.request('GET', path, data)
+
+    def post(self, path, data=None, content_type=None):
+        return self.request('POST', path, data, content_type)
+
+    def patch(self, path, data=None, content_type=None):
+        return self.request('PATCH', path, data, content_type)
+
+    def close(self):
+        if self.connection is not None:
+            self.connection.close()
+
+
+class Session:
+    """État d'un fil de mesure : client HTTP authentifié, utilisateur et projets de cet utilisateur.
+
+    Sans `url`, les requêtes sont servies dans le processus par le client de test de Django.
+    """
+
+    def __init__(self, user, url=None):
+        self.user = user
+        self.url = url
+        self.client = LiveClient(url) if url else Client()
+        self.anonymous_client = LiveClient(url) if url else None
+        token = MyTokenObtainPairSerializer.get_token(user)
+        self.refresh_token = str(token)
+        self.client.cookies[settings.SIMPLE_JWT['AUTH_COOKIE']] = str(token.access_token)
+        self.projects = list(Project.objects.filter(user=user).order_by('id').values_list('id', 'revision'))
+        self.revisions = dict(self.projects)
+        self.rng = random.Random(user.pk)
+        self.documents = {}
+
+    def anonymous(self):
+        """Client sans cookie ; en mesure sur serveur, sa connexion est réutilisée."""
+        if self.anonymous_client is None:
+            return Client()
+        self.anonymous_client.cookies.clear()
+        return self.anonymous_client
+
+    def close(self):
+        if self.url:
+            self.client.close()
+            self.anonymous_client.close()
+
+    def project(self, index):
+        return self.projects[index % len(self.projects)][0]
+
+    def document(self, project_id):
+        """Contenu du projet tel que l'éditeur le garde en mémoire, lu une seule fois."""
+        if project_id not in self.documents:
+            self.documents[project_id] = json.loads(Project.objects.get(pk=project_id).editor_content)
+        return self.documents[project_id]
+
+
+def scenario_login(session, index):
+    return session.anonymous().post(
+        '/api/auth/login/', {'username': session.user.username, 'password': PASSWORD}, content_type='application/json',
+    )
+
+
+def scenario_refresh(session, index):
+    response = session.client.post(
+        '/api/auth/token/refresh/', {'refresh': session.refresh_token}, content_type='application/json',
+    )
+    # Avec la rotation, chaque jeton de rafraîchissement ne sert qu'une fois
+    if response.status_code == 200 and 'refresh' in response.json():
+        session.refresh_token = response.json()['refresh']
+    return response
+
+
+def scenario_project_list(session, index):
+    return session.client.get('/api/projects/')
+
+
+def scenario_user_project_list(session, index):
+    # Liste publique d'un utilisateur, lue sans authentification
+    return session.anonymous().get(f'/api/projects/user/{session.user.pk}/')
+
+
+def scenario_search(session, index):
+    # Deux noms du vocabulaire du jeu de données : beaucoup de projets correspondent, le classement compte
+    terms = ' '.join(session.rng.sample(WORDS[-20:], 2))
+    return session.client.get('/api/search/', {'q': terms})
+
+
+def scenario_project_open(session, index):
+    return session.client.get(f'/api/projects/{session.project(index)}/')
+
+
+def scenario_autosave(session, index):
+    # Même forme que l'éditeur : patch JSON d'un bloc sur la dernière révision connue
+    project_id = session.project(index)
+    block = session.rng.randrange(20)
+    response = session.client.patch(
+        f'/api/projects/{project_id}/content/',
+        {
+            'base_revision': session.revisions[project_id],
+            'patch': [{
+                'op': 'replace', 'path': f'/root/children/{block}/children/0/text',
+                'value': _sentence(session.rng, 30),
+            }],
+        },
+        content_type='application/json',
+    )
+    if response.status_code == 200:
+        session.revisions[project_id] = response.json()['revision']
+    return response
+
+
+def scenario_project_save(session, index):
+    # Sauvegarde complète du document, pour comparer avec le patch d'autosave_insert
+    project_id = session.project(index)
+    document = session.document(project_id)
+    block = session.rng.randrange(20)
+    document['root']['children'][block]['children'][0]['text'] = _sentence(session.rng, 30)
+    return session.client.patch(
+        f'/api/projects/{project_id}/',
+        {'editor_content': json.dumps(document, ensure_ascii=False, separators=(',', ':'))},
+        content_type='application/json',
+    )
+
+
+def scenario_autosave_insert(session, index):
+    # Nouveau paragraphe au milieu du document : le patch ne contient que ce bloc
+    project_id = session.project(index)
+    document = session.document(project_id)
+    children = document['root']['children']
+    block = {'type': 'paragraph', 'children': [_text(_sentence(session.rng, 30))]}
+    block.update({'direction': 'ltr', 'format': '', 'indent': 0, 'version': 1})
+    position = len(children) // 2
+    children.insert(position, block)
+    response = session.client.patch(
+        f'/api/projects/{project_id}/content/',
+        {
+            'base_revision': session.revisions[project_id],
+            'patch': [{'op': 'add', 'path': f'/root/children/{position}', 'value': block}],
+        },
+        content_type='application/json',
+    )
+    if response.status_code == 200:
+        session.revisions[project_id] = response.json()['revision']
+    return response
+
+
+def scenario_annotation_create(session, index):
+    start = session.rng.randrange(1000)
+    return session.client.post(
+        '/api/texts/add-annotation/',
+        {
+            'title': _sentence(session.rng, 3), 'description': _sentence(session.rng, 12),
+            'selectedText': _sentence(session.rng, 5), 'start_index': start, 'end_index': start + 30,
+            'project': session.project(index),
+        },
+        content_type='application/json',
+    )
+
+
+def scenario_annotation_bulk(session, index):
+    project_id = session.project(index)
+    items = []
+    for _ in range(BULK_BATCH):
+        start = session.rng.randrange(1000)
+        items.append({
+            'title': _sentence(session.rng, 3), 'description': _sentence(session.rng, 12),
+            'selectedText': _sentence(session.rng, 5), 'start_index': start, 'end_index': start + 30,
+            'project': project_id,
+        })
+    return session.client.post('/api/texts/add-annotations/', items, content_type='application/json')
+
+
+SCENARIOS = {
+    'login': scenario_login,
+    'refresh': scenario_refresh,
+    'project_list': scenario_project_list,
+    'user_project_list': scenario_user_project_list,
+    'search': scenario_search,
+    'project_open': scenario_project_open,
+    'autosave': scenario_autosave,
+    'autosave_insert': scenario_autosave_insert,
+    'project_save': scenario_project_save,
+    'annotation_create': scenario_annotation_create,
+    'annotation_bulk': scenario_annotation_bulk,
+}
+# Objets créés par requête, pour les parcours dont le débit se compte en objets par seconde
+SCENARIO_ITEMS = {'annotation_bulk': BULK_BATCH}
+
+
+class CollabEditor:
+    """Éditeur simulé : applique les mises à jour reçues et garde au plus un patch en attente."""
+
+    def __init__(self, connection, rng):
+        self.connection = connection
+        self.rng = rng
+        self.document = None
+        self.seq = 0
+        self.latencies = []
+        self.resyncs = 0
+        self.errors = 0
+        self.received = 0
+
+    def handle(self, message):
+        """Applique un message reçu ; vrai s'il répond au patch en attente."""
+        self.received += 1
+        if message['type'] in ('init', 'resync'):
+            self.document, self.seq = message['document'], message['seq']
+            self.resyncs += message['type'] == 'resync'
+            return True
+        if message['type'] == 'update':
+            self.document = apply_patch(self.document, message['patch'])
+            self.seq = message['seq']
+            return message['own']
+        if message['type'] == 'error':
+            self.errors += 1
+            return True
+        return False
+
+    async def receive(self):
+        while not self.handle(await self.connection.receive()):
+            pass
+
+    def patch(self):
+        children = self.document['root']['children']
+        choice = self.rng.random()
+        block = {'type': 'paragraph', 'children': [_text(_sentence(self.rng, 12))]}
+        if choice < 0.15 or not children:
+            return [{'op': 'add', 'path': f'/root/children/{self.rng.randint(0, len(children))}', 'value': block}]
+        index = self.rng.randrange(len(children))
+        if choice < 0.25 and len(children) > 5:
+            return [{'op': 'remove', 'path': f'/root/children/{index}'}]
+        return [{'op': 'replace', 'path': f'/root/children/{index}', 'value': block}]
+
+    async def run(self, updates, interval):
+        await self.receive()
+        for _ in range(updates):
+            start = time.perf_counter()
+            await self.connection.send({'type': 'update', 'base': self.seq, 'patch': self.patch()})
+            await self.receive()
+            self.latencies.append((time.perf_counter() - start) * 1000)
+            if interval:
+                await asyncio.sleep(interval)
+
+
+class _Communicator:
+    """Connexion en processus, sur l'application ASGI sans serveur."""
+
+    def __init__(self, path, headers):
+        from channels.testing import WebsocketCommunicator
+
+        from scriptalium.asgi import application
+
+        self.communicator = WebsocketCommunicator(application, path, headers=headers)
+
+    async def open(self):
+        connected, code = await self.communicator.connect(timeout=10)
+        if not connected:
+            raise ValueError(f"Connexion WebSocket refusée ({code})")
+
+    async def send(self, message):
+        await self.communicator.send_json_to(message)
+
+    async def receive(self):
+        return await self.communicator.receive_json_from(timeout=30)
+
+    async def close(self):
+        await self.communicator.disconnect()
+
+
+class _WebSocket:
+    """Connexion à un serveur lancé à part (uvicorn ou gunicorn)."""
+
+    def __init__(self, url, headers):
+        self.url = url
+        self.headers = headers
+
+    async def open(self):
+        from websockets.asyncio.client import connect
+
+        self.socket = await connect(
+            self.url, additional_headers=[(name.decode(), value.decode()) for name, value in self.headers],
+            max_size=None,
+        )
+
+    async def send(self, message):
+        await self.socket.send(json.dumps(message))
+
+    async def receive(self):
+        return json.loads(await asyncio.wait_for(self.socket.recv(), 30))
+
+    async def close(self):
+        await self.socket.close()
+
+
+def collab_run(editors=50, updates=20, interval=0.0, url=None, project_id=None):
+    """Édition simultanée d'un même projet par `editors` connexions WebSocket.
+
+    Sans `url`, les connexions sont ouvertes en processus sur l'application ASGI. Retourne débit,
+    latence entre l'envoi d'un patch et sa diffusion à son auteur, et convergence des documents.
+    """
+    user = User.objects.filter(username__startswith=USER_PREFIX).order_by('id').first()
+    project = Project.objects.filter(user=user).order_by('id').first() if project_id is None else (
+        Project.objects.filter(pk=project_id).first()
+    )
+    if project is None:
+        raise ValueError("Aucun projet de mesure : lancer seed_benchmark")
+    token = MyTokenObtainPairSerializer.get_token(project.user).access_token
+    headers = [
+        (b'cookie', f"{settings.SIMPLE_JWT['AUTH_COOKIE']}={token}".encode()),
+        (b'origin', settings.CORS_ALLOWED_ORIGINS[0].encode()),
+    ]
+    path = f'/ws/projects/{project.pk}/'
+    revision = project.revision
+
+    async def main():
+        sockets = [
+            _WebSocket(url.rstrip('/') + path, headers) if url else _Communicator(path, headers)
+            for _ in range(editors)
+        ]
+        for socket in sockets:
+            await socket.open()
+        clients = [CollabEditor(socket, random.Random(index)) for index, socket in enumerate(sockets)]
+        start = time.perf_counter()
+        await asyncio.gather(*(client.run(updates, interval) for client in clients))
+        duration = time.perf_counter() - start
+        # Laisser arriver les dernières diffusions avant de comparer les documents
+        final_seq = max(client.seq for client in clients)
+        for client in clients:
+            while client.seq < final_seq:
+                client.handle(await client.connection.receive())
+        documents = {json.dumps(client.document, sort_keys=True) for client in clients}
+        for socket in sockets:
+            await socket.close()
+        return clients, duration, len(documents) == 1, final_seq
+
+    clients, duration, converged, final_seq = async_to_sync(main)()
+    latencies = sorted(value for client in clients for value in client.latencies)
+    sent = len(latencies)
+    return {
+        'editors': editors,
+        'updates': sent,
+        'committed_seq': final_seq,
+        'duration_s': round(duration, 3),
+        'updates_per_s': round(sent / duration, 1) if duration else None,
+        'messages_delivered_per_s': round(sum(client.received for client in clients) / duration, 1),
+        'latency_ms': {
+            **{f'p{rank}': round(percentile(latencies, rank), 2) if latencies else None for rank in PERCENTILES},
+            'max': round(latencies[-1], 2) if latencies else None,
+        },
+        'resyncs': sum(client.resyncs for client in clients),
+        'errors': sum(client.errors for client in clients),
+        'converged': converged,
+        'compactions': Project.objects.get(pk=project.pk).revision - revision,
+    }
+
+
+def percentile(values, rank):
+    """Percentile au rang le plus proche d'une liste triée."""
+    if not values:
+        return None
+    return values[min(len(values) - 1, max(0, round(rank / 100 * len(values)) - 1))]
+
+
+def distribution(values):
+    """Moyenne, percentiles et maximum d'une série de mesures."""
+    values = sorted(values)
+    return {
+        'mean': round(sum(values) / len(values), 2) if values else None,
+        **{f'p{rank}': round(percentile(values, rank), 2) if values else None for rank in PERCENTILES},
+        'max': round(values[-1], 2) if values else None,
+    }
+
+
+def summarize(latencies, queries, errors, duration):
+    result = {
+        'requests': len(latencies),
+        'errors': errors,
+        'duration_s': round(duration, 3),
+        'throughput_rps': round(len(latencies) / duration, 1) if duration else None,
+        'latency_ms': distribution(latencies),
+        'queries': {
+            'mean': round(sum(queries) / len(queries), 2) if queries else None,
+            'max': max(queries) if queries else None,
+        },
+    }
+    return result
+
+
+def _worker(scenario, session, count, warmup, results, index):
+    latencies = []
+    queries = []
+    errors = 0
+    counter = {'queries': 0}
+
+    def count_queries(execute, sql, params, many, context):
+        counter['queries'] += 1
+        return execute(sql, params, many, context)
+
+    try:
+        with connection.execute_wrapper(count_queries):
+            for number in range(warmup + count):
+                counter['queries'] = 0
+                start = time.perf_counter()
+                response = scenario(session, number)
+                elapsed = (time.perf_counter() - start) * 1000
+                if number < warmup:
+                    continue
+                latencies.append(elapsed)
+                if session.url is None:
+                    # Les requêtes SQL d'un serveur lancé à part ne sont pas visibles d'ici
+                    queries.append(counter['queries'])
+                if response.status_code >= 400:
+                    errors += 1
+    finally:
+        session.close()
+        if threading.current_thread() is not threading.main_thread():
+            connections.close_all()
+    results[index] = (latencies, queries, errors)
+
+
+def run(names, requests=200, concurrency=1, warmup=5, throttle=False, url=None):
+    """Exécute les scénarios demandés, chaque fil avec son propre utilisateur de mesure.
+
+    Les requêtes sont servies dans le processus, ou par le serveur à l'adresse `url` : la limitation
+    de débit est alors celle du serveur.
+    """
+    users = list(User.objects.filter(username__startswith=USER_PREFIX).order_by('id')[:concurrency])
+    if len(users) < concurrency:
+        raise ValueError(
+            f"{concurrency} utilisateurs de mesure requis, {len(users)} disponibles : lancer seed_benchmark"
+        )
+    overrides = {'ALLOWED_HOSTS': [*settings.ALLOWED_HOSTS, 'testserver']}
+    if not throttle:
+        overrides['THROTTLE_BUCKETS'] = {}
+
+    report = {'meta': metadata(requests, concurrency, warmup, throttle, url), 'scenarios': {}}
+    with override_settings(**overrides):
+        for name in names:
+            sessions = [Session(user, url) for user in users]
+            if not all(session.projects for session in sessions):
+                raise ValueError("Les utilisateurs de mesure n'ont aucun projet : lancer seed_benchmark")
+            per_worker = max(1, requests // concurrency)
+            results = [None] * concurrency
+            start = time.perf_counter()
+            if concurrency == 1:
+                _worker(SCENARIOS[name], sessions[0], per_worker, warmup, results, 0)
+            else:
+                threads = [
+                    threading.Thread(
+                        target=_worker, args=(SCENARIOS[name], session, per_worker, warmup, results, index),
+                    )
+                    for index, session in enumerate(sessions)
+                ]
+                for thread in threads:
+                    thread.start()
+                for thread in threads:
+                    thread.join()
+            duration = time.perf_counter() - start
+            latencies = [value for result in results for value in result[0]]
+            queries = [value for result in results for value in result[1]]
+            errors = sum(result[2] for result in results)
+            report['scenarios'][name] = summarize(latencies, queries, errors, duration)
+            if name in SCENARIO_ITEMS and report['scenarios'][name]['throughput_rps'] is not None:
+                report['scenarios'][name]['items_per_s'] = round(
+                    report['scenarios'][name]['throughput_rps'] * SCENARIO_ITEMS[name], 1,
+                )
+    return report
+
+
+def _commit():
+    try:
+        output = subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=settings.BASE_DIR, capture_output=True, text=True, timeout=5,
+        )
+    except (OSError, subprocess.SubprocessError):
+        return None
+    return output.stdout.strip() or None
+
+
+def environment():
+    return {
+        'commit': _commit(),
+        'timestamp': timezone.now().isoformat(),
+        'database': connection.vendor,
+        'python': platform.python_version(),
+        'django': django.get_version(),
+        # En DEBUG, Django garde chaque requête SQL en mémoire : les mesures en sont faussées
+        'debug': settings.DEBUG,
+    }
+
+
+def metadata(requests, concurrency, warmup, throttle, url=None):
+    return {
+        **environment(),
+        'requests': requests,
+        'concurrency': concurrency,
+        'warmup': warmup,
+        'throttle': throttle,
+        'server': url,
+        'dataset': {
+            'users': User.objects.filter(username__startswith=USER_PREFIX).count(),
+            'projects': Project.objects.filter(user__username__startswith=USER_PREFIX).count(),
+            'annotations': Annotation.objects.filter(user__username__startswith=USER_PREFIX).count(),
+        },
+    }
+
+
+def compare(report, baseline):
+    """Lignes (scénario, mesure, référence, valeur, écart en %) entre deux rapports."""
+    rows = []
+    for name, result in report['scenarios'].items():
+        reference = baseline.get('scenarios', {}).get(name)
+        if reference is None:
+            continue
+        for label, path in (
+            ('throughput_rps', ('throughput_rps',)),
+            ('p50_ms', ('latency_ms', 'p50')),
+            ('p95_ms', ('latency_ms', 'p95')),
+            ('queries', ('queries', 'mean')),
+            ('items_per_s', ('items_per_s',)),
+        ):
+            before, after = reference, result
+            for key in path:
+                before, after = before.get(key), after.get(key)
+            if after is None:
+                continue
+            change = round((after - before) / before * 100, 1) if before and after is not None else None
+            rows.append((name, label, before, after, change))
+    return rows
+
+
+# Mesures de composants (manage.py run_measure) : chacune crée ses propres données sous le premier
+# utilisateur de mesure et les supprime ensuite
+
+
+def _timed(func, *args, **kwargs):
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    return result, (time.perf_counter() - start) * 1000
+
+
+def _measure_user():
+    user = User.objects.filter(username__startswith=USER_PREFIX).order_by('id').first()
+    if user is None:
+        raise ValueError("Aucun utilisateur de mesure : lancer seed_benchmark")
+    return user
+
+
+def _dump(document):
+    return json.dumps(document, ensure_ascii=False, separators=(',', ':'))
+
+
+def _edit_block(rng, document):
+    """Réécrit le texte d'un bloc tiré au hasard, comme une session d'écriture ; retourne le patch équivalent."""
+    children = document['root']['children']
+    block = rng.randrange(len(children))
+    children[block]['children'][0]['text'] = text = _sentence(rng, 30)
+    return [{'op': 'replace', 'path': f'/root/children/{block}/children/0/text', 'value': text}]
+
+
+def _wal_position():
+    """Position d'écriture du journal PostgreSQL, pour mesurer le volume écrit par une requête."""
+    if connection.vendor != 'postgresql':
+        return None
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT pg_current_wal_insert_lsn()')
+        return cursor.fetchone()[0]
+
+
+def _wal_bytes(since):
+    if since is None:
+        return None
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT pg_wal_lsn_diff(pg_current_wal_insert_lsn(), %s)', [since])
+        return int(cursor.fetchone()[0])
+
+
+def measure_revisions(count=1000, doc_kb=50, repeat=20, random_seed=0):
+    """Stockage ajouté par sauvegarde et coût de reconstruction de la dernière révision d'une longue histoire.
+
+    Les `count` sauvegardes passent par save_project_update, comme PATCH /api/projects/{id}/.
+    """
+    rng = random.Random(random_seed)
+    user = _measure_user()
+    document = json.loads(lexical_document(rng, doc_kb))
+    project = Project.objects.create(
+        user=user, title='Mesure des révisions', description='Mesure', editor_content=_dump(document),
+    )
+    try:
+        record_revision(project, None, user=user)
+        saves = []
+        for _ in range(count):
+            _edit_block(rng, document)
+            serializer = ProjectSerializer(project, data={'editor_content': _dump(document)}, partial=True)
+            serializer.is_valid(raise_exception=True)
+            project, elapsed = _timed(save_project_update, serializer, user)
+            saves.append(elapsed)
+
+        stored = list(project.revisions.order_by('revision').values_list('revision', 'keyframe', Length('data')))
+        deltas = [size for revision, keyframe, size in stored if revision != keyframe]
+        keyframes = [size for revision, keyframe, size in stored if revision == keyframe]
+        # Révision la plus éloignée de son image complète : la reconstruction la plus coûteuse
+        longest = max(stored, key=lambda entry: entry[0] - entry[1])
+        latest = [_timed(reconstruct_content, project, project.revision)[1] for _ in range(repeat)]
+        slowest = [_timed(reconstruct_content, project, longest[0])[1] for _ in range(repeat)]
+        if reconstruct_content(project, project.revision) != project.editor_content:
+            raise ValueError("La dernière révision reconstruite diffère du contenu enregistré")
+        return {
+            'meta': environment(),
+            'document_bytes': len(project.editor_content.encode('utf-8')),
+            'saves': count,
+            'keyframe_interval': settings.PROJECT_REVISION_KEYFRAME_INTERVAL,
+            'save_ms': distribution(saves),
+            'storage': {
+                'total_bytes': sum(size for _, _, size in stored),
+                'bytes_per_save': round(sum(size for _, _, size in stored[1:]) / count, 1) if count else None,
+                'delta_bytes': distribution(deltas),
+                'keyframes': len(keyframes),
+                'keyframe_bytes': distribution(keyframes),
+            },
+            'reconstruct_latest_ms': {
+                'revision': project.revision, 'chain': project.revision - stored[-1][1], **distribution(latest),
+            },
+            'reconstruct_longest_chain_ms': {
+                'revision': longest[0], 'chain': longest[0] - longest[1], **distribution(slowest),
+            },
+        }
+    finally:
+        Job.objects.filter(kind='project.reindex', payload={'project': project.pk}).delete()
+        project.delete()
+
+
+def measure_annotation_ranges(count=100000, text_length=1000000, repeat=200, random_seed=0):
+    """Latence des requêtes de position sur `count` annotations d'un même texte.
+
+    Chaque requête est mesurée sous ses deux formes : intervalle indexé en GiST (PostgreSQL
+    seulement) et comparaisons sur les colonnes de début et de fin, seule forme des autres bases.
+    """
+    rng = random.Random(random_seed)
+    user = _measure_user()
+    text = Text.objects.create(content='Mesure des requêtes de position')
+    try:
+        for offset in range(0, count, 5000):
+            batch = []
+            for _ in range(min(5000, count - offset)):
+                start = rng.randrange(text_length)
+                batch.append(Annotation(
+                    user=user, text=text, title='Mesure', description='', start_index=start,
+                    end_index=start + rng.randint(1, 500),
+                ))
+            Annotation.objects.bulk_create(batch)
+        UserWorkspaceStats.record(user.pk, annotations=count)
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute(f'ANALYZE {Annotation._meta.db_table}')
+
+        annotations = Annotation.objects.filter(text=text)
+        # Forme GiST, forme sur les colonnes et largeur de l'intervalle demandé (None pour un point)
+        queries = {
+            'covers': ('covering', 'covering_bounds', None),
+            'overlaps': ('overlapping', 'overlapping_bounds', 1000),
+            'within': ('within', 'within_bounds', 5000),
+        }
+        results = {}
+        for name, (span, bounds, width) in queries.items():
+            starts = [rng.randrange(text_length) for _ in range(repeat)]
+            samples = [[start] if width is None else [start, start + width] for start in starts]
+            results[name] = {}
+            for label, method in (('gist', span), ('bounds', bounds)):
+                if label == 'gist' and connection.vendor != 'postgresql':
+                    results[name][label] = None
+                    continue
+                timings, rows = [], []
+                for args in samples:
+                    queryset = getattr(annotations, method)(*args).values_list('id', flat=True)
+                    found, elapsed = _timed(list, queryset)
+                    timings.append(elapsed)
+                    rows.append(len(found))
+                results[name][label] = {
+                    'plan': getattr(annotations, method)(*samples[0]).only('id').explain().splitlines()[0].strip(),
+                    'rows_mean': round(sum(rows) / len(rows), 1),
+                    **distribution(timings),
+                }
+        return {'meta': environment(), 'annotations': count, 'text_length': text_length, 'queries_ms': results}
+    finally:
+        text.delete()
+
+
+def measure_saves(sizes=(1024, 10240), count=30, random_seed=0):
+    """Sauvegarde complète (PUT) et patch JSON (PATCH /content/) d'un document de chaque taille en Ko.
+
+    Pour chaque requête : octets envoyés et reçus, latence et, sous PostgreSQL, octets écrits dans
+    le journal (WAL), qui comprennent le contenu réécrit, sa révision et les index.
+    """
+    rng = random.Random(random_seed)
+    user = _measure_user()
+    session = Session(user)
+    results = {}
+    with override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver'], THROTTLE_BUCKETS={}):
+        for size in sizes:
+            document = json.loads(lexical_document(rng, size))
+            project = Project.objects.create(
+                user=user, title='Mesure des sauvegardes', description='Mesure', editor_content=_dump(document),
+            )
+            try:
+                record_revision(project, None, user=user)
+                revision = project.revision
+                results[f'{size}kb'] = {'document_bytes': len(project.editor_content.encode('utf-8'))}
+                for mode in ('put', 'patch'):
+                    samples = {'latency': [], 'sent': [], 'received': [], 'wal': []}
+                    for _ in range(count):
+                        patch = _edit_block(rng, document)
+                        if mode == 'put':
+                            method, path = session.client.put, f'/api/projects/{project.pk}/'
+                            body = {'title': project.title, 'description': project.description,
+                                    'editor_content': _dump(document)}
+                        else:
+                            method, path = session.client.patch, f'/api/projects/{project.pk}/content/'
+                            body = {'base_revision': revision, 'patch': patch}
+                        body = _dump(body).encode('utf-8')
+                        position = _wal_position()
+                        response, elapsed = _timed(method, path, body, content_type='application/json')
+                        written = _wal_bytes(position)
+                        if response.status_code != 200:
+                            raise ValueError(f"Sauvegarde refusée ({response.status_code}) : {response.content[:200]}")
+                        revision += 1
+                        samples['latency'].append(elapsed)
+                        samples['sent'].append(len(body))
+                        samples['received'].append(len(response.content))
+                        if written is not None:
+                            samples['wal'].append(written)
+                    results[f'{size}kb'][mode] = {
+                        'request_bytes': round(sum(samples['sent']) / count),
+                        'response_bytes': round(sum(samples['received']) / count),
+                        'wal_bytes': distribution(samples['wal']) if samples['wal'] else None,
+                        'latency_ms': distribution(samples['latency']),
+                    }
+            finally:
+                Job.objects.filter(kind='project.reindex', payload={'project': project.pk}).delete()
+                project.delete()
+    return {'meta': environment(), 'saves': count, 'sizes': results}
+
+
+def _body(response):
+    if response.streaming:
+        return b''.join(response.streaming_content)
+    return response.content
+
+
+def measure_chunks(doc_kb=20480, count=10, random_seed=0):
+    """Ouverture et sauvegarde d'un grand document, stocké d'un seul tenant ou découpé en morceaux.
+
+    Ouverture : détail complet du projet d'un seul tenant, contre manifeste et premier morceau
+    (temps jusqu'au premier morceau) puis reste du document par « Range: chunks=1- ». Sauvegarde
+    d'un bloc : patch JSON d'un seul tenant, contre remplacement du morceau qui le contient.
+    """
+    rng = random.Random(random_seed)
+    user = _measure_user()
+    session = Session(user)
+    content = lexical_document(rng, doc_kb)
+    document = json.loads(content)
+    projects = {}
+    results = {'document_bytes': len(content.encode('utf-8'))}
+    with override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver'], THROTTLE_BUCKETS={}):
+        try:
+            for mode in ('blob', 'chunked'):
+                projects[mode], elapsed = _timed(
+                    Project.objects.create, user=user, title='Mesure du découpage', description='Mesure',
+                    editor_content=content, chunked=mode == 'chunked',
+                )
+                record_revision(projects[mode], None, user=user)
+                results[mode] = {'create_ms': round(elapsed, 2)}
+            blob, chunked = projects['blob'].pk, projects['chunked'].pk
+            results['chunked']['chunks'] = projects['chunked'].chunks.count()
+
+            requests = {
+                ('blob', 'open'): lambda: session.client.get(f'/api/projects/{blob}/'),
+                ('chunked', 'first_chunk'): lambda: session.client.get(f'/api/projects/{chunked}/chunks/'),
+            }
+            if results['chunked']['chunks'] > 1:
+                requests['chunked', 'remaining_chunks'] = lambda: session.client.get(
+                    f'/api/projects/{chunked}/chunks/', HTTP_RANGE='chunks=1-',
+                )
+            for (mode, label), request in requests.items():
+                timings, sizes = [], []
+                for _ in range(count):
+                    start = time.perf_counter()
+                    response = request()
+                    size = len(_body(response))
+                    timings.append((time.perf_counter() - start) * 1000)
+                    sizes.append(size)
+                    if response.status_code >= 400:
+                        raise ValueError(f"Lecture refusée ({response.status_code})")
+                results[mode][label] = {
+                    'response_bytes': round(sum(sizes) / count), 'latency_ms': distribution(timings),
+                }
+            manifest = session.client.get(f'/api/projects/{chunked}/chunks/').json()['manifest']
+
+            revisions = {'blob': 0, 'chunked': 0}
+            saves = {mode: {'latency': [], 'sent': [], 'wal': []} for mode in ('blob', 'chunked')}
+            for _ in range(count):
+                patch = _edit_block(rng, document)
+                block = int(patch[0]['path'].split('/')[3])
+                # Morceau qui contient le bloc modifié, d'après le dernier manifeste reçu
+                entry = next(
+                    entry for entry in manifest
+                    if entry['start_block'] <= block < entry['start_block'] + entry['block_count']
+                )
+                children = document['root']['children']
+                bodies = {
+                    'blob': (session.client.patch, f'/api/projects/{blob}/content/', {
+                        'base_revision': revisions['blob'], 'patch': patch,
+                    }),
+                    'chunked': (session.client.put, f'/api/projects/{chunked}/chunks/', {
+                        'base_revision': revisions['chunked'], 'chunks': [{
+                            'index': entry['index'],
+                            'blocks': children[entry['start_block']:entry['start_block'] + entry['block_count']],
+                        }],
+                    }),
+                }
+                for mode, (method, path, body) in bodies.items():
+                    body = _dump(body).encode('utf-8')
+                    position = _wal_position()
+                    response, elapsed = _timed(method, path, body, content_type='application/json')
+                    written = _wal_bytes(position)
+                    if response.status_code != 200:
+                        raise ValueError(f"Sauvegarde refusée ({response.status_code}) : {response.content[:200]}")
+                    revisions[mode] += 1
+                    if mode == 'chunked':
+                        manifest = response.json()['manifest']
+                    saves[mode]['latency'].append(elapsed)
+                    saves[mode]['sent'].append(len(body))
+                    if written is not None:
+                        saves[mode]['wal'].append(written)
+            for mode, samples in saves.items():
+                results[mode]['save'] = {
+                    'request_bytes': round(sum(samples['sent']) / count),
+                    'wal_bytes': distribution(samples['wal']) if samples['wal'] else None,
+                    'latency_ms': distribution(samples['latency']),
+                }
+            contents = [json.loads(Project.objects.get(pk=pk).editor_content) for pk in (blob, chunked)]
+            if contents[0] != contents[1]:
+                raise ValueError("Les deux stockages ont divergé")
+        finally:
+            for project in projects.values():
+                Job.objects.filter(kind='project.reindex', payload={'project': project.pk}).delete()
+                project.delete()
+    return {'meta': environment(), 'saves': count, **results}
+
+
+def _rss():
+    """Mémoire résidente du processus en octets, lue dans /proc (Linux)."""
+    with open('/proc/self/statm') as f:
+        return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+
+
+class _PeakMemory:
+    """Échantillonne la mémoire résidente pendant le bloc : valeur de départ et pic."""
+
+    INTERVAL = 0.01
+
+    def __enter__(self):
+        gc.collect()
+        self.before = self.peak = _rss()
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self._sample, daemon=True)
+        self.thread.start()
+        return self
+
+    def _sample(self):
+        while not self.stopped.wait(self.INTERVAL):
+            self.peak = max(self.peak, _rss())
+
+    def __exit__(self, *exc_info):
+        self.stopped.set()
+        self.thread.join()
+        self.peak = max(self.peak, _rss())
+
+    def report(self):
+        return {
+            'rss_before_mb': round(self.before / 2**20, 1),
+            'rss_peak_mb': round(self.peak / 2**20, 1),
+            'rss_growth_mb': round((self.peak - self.before) / 2**20, 1),
+        }
+
+
+def _fill_workspace(rng, user, total_mb, doc_kb, annotations):
+    """Projets de `doc_kb` Ko jusqu'à `total_mb` Mo, créés par lots sans passer par Project.save."""
+    pool = [lexical_document(rng, doc_kb) for _ in range(8)]
+    count = max(1, total_mb * 1024 // doc_kb)
+    for offset in range(0, count, 20):
+        projects = Project.objects.bulk_create([
+            Project(user=user, title=f'Projet {number}', description='Mesure', editor_content=pool[number % 8])
+            for number in range(offset, min(count, offset + 20))
+        ])
+        texts = Text.objects.bulk_create([
+            Text(content=_sentence(rng, 40)) for _ in range(len(projects) * annotations)
+        ])
+        Annotation.objects.bulk_create([
+            Annotation(
+                user=user, project=projects[index // annotations], text=text, title='Mesure', description='',
+                selected_text=text.content[:20], start_index=0, end_index=20,
+            )
+            for index, text in enumerate(texts)
+        ])
+    return count
+
+
+def _delete_workspace(user):
+    """Supprime l'utilisateur par lots de projets, sans charger leur contenu."""
+    Text.objects.filter(annotations__user=user).delete()
+    projects = Project.objects.filter(user=user).defer('editor_content')
+    while ids := list(projects.values_list('id', flat=True)[:100]):
+        projects.filter(pk__in=ids).delete()
+    user.delete()
+
+
+def measure_workspace_transfer(sizes_mb=(512, 5120), doc_kb=1024, annotations=10, random_seed=0):
+    """Mémoire résidente de l'export et de l'import d'un espace de travail de chaque taille en Mo.
+
+    L'export passe par GET /api/export/ (NDJSON et zip) et s'écrit dans un fichier temporaire ;
+    l'import relit le fichier NDJSON avec WorkspaceImporter, comme POST /api/import/ lit le corps
+    de la requête. Une mémoire bornée se voit à un pic qui ne grandit pas avec la taille.
+    """
+    try:
+        _rss()
+    except OSError:
+        raise ValueError("La mesure de mémoire résidente demande /proc (Linux)")
+    rng = random.Random(random_seed)
+    results = {}
+    with override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver'], THROTTLE_BUCKETS={}):
+        for size in sizes_mb:
+            users = [
+                User.objects.create_user(f'{USER_PREFIX}transfer_{size}', password=PASSWORD),
+                User.objects.create_user(f'{USER_PREFIX}transfer_{size}_import', password=PASSWORD),
+            ]
+            try:
+                projects, elapsed = _timed(_fill_workspace, rng, users[0], size, doc_kb, annotations)
+                results[f'{size}mb'] = result = {'projects': projects, 'fill_s': round(elapsed / 1000, 1)}
+                session = Session(users[0])
+                with tempfile.NamedTemporaryFile(suffix='.ndjson') as ndjson:
+                    for kind, params in (('ndjson', {}), ('zip', {'type': 'zip'})):
+                        with tempfile.TemporaryFile() as scratch, _PeakMemory() as memory:
+                            start = time.perf_counter()
+                            response = session.client.get('/api/export/', params)
+                            written = 0
+                            for chunk in response.streaming_content:
+                                (ndjson if kind == 'ndjson' else scratch).write(chunk)
+                                written += len(chunk)
+                            elapsed = time.perf_counter() - start
+                        if response.status_code != 200:
+                            raise ValueError(f"Export refusé ({response.status_code})")
+                        result[f'export_{kind}'] = {
+                            'bytes': written, 'duration_s': round(elapsed, 1),
+                            'mb_per_s': round(written / 2**20 / elapsed, 1), **memory.report(),
+                        }
+                    ndjson.flush()
+                    with open(ndjson.name, 'rb') as lines, _PeakMemory() as memory:
+                        counts, elapsed = _timed(WorkspaceImporter(users[1]).run, lines)
+                    result['import_ndjson'] = {
+                        **counts, 'duration_s': round(elapsed / 1000, 1), **memory.report(),
+                    }
+            finally:
+                for user in users:
+                    _delete_workspace(user)
+    return {'meta': environment(), 'doc_kb': doc_kb, 'annotations_per_project': annotations, 'sizes': results}
+
+
+def measure_throttle(count=100000, keys=20000):
+    """Coût d'une vérification de limitation par seau à jetons, par magasin et par nombre de clients.
+
+    `keys` clients distincts dépassent LOCAL_MAX_BUCKETS par défaut : chaque vérification évince
+    alors le seau le plus ancien. La durée est mesurée par lots de 1000 appels.
+    """
+    rate = parse_rate('60/min')
+    alias = getattr(settings, 'THROTTLE_CACHE', 'default')
+    stores = {'local': LocalBucketStore(), 'cache': CacheBucketStore(alias)}
+    results = {}
+    for name, store in stores.items():
+        results[name] = {}
+        for label, spread in (('one_key', 1), ('many_keys', keys)):
+            timings = []
+            for offset in range(0, count, 1000):
+                start = time.perf_counter()
+                for number in range(offset, min(count, offset + 1000)):
+                    store.take(f'mesure:{number % spread}', rate, 20, time.time())
+                timings.append((time.perf_counter() - start) * 1e6 / (min(count, offset + 1000) - offset))
+            results[name][label] = {'keys': spread, 'us_per_check': distribution(timings)}
+    caches[alias].delete_many([f'throttle:mesure:{number}' for number in range(keys)])
+
+    # Vérification complète par la classe de limitation, pour une requête anonyme
+    request = RequestFactory().post('/', REMOTE_ADDR='10.0.0.1')
+    request.user = AnonymousUser()
+    view = type('View', (), {'throttle_scope': 'mesure'})()
+    with override_settings(THROTTLE_BUCKETS={'mesure': {'rate': '1000000/s', 'burst': 1000000}}):
+        throttle = BucketThrottle()
+        timings = []
+        for _ in range(0, count, 1000):
+            start = time.perf_counter()
+            for _ in range(1000):
+                throttle.allow_request(request, view)
+            timings.append((time.perf_counter() - start) * 1000)
+    return {
+        'meta': environment(),
+        'checks': count,
+        'cache': f'{alias} ({type(caches[alias]).__name__})',
+        'local_max_buckets': LOCAL_MAX_BUCKETS,
+        'stores': results,
+        'allow_request_us': distribution(timings),
+    }
+
+
+def measure_authentication(count=2000):
+    """Authentification d'une requête par le cookie JWT, utilisateur lu dans le jeton ou en base.
+
+    Pour chaque mode : durée de CookieJWTAuthentication.authenticate seule, requêtes SQL par appel
+    et latence de GET /api/projects/. Le mode « stateless_uncached » vide le statut mis en cache
+    avant chaque appel, comme à l'expiration de JWT_USER_STATUS_TTL.
+    """
+    user = _measure_user()
+    access = str(MyTokenObtainPairSerializer.get_token(user).access_token)
+    request = RequestFactory().get('/api/projects/')
+    request.COOKIES[settings.SIMPLE_JWT['AUTH_COOKIE']] = access
+    session = Session(user)
+    modes = {
+        'stateless': (True, False),
+        'stateless_uncached': (True, True),
+        'database': (False, False),
+    }
+    results = {}
+    with override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver'], THROTTLE_BUCKETS={}):
+        for mode, (stateless, uncached) in modes.items():
+            with override_settings(JWT_STATELESS_USER=stateless):
+                authentication = CookieJWTAuthentication()
+                authentication.authenticate(request)
+                timings, requests = [], []
+                with CaptureQueriesContext(connection) as queries:
+                    for _ in range(count):
+                        if uncached:
+                            invalidate_user_status(User, user)
+                        timings.append(_timed(authentication.authenticate, request)[1])
+                executed = len(queries)
+                for _ in range(min(count, 200)):
+                    if uncached:
+                        invalidate_user_status(User, user)
+                    response, elapsed = _timed(session.client.get, '/api/projects/')
+                    if response.status_code != 200:
+                        raise ValueError(f"Requête refusée ({response.status_code})")
+                    requests.append(elapsed)
+            results[mode] = {
+                'authenticate_us': distribution([value * 1000 for value in timings]),
+                'queries_per_call': round(executed / count, 2),
+                'project_list_ms': distribution(requests),
+            }
+    return {'meta': environment(), 'calls': count, 'modes': results}
+
+
+def measure_jobs(count=2000, threads=(1, 2, 4, 8), batch=1):
+    """Débit de la file de tâches (tâches par seconde) selon le nombre de fils du worker.
+
+    Les tâches sont des workspace.reindex d'un utilisateur sans projet : leur exécution se réduit
+    à une requête, la mesure est celle de la file (prise SKIP LOCKED, enregistrement du résultat).
+    """
+    user = User.objects.create_user(f'{USER_PREFIX}jobs', password=PASSWORD)
+    results = {}
+    try:
+        for count_threads in threads:
+            start = time.perf_counter()
+            Job.objects.bulk_create([
+                Job(kind='workspace.reindex', payload={'user': user.pk, 'number': number}, user=user)
+                for number in range(count)
+            ])
+            enqueued = time.perf_counter() - start
+            worker = Worker(threads=count_threads, burst=True, batch=batch, name='mesure')
+            processed, elapsed = _timed(worker.run)
+            jobs = Job.objects.filter(user=user)
+            if processed != count or jobs.exclude(status=Job.SUCCEEDED).exists():
+                raise ValueError(f"{count - processed} tâches non traitées")
+            results[f'{count_threads}_threads'] = {
+                'jobs_per_s': round(count / elapsed * 1000, 1),
+                'duration_s': round(elapsed / 1000, 2),
+                'bulk_enqueue_s': round(enqueued, 2),
+            }
+            jobs.delete()
+
+        # Appels simultanés d'enqueue_once pour la même tâche : la contrainte n'en laisse qu'une en file
+        barrier = threading.Barrier(max(threads))
+
+        def enqueue_racing():
+            try:
+                barrier.wait()
+                enqueue_once('workspace.reindex', {'user': user.pk}, user=user)
+            finally:
+                connections.close_all()
+
+        racers = [threading.Thread(target=enqueue_racing) for _ in range(max(threads))]
+        for racer in racers:
+            racer.start()
+        for racer in racers:
+            racer.join()
+        results['enqueue_once_race'] = {
+            'threads': max(threads), 'queued': Job.objects.filter(user=user, status=Job.QUEUED).count(),
+        }
+    finally:
+        Job.objects.filter(user=user).delete()
+        user.delete()
+    return {'meta': environment(), 'jobs': count, 'batch': batch, 'workers': results}
+
+
+def _uninstall_query_counter():
+    # Comme dans un processus démarré avec METRICS_ENABLED faux : aucun compteur sur les connexions
+    connection_created.disconnect(dispatch_uid='api_metrics_query_counter')
+    for alias in connections:
+        wrappers = connections[alias].execute_wrappers
+        if count_query in wrappers:
+            wrappers.remove(count_query)
+
+
+def measure_instrumentation(names=('project_list', 'project_open', 'autosave'), requests=300, rounds=4, warmup=5):
+    """Surcoût du middleware d'instrumentation : mêmes scénarios avec METRICS_ENABLED faux puis vrai.
+
+    Les deux modes alternent sur `rounds` tours pour que la dérive de la machine touche l'un
+    comme l'autre ; chaque tour sert `requests` requêtes par scénario.
+    """
+    user = _measure_user()
+    samples = {name: {'off': [], 'on': []} for name in names}
+    overrides = {'ALLOWED_HOSTS': [*settings.ALLOWED_HOSTS, 'testserver'], 'THROTTLE_BUCKETS': {}}
+    with override_settings(**overrides):
+        for _ in range(rounds):
+            for mode in ('off', 'on'):
+                if mode == 'off':
+                    _uninstall_query_counter()
+                with override_settings(METRICS_ENABLED=mode == 'on'):
+                    for name in names:
+                        # Nouveau client : la pile de middlewares est construite avec le réglage du mode
+                        session = Session(user)
+                        results = [None]
+                        _worker(SCENARIOS[name], session, requests, warmup, results, 0)
+                        if results[0][2]:
+                            raise ValueError(f"{name} : {results[0][2]} réponses en erreur")
+                        samples[name][mode].extend(results[0][0])
+    _uninstall_query_counter()
+    report = {}
+    for name, modes in samples.items():
+        off, on = distribution(modes['off']), distribution(modes['on'])
+        report[name] = {
+            'off_ms': off,
+            'on_ms': on,
+            'overhead_p50_ms': round(on['p50'] - off['p50'], 3),
+            'overhead_mean_ms': round(on['mean'] - off['mean'], 3),
+        }
+    return {'meta': environment(), 'requests': requests * rounds, 'scenarios': report}
+
+
+def measure_derived(doc_kb=10240, comments=200, repeat=10, random_seed=0):
+    """Coût d'analyse d'un grand document contre la lecture des données dérivées déjà calculées.
+
+    Analyse : json.loads, parcours `derive` (texte, commentaires, plan) et résumé. Lecture :
+    GET /api/projects/{id}/derived/ servi par la table annexe, recalculé quand la ligne est absente,
+    et revalidé par If-None-Match.
+    """
+    rng = random.Random(random_seed)
+    user = _measure_user()
+    session = Session(user)
+    content = lexical_document(rng, doc_kb, comments=comments)
+    parse = {'json_loads': [], 'derive': [], 'summarize': []}
+    for _ in range(repeat):
+        state, elapsed = _timed(json.loads, content)
+        parse['json_loads'].append(elapsed)
+        parsed, elapsed = _timed(lexical.derive, state)
+        parse['derive'].append(elapsed)
+        parse['summarize'].append(_timed(lexical.summarize, content, '\n'.join(parsed.blocks))[1])
+
+    project, create_ms = _timed(
+        Project.objects.create, user=user, title='Mesure des données dérivées', description='Mesure',
+        editor_content=content,
+    )
+    url = f'/api/projects/{project.pk}/derived/'
+    serve = {'stored': [], 'recomputed': [], 'not_modified': []}
+    try:
+        with override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver'], THROTTLE_BUCKETS={}):
+            response = session.client.get(url)
+            etag = response['ETag']
+            for _ in range(repeat):
+                serve['stored'].append(_timed(session.client.get, url)[1])
+                ProjectDerivedData.objects.filter(project=project).delete()
+                response, elapsed = _timed(session.client.get, url)
+                if response.status_code != 200:
+                    raise ValueError(f"Lecture refusée ({response.status_code})")
+                serve['recomputed'].append(elapsed)
+                response, elapsed = _timed(session.client.get, url, HTTP_IF_NONE_MATCH=etag)
+                if response.status_code != 304:
+                    raise ValueError(f"Revalidation sans 304 ({response.status_code})")
+                serve['not_modified'].append(elapsed)
+            body = session.client.get(url).json()
+    finally:
+        Job.objects.filter(kind='project.reindex', payload={'project': project.pk}).delete()
+        project.delete()
+    return {
+        'meta': environment(),
+        'document_bytes': len(content.encode('utf-8')),
+        'blocks': len(state['root']['children']),
+        'comments': body['comment_count'],
+        'outline_entries': len(body['outline']),
+        'create_ms': round(create_ms, 2),
+        'parse_ms': {step: distribution(timings) for step, timings in parse.items()},
+        'derived_endpoint_ms': {case: distribution(timings) for case, timings in serve.items()},
+    }
+
+
+# Réglages d'environnement de chaque mode de connexion (voir DATABASES dans settings.py)
+CONNECTION_MODES = {
+    'pool': {'DB_POOL': 'True'},
+    'persistent': {'DB_POOL': 'False', 'DB_CONN_MAX_AGE': '60'},
+    'per_request': {'DB_POOL': 'False', 'DB_CONN_MAX_AGE': '0'},
+}
+
+
+def measure_connections(names=('project_list', 'project_open'), requests=300, concurrency=1, connects=50):
+    """Latence des parcours selon la gestion des connexions PostgreSQL : pool, persistantes ou une par requête.
+
+    Chaque mode est mesuré par run_benchmark dans un processus à part, lancé avec ses variables
+    d'environnement, puisque les réglages de DATABASES sont lus au démarrage. L'ouverture
+    d'une connexion hors pool est aussi chronométrée seule.
+    """
+    if connection.vendor != 'postgresql':
+        raise ValueError("Mesure réservée à PostgreSQL")
+    connect = []
+    for _ in range(connects):
+        database = connection.copy()
+        database.settings_dict['OPTIONS'].pop('pool', None)
+        start = time.perf_counter()
+        database.connect()
+        connect.append((time.perf_counter() - start) * 1000)
+        database.close()
+
+    results = {}
+    for mode, variables in CONNECTION_MODES.items():
+        with tempfile.NamedTemporaryFile(suffix='.json') as output:
+            subprocess.run(
+                [sys.executable, str(settings.BASE_DIR / 'manage.py'), 'run_benchmark', *names,
+                 '--requests', str(requests), '--concurrency', str(concurrency), '--output', output.name],
+                env={**os.environ, **variables}, check=True, capture_output=True,
+            )
+            report = json.load(output)
+        results[mode] = {
+            name: {
+                'p50_ms': scenario['latency_ms']['p50'],
+                'p95_ms': scenario['latency_ms']['p95'],
+                'throughput_rps': scenario['throughput_rps'],
+                'errors': scenario['errors'],
+            }
+            for name, scenario in report['scenarios'].items()
+        }
+    return {
+        'meta': environment(), 'requests': requests, 'concurrency': concurrency,
+        'connect_ms': distribution(connect), 'modes': results,
+    }
+
+
+MEASURES = {
+    'revisions': measure_revisions,
+    'saves': measure_saves,
+    'chunks': measure_chunks,
+    'annotation_ranges': measure_annotation_ranges,
+    'workspace_transfer': measure_workspace_transfer,
+    'throttle': measure_throttle,
+    'authentication': measure_authentication,
+    'jobs': measure_jobs,
+    'instrumentation': measure_instrumentation,
+    'derived': measure_derived,
+    'connections': measure_connections,
+}
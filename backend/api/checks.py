@@ -0,0 +1,46 @@
+from django.conf import settings
+from django.core.checks import Error, register
+
+# Caches propres à chaque processus : rien de ce qui y est écrit n'est vu par les autres
+PROCESS_LOCAL_CACHES = ('django.core.cache.backends.locmem.LocMemCache', 'django.core.cache.backends.dummy.DummyCache')
+
+
+def is_process_local(alias):
+    return settings.CACHES.get(alias, {}).get('BACKEND') in PROCESS_LOCAL_CACHES
+
+
+@register()
+def check_collab(app_configs, **kwargs):
+    """Avec plusieurs processus ASGI, l'édition collaborative exige une couche de canaux et un cache partagés."""
+    if settings.SERVER_MODE != 'asgi' or settings.WEB_CONCURRENCY <= 1:
+        return []
+    errors = []
+    if settings.CHANNEL_LAYERS['default']['BACKEND'] == 'channels.layers.InMemoryChannelLayer':
+        errors.append(Error(
+            "La couche de canaux en mémoire n'est pas partagée entre les processus ASGI",
+            hint="Définir REDIS_URL, ou WEB_CONCURRENCY=1",
+            id='api.E001',
+        ))
+    if is_process_local('default'):
+        errors.append(Error(
+            "Le cache par défaut, où sont inscrits les propriétaires des salles d'édition, "
+            "n'est pas partagé entre les processus ASGI",
+            hint="Définir REDIS_URL, ou WEB_CONCURRENCY=1",
+            id='api.E002',
+        ))
+    return errors
+
+
+@register()
+def check_jwt_revocation(app_configs, **kwargs):
+    """Avec plusieurs processus, la liste de révocation des jetons doit être partagée entre eux."""
+    if settings.WEB_CONCURRENCY <= 1:
+        return []
+    if not is_process_local(getattr(settings, 'JWT_REVOCATION_CACHE', 'default')):
+        return []
+    return [Error(
+        "La liste de révocation des jetons (JWT_REVOCATION_CACHE) est propre à chaque processus : "
+        "une déconnexion ou la réutilisation d'un jeton volé ne serait détectée que par l'un d'eux",
+        hint="Définir REDIS_URL, ou WEB_CONCURRENCY=1",
+        id='api.E003',
+    )]
@@ -0,0 +1,107 @@
+import hashlib
+import json
+import uuid
+import zlib
+from collections import namedtuple
+
+from .fields import decoded_text
+
+# Frontières définies par le contenu : un morceau se termine après un bloc dont l'empreinte
+# est multiple de CHUNK_BOUNDARY (une fois CHUNK_MIN_BYTES atteints), ou à CHUNK_MAX_BYTES.
+# Une modification locale ne déplace ainsi que les frontières voisines.
+CHUNK_MIN_BYTES = 64 * 1024
+CHUNK_MAX_BYTES = 1024 * 1024
+CHUNK_BOUNDARY = 512
+
+Chunk = namedtuple('Chunk', ['data', 'block_count', 'size', 'hash'])
+
+
+def _dump(value):
+    return json.dumps(value, ensure_ascii=False, separators=(',', ':'))
+
+
+def _chunk(parts):
+    data = b'[' + b','.join(parts) + b']'
+    return Chunk(data.decode('utf-8'), len(parts), len(data), hashlib.sha1(data).hexdigest())
+
+
+def split_blocks(blocks):
+    """Découpe une liste de blocs de premier niveau en morceaux JSON."""
+    chunks = []
+    parts = []
+    size = 0
+    for block in blocks:
+        raw = _dump(block).encode('utf-8')
+        parts.append(raw)
+        size += len(raw) + 1
+        if size >= CHUNK_MAX_BYTES or (size >= CHUNK_MIN_BYTES and zlib.crc32(raw) % CHUNK_BOUNDARY == 0):
+            chunks.append(_chunk(parts))
+            parts = []
+            size = 0
+    if parts:
+        chunks.append(_chunk(parts))
+    return chunks
+
+
+def split_state(state):
+    """Enveloppe (état sans les blocs de premier niveau) et morceaux ; None si l'état n'est pas découpable."""
+    root = state.get('root') if isinstance(state, dict) else None
+    if not isinstance(root, dict) or not isinstance(root.get('children'), list):
+        return None
+    envelope = _dump({**state, 'root': {**root, 'children': []}})
+    return envelope, split_blocks(root['children'])
+
+
+def manifest_hash(envelope, hashes):
+    """Empreinte d'un contenu découpé, calculée sans le reconstituer."""
+    digest = hashlib.sha256(envelope.encode('utf-8'))
+    for value in hashes:
+        digest.update(value.encode('ascii'))
+    return digest.hexdigest()
+
+
+def assembled_size(envelope, sizes):
+    """Taille en octets du JSON reconstitué par `assemble`, à partir des tailles des morceaux."""
+    # Chaque morceau perd ses crochets ; les morceaux non vides sont séparés par une virgule
+    inner = [size - 2 for size in sizes if size > 2]
+    return len(envelope.encode('utf-8')) + sum(inner) + max(0, len(inner) - 1)
+
+
+def assemble(envelope, chunks):
+    """Reconstitue le JSON complet par concaténation des morceaux, sans les désérialiser."""
+    marker = f'__chunks_{uuid.uuid4().hex}__'
+    state = json.loads(envelope)
+    state['root']['children'] = marker
+    inner = ','.join(data[1:-1] for data in chunks if len(data) > 2)
+    return _dump(state).replace(f'"{marker}"', f'[{inner}]', 1)
+
+
+class ChunkedContent:
+    """Contenu découpé tel que chargé : les morceaux ne sont lus qu'au premier accès au texte."""
+
+    __slots__ = ('envelope', 'loader')
+
+    def __init__(self, envelope, loader):
+        self.envelope = envelope
+        self.loader = loader
+
+    def decode(self):
+        return assemble(self.envelope, [decoded_text(data) for data in self.loader()])
+
+
+def parse_chunk_range(header, count):
+    """Intervalle inclusif d'un en-tête « Range: chunks=début-fin » (fin facultative).
+
+    Lève ValueError si l'en-tête est invalide ou hors des `count` morceaux.
+    """
+    unit, _, spec = header.partition('=')
+    if unit.strip() != 'chunks' or ',' in spec:
+        raise ValueError(header)
+    first, _, last = spec.strip().partition('-')
+    if not first.isdigit() or (last and not last.isdigit()):
+        raise ValueError(header)
+    start = int(first)
+    end = min(int(last), count - 1) if last else count - 1
+    if start > end:
+        raise ValueError(header)
+    return start, end
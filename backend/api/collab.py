@@ -0,0 +1,447 @@
+import asyncio
+import json
+import logging
+import uuid
+from collections import deque
+
+from channels.db import database_sync_to_async
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import transaction
+
+from .jobs import reindex_later
+from .jsonpatch import make_patch
+from .models import Project
+from .revisions import record_revision
+
+# Nombre d'opérations conservées pour transformer les mises à jour envoyées sur une base ancienne
+HISTORY_SIZE = getattr(settings, 'COLLAB_HISTORY_SIZE', 1000)
+# Le document partagé est écrit dans Project.editor_content toutes les N mises à jour
+COMPACT_EVERY = getattr(settings, 'COLLAB_COMPACT_EVERY', 50)
+# Durée de l'inscription du processus propriétaire d'une salle dans le cache
+OWNER_TTL = getattr(settings, 'COLLAB_OWNER_TTL', 30)
+
+logger = logging.getLogger('api.collab')
+
+
+class CollabError(Exception):
+    pass
+
+
+class ResyncRequired(CollabError):
+    pass
+
+
+def parse_operations(patch):
+    """Convertit un patch de blocs (/root/children/i) en opérations (type, index, valeur).
+
+    L'index vaut None pour un ajout en fin de document ('-').
+    """
+    if not isinstance(patch, list):
+        raise CollabError("Le patch doit être une liste d'opérations")
+    operations = []
+    for operation in patch:
+        if not isinstance(operation, dict) or operation.get('op') not in ('add', 'remove', 'replace'):
+            raise CollabError("Opération non prise en charge")
+        path = str(operation.get('path', ''))
+        if not path.startswith('/root/children/'):
+            raise CollabError(f"Chemin non pris en charge : {path}")
+        position = path[len('/root/children/'):]
+        if position == '-' and operation['op'] == 'add':
+            index = None
+        elif position.isdigit():
+            index = int(position)
+        else:
+            raise CollabError(f"Chemin non pris en charge : {path}")
+        if operation['op'] != 'remove' and 'value' not in operation:
+            raise CollabError("Valeur manquante dans l'opération")
+        operations.append((operation['op'], index, operation.get('value')))
+    return operations
+
+
+def to_patch(operations):
+    return [
+        {'op': kind, 'path': f'/root/children/{index}', **({'value': value} if kind != 'remove' else {})}
+        for kind, index, value in operations
+    ]
+
+
+def transform(incoming, committed):
+    """Transforme deux opérations concurrentes l'une par rapport à l'autre.
+
+    Retourne (incoming', committed') : incoming' s'applique après committed, et inversement.
+    À index égal, l'opération déjà validée est considérée comme la première.
+    """
+    if incoming is None or committed is None:
+        return incoming, committed
+    a_kind, i, a_value = incoming
+    b_kind, k, b_value = committed
+    if i is None:
+        # Un ajout en fin de document ne décale aucun bloc existant
+        return incoming, committed
+
+    if b_kind == 'add':
+        if i >= k:
+            return (a_kind, i + 1, a_value), committed
+        if a_kind == 'add':
+            return incoming, (b_kind, k + 1, b_value)
+        if a_kind == 'remove':
+            return incoming, (b_kind, k - 1, b_value)
+        return incoming, committed
+
+    if b_kind == 'remove':
+        if a_kind == 'add':
+            if i <= k:
+                return incoming, (b_kind, k + 1, b_value)
+            return (a_kind, i - 1, a_value), committed
+        if i == k:
+            # Le bloc a déjà été supprimé
+            return None, (None if a_kind == 'remove' else committed)
+        if i < k:
+            return incoming, ((b_kind, k - 1, b_value) if a_kind == 'remove' else committed)
+        return (a_kind, i - 1, a_value), committed
+
+    # b_kind == 'replace'
+    if a_kind == 'add':
+        if i <= k:
+            return incoming, (b_kind, k + 1, b_value)
+        return incoming, committed
+    if a_kind == 'remove':
+        if i == k:
+            return incoming, None
+        if i < k:
+            return incoming, (b_kind, k - 1, b_value)
+        return incoming, committed
+    # Deux remplacements du même bloc : la mise à jour la plus récente l'emporte
+    return incoming, (None if i == k else committed)
+
+
+def rebase(operations, concurrent, children):
+    """Applique à `children` des opérations transformées par rapport à des opérations concurrentes validées avant.
+
+    La liste `concurrent` est transformée en même temps, comme dans Room.submit.
+    """
+    applied = []
+    for operation in operations:
+        for position, committed in enumerate(concurrent):
+            operation, concurrent[position] = transform(operation, committed)
+        if operation is not None:
+            applied.append(apply_operation(children, operation))
+    return applied
+
+
+def apply_operation(children, operation):
+    kind, index, value = operation
+    if index is None:
+        children.append(value)
+        return (kind, len(children) - 1, value)
+    if kind == 'add':
+        if index > len(children):
+            raise CollabError("Index hors limites")
+        children.insert(index, value)
+    elif index >= len(children):
+        raise CollabError("Index hors limites")
+    elif kind == 'remove':
+        children.pop(index)
+    else:
+        children[index] = value
+    return operation
+
+
+class Room:
+    """Document partagé d'un projet : ordre des mises à jour, transformation et présence."""
+
+    def __init__(self, project_id):
+        self.project_id = project_id
+        self.lock = asyncio.Lock()
+        self.document = None
+        self.seq = 0
+        self.history = deque(maxlen=HISTORY_SIZE)
+        self.presence = {}
+        self.pending = 0
+        # Opérations validées depuis le dernier enregistrement, rejouées si le projet change par ailleurs
+        self.unsaved = []
+        # Version du projet dont part le document partagé, comparée à la compaction, et son contenu
+        self.revision = None
+        self.content_hash = None
+        self.base = None
+
+    async def load(self):
+        if self.document is None:
+            self.document = await database_sync_to_async(self._load)()
+            self.base = self.snapshot()
+
+    def snapshot(self):
+        # submit() remplace la liste des blocs sans la modifier : une copie superficielle suffit
+        return {**self.document, 'root': {**self.document['root']}}
+
+    def _load(self, project=None):
+        if project is None:
+            project = Project.objects.only('editor_content', 'revision', 'content_hash').get(pk=self.project_id)
+        self.revision, self.content_hash = project.revision, project.content_hash
+        content = project.editor_content
+        try:
+            document = json.loads(content) if content else None
+        except ValueError:
+            document = None
+        root = document.get('root') if isinstance(document, dict) else None
+        if not isinstance(root, dict) or not isinstance(root.get('children'), list):
+            document = {'root': {'children': [], 'direction': None, 'format': '', 'indent': 0,
+                                 'type': 'root', 'version': 1}}
+        return document
+
+    def submit(self, base, patch):
+        """Transforme un patch envoyé sur la séquence `base`, l'applique et retourne les opérations validées."""
+        if base > self.seq:
+            raise ResyncRequired("Séquence de base inconnue")
+        missed = [operations for seq, operations in self.history if seq > base]
+        if self.seq - base > len(missed):
+            raise ResyncRequired("Historique insuffisant pour transformer la mise à jour")
+
+        concurrent = [operation for operations in missed for operation in operations]
+        # Travailler sur une copie pour qu'une opération invalide n'applique pas le patch à moitié
+        children = list(self.document['root']['children'])
+        applied = rebase(parse_operations(patch), concurrent, children)
+
+        self.document['root']['children'] = children
+        self.seq += 1
+        self.history.append((self.seq, applied))
+        self.unsaved.extend(applied)
+        self.pending += 1
+        return applied
+
+    async def compact(self, user_id=None):
+        """Écrit le document partagé dans le projet.
+
+        Si le projet a été enregistré par ailleurs (API REST) depuis le chargement, les opérations
+        validées depuis sont rejouées sur cette version avant l'écriture. Retourne False dans ce cas :
+        le document partagé a changé et les éditeurs doivent être resynchronisés.
+        """
+        if not self.pending:
+            return True
+        # Les compteurs ne sont remis à zéro qu'une fois l'écriture validée : en cas d'erreur, les
+        # modifications restent en attente de la compaction suivante
+        document = await database_sync_to_async(self._save)(user_id)
+        self.pending = 0
+        self.unsaved = []
+        if document is None:
+            self.base = self.snapshot()
+            return True
+        self.document = document
+        self.base = self.snapshot()
+        self.seq += 1
+        self.history.clear()
+        return False
+
+    def _save(self, user_id):
+        """Enregistre le document partagé ; retourne le document rebasé si le projet a changé entre-temps."""
+        with transaction.atomic():
+            project = Project.objects.select_for_update().get(pk=self.project_id)
+            document = None
+            if (project.revision, project.content_hash) != (self.revision, self.content_hash):
+                document = self._rebase(project)
+            content = json.dumps(document or self.document, ensure_ascii=False, separators=(',', ':'))
+            previous_content = project.editor_content
+            project.editor_content = content
+            project.revision += 1
+            project.defer_derived = True
+            project.save(update_fields=['editor_content', 'revision', 'updated_at'])
+            user = User.objects.filter(pk=user_id).first() if user_id is not None else None
+            record_revision(project, previous_content, user=user)
+            reindex_later(project, user)
+            self.revision, self.content_hash = project.revision, project.content_hash
+        return document
+
+    def _rebase(self, project):
+        """Rejoue les opérations non enregistrées sur la version du projet écrite par ailleurs.
+
+        Les modifications de cette version, relevées bloc par bloc depuis le contenu dont part la
+        salle, sont traitées comme validées avant les opérations de la salle.
+        """
+        document = self._load(project)
+        children = list(document['root']['children'])
+        concurrent = parse_operations(make_patch(
+            {'root': {'children': self.base['root']['children']}}, {'root': {'children': children}},
+        ))
+        for operation in self.unsaved:
+            try:
+                rebase([operation], concurrent, children)
+            except CollabError:
+                logger.warning("Salle collaborative %s : opération non rejouable écartée", self.project_id)
+        document['root']['children'] = children
+        return document
+
+
+def group_name(project_id):
+    return f'project_{project_id}'
+
+
+def owner_key(project_id):
+    return f'collab:owner:{project_id}'
+
+
+class RoomHost:
+    """Salles dont ce processus est propriétaire, servies sur un canal propre au processus.
+
+    Le propriétaire de chaque projet est inscrit dans le cache par défaut. Les consumers de tous
+    les processus lui transmettent arrivées, départs, curseurs et mises à jour par la couche de
+    canaux ; lui seul ordonne les mises à jour et les diffuse au groupe du projet.
+    """
+
+    def __init__(self, channel_layer):
+        self.channel_layer = channel_layer
+        self.loop = asyncio.get_running_loop()
+        self.channel = None
+        self.rooms = {}
+        self.tasks = []
+        self.started = None
+
+    async def start(self):
+        # Canal nommé plutôt que canal local (new_channel) : channels_redis lit les canaux locaux d'un
+        # processus dans une file commune, et un consumer annulé pendant cette lecture perd le message lu
+        self.channel = f'collab.{uuid.uuid4().hex}'
+        self.tasks = [asyncio.ensure_future(self.serve()), asyncio.ensure_future(self.renew())]
+
+    def stop(self):
+        for task in self.tasks:
+            task.cancel()
+
+    async def claim(self, project_id):
+        """Canal du propriétaire du projet, ce processus s'il n'y en a pas encore."""
+        key = owner_key(project_id)
+        await cache.aadd(key, self.channel, OWNER_TTL)
+        return await cache.aget(key) or self.channel
+
+    async def serve(self):
+        while True:
+            message = await self.channel_layer.receive(self.channel)
+            asyncio.ensure_future(self.dispatch(message)).add_done_callback(self.report)
+
+    def report(self, task):
+        if not task.cancelled() and task.exception() is not None:
+            logger.error("Salle collaborative : échec du traitement d'un message", exc_info=task.exception())
+
+    async def renew(self):
+        while True:
+            await asyncio.sleep(OWNER_TTL / 3)
+            for project_id in list(self.rooms):
+                key = owner_key(project_id)
+                if await cache.aget(key) == self.channel:
+                    await cache.atouch(key, OWNER_TTL)
+                    continue
+                # Inscription perdue (processus suspendu trop longtemps) : les modifications en attente
+                # sont enregistrées, le nouveau propriétaire les rejouera, puis les éditeurs se reconnectent
+                room = self.rooms[project_id]
+                async with room.lock:
+                    if self.rooms.get(project_id) is not room:
+                        continue
+                    user_id = next((editor['user_id'] for editor in room.presence.values()), None)
+                    try:
+                        await room.compact(user_id)
+                    except Exception:
+                        logger.exception("Salle collaborative %s : échec de l'enregistrement", project_id)
+                        continue
+                    del self.rooms[project_id]
+                    for channel in room.presence:
+                        await self.channel_layer.send(channel, {'type': 'collab.moved'})
+
+    async def dispatch(self, message):
+        project_id = message['project_id']
+        room = self.rooms.get(project_id)
+        if room is None:
+            if message['type'] != 'collab.join':
+                # Salle fermée entre-temps : l'éditeur doit se reconnecter
+                await self.channel_layer.send(message['reply_to'], {'type': 'collab.moved'})
+                return
+            room = self.rooms[project_id] = Room(project_id)
+        async with room.lock:
+            if self.rooms.get(project_id) is not room:
+                await self.channel_layer.send(message['reply_to'], {'type': 'collab.moved'})
+                return
+            handler = {
+                'collab.join': self.join, 'collab.leave': self.leave,
+                'collab.cursor': self.cursor, 'collab.submit': self.submit, 'collab.snapshot': self.snapshot,
+            }[message['type']]
+            await handler(room, message)
+
+    async def join(self, room, message):
+        await room.load()
+        await self.channel_layer.group_add(group_name(room.project_id), message['reply_to'])
+        room.presence[message['reply_to']] = {
+            'user_id': message['user_id'], 'username': message['username'], 'cursor': None,
+        }
+        # Envoyé sous verrou : le document correspond exactement à la séquence annoncée
+        await self.channel_layer.send(message['reply_to'], {
+            'type': 'collab.init',
+            'seq': room.seq,
+            'document': room.document,
+            'presence': list(room.presence.values()),
+        })
+        await self.broadcast_presence(room)
+
+    async def leave(self, room, message):
+        room.presence.pop(message['reply_to'], None)
+        await self.channel_layer.group_discard(group_name(room.project_id), message['reply_to'])
+        if room.presence:
+            await self.broadcast_presence(room)
+            return
+        await room.compact(message['user_id'])
+        del self.rooms[room.project_id]
+        key = owner_key(room.project_id)
+        if await cache.aget(key) == self.channel:
+            await cache.adelete(key)
+
+    async def cursor(self, room, message):
+        if message['reply_to'] in room.presence:
+            room.presence[message['reply_to']]['cursor'] = message['cursor']
+            await self.broadcast_presence(room)
+
+    async def snapshot(self, room, message):
+        await self.channel_layer.send(message['reply_to'], {
+            'type': 'collab.resync', 'seq': room.seq, 'document': room.document,
+        })
+
+    async def submit(self, room, message):
+        try:
+            applied = room.submit(message['base'], message['patch'])
+        except ResyncRequired:
+            await self.snapshot(room, message)
+            return
+        except CollabError as e:
+            await self.channel_layer.send(message['reply_to'], {'type': 'collab.error', 'detail': str(e)})
+            return
+
+        # Diffusé sous verrou pour que tous les éditeurs reçoivent les mises à jour dans l'ordre des séquences
+        await self.channel_layer.group_send(group_name(room.project_id), {
+            'type': 'collab.update',
+            'seq': room.seq,
+            'patch': to_patch(applied),
+            'sender': message['reply_to'],
+            'client_id': message['client_id'],
+        })
+        if room.pending >= COMPACT_EVERY and not await room.compact(message['user_id']):
+            await self.channel_layer.group_send(group_name(room.project_id), {
+                'type': 'collab.resync', 'seq': room.seq, 'document': room.document,
+            })
+
+    async def broadcast_presence(self, room):
+        await self.channel_layer.group_send(group_name(room.project_id), {
+            'type': 'collab.presence',
+            'presence': list(room.presence.values()),
+        })
+
+
+_host = None
+
+
+async def get_host(channel_layer):
+    """Hôte des salles de ce processus, démarré à la première connexion sur la boucle courante."""
+    global _host
+    if _host is None or _host.loop is not asyncio.get_running_loop():
+        # Enregistré avant d'attendre le démarrage : les connexions simultanées partagent le même hôte
+        _host = RoomHost(channel_layer)
+        _host.started = asyncio.ensure_future(_host.start())
+    host = _host
+    await host.started
+    return host
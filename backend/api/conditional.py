@@ -0,0 +1,41 @@
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+# En-têtes qui permettent de répondre 304 sans lire le contenu du projet
+VALIDATOR_HEADERS = ('HTTP_IF_NONE_MATCH', 'HTTP_IF_MODIFIED_SINCE')
+
+
+class PreconditionFailed(APIException):
+    status_code = status.HTTP_412_PRECONDITION_FAILED
+    default_detail = 'Le projet a été modifié depuis la version indiquée'
+    default_code = 'precondition_failed'
+
+
+def has_validators(request):
+    return any(header in request.META for header in VALIDATOR_HEADERS)
+
+
+def set_validators(response, project):
+    response['ETag'] = project.etag
+    response['Last-Modified'] = http_date(project.updated_at.timestamp())
+    # Le navigateur garde sa copie mais la revalide à chaque ouverture de l'éditeur
+    response['Cache-Control'] = 'private, no-cache'
+    return response
+
+
+def conditional_response(request, project):
+    """Réponse 304 (ou 412) si les en-têtes conditionnels de la requête le permettent, sinon None."""
+    response = get_conditional_response(
+        request, etag=project.etag, last_modified=int(project.updated_at.timestamp()),
+    )
+    if response is not None:
+        set_validators(response, project)
+    return response
+
+
+def check_preconditions(request, project):
+    """Vérifie If-Match / If-Unmodified-Since avant une modification (verrou d'écriture déjà pris)."""
+    if conditional_response(request, project) is not None:
+        raise PreconditionFailed()
@@ -0,0 +1,137 @@
+import asyncio
+
+from channels.db import database_sync_to_async
+from channels.generic.websocket import AsyncJsonWebsocketConsumer
+from django.core.cache import cache
+
+from .collab import get_host, owner_key
+from .models import Project
+
+# Délai d'attente de l'état initial : au-delà, le propriétaire de la salle est considéré comme arrêté
+JOIN_TIMEOUT = 10
+
+
+class ProjectConsumer(AsyncJsonWebsocketConsumer):
+    """Canal d'édition collaborative d'un projet.
+
+    Messages reçus : {"type": "update", "base": seq, "patch": [...]} et {"type": "cursor", "cursor": ...}.
+    Messages envoyés : init, update, resync, presence et error. La connexion est fermée avec le
+    code 4409 quand la salle change de processus propriétaire : le client se reconnecte.
+    """
+
+    async def __call__(self, scope, receive, send):
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            # Quitter la salle même si le consumer s'arrête sans traiter la déconnexion
+            if getattr(self, 'owner', None) is not None:
+                await self.leave()
+
+    async def connect(self):
+        self.owner = None
+        self.join_timeout = None
+        self.joined = False
+        # Dernière séquence transmise au client ; None pendant une demande de resynchronisation
+        self.seq = None
+        user = self.scope['user']
+        self.project_id = self.scope['url_route']['kwargs']['project_id']
+        if not user.is_authenticated or not await self.can_edit(user):
+            await self.close(code=4403)
+            return
+
+        await self.accept()
+        host = await get_host(self.channel_layer)
+        self.owner = await host.claim(self.project_id)
+        await self.forward('collab.join', username=user.username)
+        self.join_timeout = asyncio.ensure_future(self.expect_init())
+
+    async def expect_init(self):
+        await asyncio.sleep(JOIN_TIMEOUT)
+        if not self.joined:
+            # Le propriétaire inscrit ne répond pas : libérer l'inscription pour la prochaine connexion
+            key = owner_key(self.project_id)
+            if await cache.aget(key) == self.owner:
+                await cache.adelete(key)
+            await self.close(code=4409)
+
+    async def disconnect(self, code):
+        if self.owner is not None:
+            await self.leave()
+
+    async def leave(self):
+        if self.join_timeout is not None:
+            self.join_timeout.cancel()
+        await self.forward('collab.leave')
+        self.owner = None
+
+    async def send_json(self, content, close=False):
+        try:
+            await super().send_json(content, close)
+        except (RuntimeError, OSError):
+            # Diffusion reçue entre la fermeture par le client et le traitement de la déconnexion
+            pass
+
+    async def forward(self, message_type, **message):
+        await self.channel_layer.send(self.owner, {
+            'type': message_type,
+            'project_id': self.project_id,
+            'reply_to': self.channel_name,
+            'user_id': self.scope['user'].id,
+            **message,
+        })
+
+    async def receive_json(self, content, **kwargs):
+        message_type = content.get('type')
+        if message_type == 'update':
+            if not isinstance(content.get('base'), int):
+                await self.send_json({'type': 'error', 'detail': "Séquence de base manquante"})
+                return
+            await self.forward(
+                'collab.submit', base=content['base'], patch=content.get('patch'), client_id=content.get('client_id'),
+            )
+        elif message_type == 'cursor':
+            await self.forward('collab.cursor', cursor=content.get('cursor'))
+        else:
+            await self.send_json({'type': 'error', 'detail': "Type de message inconnu"})
+
+    async def collab_init(self, event):
+        self.joined = True
+        self.seq = event['seq']
+        await self.send_json({
+            'type': 'init', 'seq': event['seq'], 'document': event['document'], 'presence': event['presence'],
+        })
+
+    async def collab_update(self, event):
+        if self.seq is None or event['seq'] <= self.seq:
+            # Déjà inclus dans l'état complet envoyé ou attendu
+            return
+        if event['seq'] != self.seq + 1:
+            # Une diffusion a été perdue (canal plein) : redemander l'état complet
+            self.seq = None
+            await self.forward('collab.snapshot')
+            return
+        self.seq = event['seq']
+        await self.send_json({
+            'type': 'update',
+            'seq': event['seq'],
+            'patch': event['patch'],
+            'own': event['sender'] == self.channel_name,
+            'client_id': event['client_id'],
+        })
+
+    async def collab_resync(self, event):
+        self.seq = event['seq']
+        await self.send_json({'type': 'resync', 'seq': event['seq'], 'document': event['document']})
+
+    async def collab_error(self, event):
+        await self.send_json({'type': 'error', 'detail': event['detail']})
+
+    async def collab_presence(self, event):
+        await self.send_json({'type': 'presence', 'presence': event['presence']})
+
+    async def collab_moved(self, event):
+        await self.close(code=4409)
+
+    @database_sync_to_async
+    def can_edit(self, user):
+        return Project.objects.filter(pk=self.project_id, user=user).exists()
@@ -0,0 +1,120 @@
+import zlib
+
+from django.conf import settings
+from django.db import models
+from django.db.models.query_utils import DeferredAttribute
+
+# En-tête des valeurs stockées : préfixe puis version du format
+MAGIC = b'SCZ'
+RAW = 0
+GZIP = 1
+# Enveloppe d'un contenu découpé en morceaux (ProjectChunk) : état Lexical sans les blocs de premier niveau
+CHUNKED = 2
+COMPRESSION_LEVEL = getattr(settings, 'EDITOR_CONTENT_COMPRESSION_LEVEL', 6)
+
+
+class CompressedText:
+    """Texte tel que stocké en base, décompressé seulement à la demande."""
+
+    __slots__ = ('data',)
+
+    def __init__(self, data):
+        self.data = bytes(data)
+
+    @classmethod
+    def encode(cls, text):
+        raw = text.encode('utf-8')
+        # Conteneur gzip : les octets stockés peuvent être servis tels quels avec Content-Encoding: gzip
+        compressor = zlib.compressobj(COMPRESSION_LEVEL, zlib.DEFLATED, 31)
+        compressed = compressor.compress(raw) + compressor.flush()
+        if len(compressed) < len(raw):
+            return cls(MAGIC + bytes([GZIP]) + compressed)
+        return cls(MAGIC + bytes([RAW]) + raw)
+
+    @classmethod
+    def envelope(cls, text):
+        return cls(MAGIC + bytes([CHUNKED]) + text.encode('utf-8'))
+
+    @property
+    def version(self):
+        # Les valeurs sans en-tête sont du texte UTF-8 écrit avant la compression
+        return self.data[len(MAGIC)] if self.data.startswith(MAGIC) and len(self.data) > len(MAGIC) else None
+
+    @property
+    def is_gzip(self):
+        return self.version == GZIP
+
+    @property
+    def payload(self):
+        return self.data if self.version is None else self.data[len(MAGIC) + 1:]
+
+    def decode(self):
+        if self.version == GZIP:
+            return zlib.decompress(self.payload, 31).decode('utf-8')
+        return self.payload.decode('utf-8')
+
+
+def stored_text(value):
+    """Valeur d'un CompressedTextField sous sa forme stockée (None pour un contenu absent)."""
+    if value is None or isinstance(value, CompressedText):
+        return value
+    return CompressedText.encode(decoded_text(value))
+
+
+def decoded_text(value):
+    # Hors texte déjà décodé, les valeurs (CompressedText, ChunkedContent) se décodent à la demande
+    return value if value is None or isinstance(value, str) else value.decode()
+
+
+class CompressedTextDescriptor(DeferredAttribute):
+    def __get__(self, instance, cls=None):
+        if instance is None:
+            return self
+        value = super().__get__(instance, cls)
+        if value is not None and not isinstance(value, str):
+            value = instance.__dict__[self.field.attname] = value.decode()
+        return value
+
+    def __set__(self, instance, value):
+        # Descripteur de données : sinon la valeur chargée dans __dict__ masquerait __get__
+        instance.__dict__[self.field.attname] = value
+
+
+class CompressedTextField(models.TextField):
+    """Texte stocké compressé (gzip avec en-tête de version) dans une colonne binaire.
+
+    Les instances ne décompressent la valeur qu'au premier accès à l'attribut ;
+    values() et values_list() renvoient des CompressedText.
+    """
+
+    descriptor_class = CompressedTextDescriptor
+
+    def get_internal_type(self):
+        return 'BinaryField'
+
+    def pre_save(self, model_instance, add):
+        # Une valeur déjà sous sa forme stockée est écrite telle quelle, sans passer par le descripteur
+        value = model_instance.__dict__.get(self.attname)
+        if isinstance(value, CompressedText):
+            return value
+        return super().pre_save(model_instance, add)
+
+    def from_db_value(self, value, expression, connection):
+        if value is None:
+            return None
+        return CompressedText(value)
+
+    def to_python(self, value):
+        if isinstance(value, (bytes, memoryview)):
+            value = CompressedText(value)
+        return decoded_text(value)
+
+    def get_prep_value(self, value):
+        value = stored_text(value)
+        return None if value is None else value.data
+
+    def get_db_prep_value(self, value, connection, prepared=False):
+        value = super().get_db_prep_value(value, connection, prepared)
+        if value is not None:
+            return connection.Database.Binary(value)
+        return value
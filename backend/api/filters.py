@@ -0,0 +1,12 @@
+import django_filters
+
+from .models import Annotation
+
+
+class AnnotationFilter(django_filters.FilterSet):
+    created_after = django_filters.IsoDateTimeFilter(field_name='created_at', lookup_expr='gte')
+    created_before = django_filters.IsoDateTimeFilter(field_name='created_at', lookup_expr='lt')
+
+    class Meta:
+        model = Annotation
+        fields = ['text', 'project', 'user', 'detached']
@@ -0,0 +1,14 @@
+from django.conf import settings
+from django.contrib.auth import hashers
+
+
+class PBKDF2PasswordHasher(hashers.PBKDF2PasswordHasher):
+    """PBKDF2-SHA256 dont le nombre d'itérations se règle par PASSWORD_PBKDF2_ITERATIONS.
+
+    Même algorithme que le hacheur de Django : les mots de passe existants restent valides et
+    sont recalculés avec le nouveau réglage à la connexion suivante.
+    """
+
+    @property
+    def iterations(self):
+        return getattr(settings, 'PASSWORD_PBKDF2_ITERATIONS', hashers.PBKDF2PasswordHasher.iterations)
@@ -0,0 +1,219 @@
+import logging
+import os
+import socket
+import threading
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import DatabaseError, IntegrityError, close_old_connections, connections, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .models import Job, Project, ProjectDerivedData, ProjectRevision
+from .revisions import reconstruct_content
+
+logger = logging.getLogger('api.jobs')
+
+# Fonctions d'exécution par type de tâche, enregistrées avec @handler
+HANDLERS = {}
+
+
+def handler(kind):
+    def register(func):
+        HANDLERS[kind] = func
+        return func
+    return register
+
+
+def enqueue(kind, payload=None, user=None, run_at=None, max_attempts=None):
+    if kind not in HANDLERS:
+        raise ValueError(f"Type de tâche inconnu : {kind}")
+    return Job.objects.create(
+        kind=kind,
+        payload=payload or {},
+        user=user,
+        run_at=run_at or timezone.now(),
+        max_attempts=max_attempts or getattr(settings, 'JOB_MAX_ATTEMPTS', 5),
+    )
+
+
+def enqueue_once(kind, payload=None, user=None):
+    """Comme enqueue, sauf si une tâche identique attend déjà son tour.
+
+    La contrainte job_queued_unique tranche entre deux appels concurrents : le second retrouve
+    la tâche créée par le premier.
+    """
+    while True:
+        job = Job.objects.filter(kind=kind, payload=payload or {}, status=Job.QUEUED).first()
+        if job is not None:
+            return job
+        try:
+            with transaction.atomic():
+                return enqueue(kind, payload, user=user)
+        except IntegrityError:
+            continue
+
+
+def reindex_later(project, user=None):
+    """Met en file project.reindex une fois la transaction en cours validée (sauvegarde avec defer_derived)."""
+    transaction.on_commit(lambda: enqueue_once('project.reindex', {'project': project.pk}, user=user))
+
+
+def retry_delay(attempts):
+    """Attente exponentielle avant la tentative suivante, plafonnée à JOB_RETRY_MAX secondes."""
+    base = getattr(settings, 'JOB_RETRY_BASE', 5)
+    return min(base * 2 ** (attempts - 1), getattr(settings, 'JOB_RETRY_MAX', 600))
+
+
+def claim(worker_id, limit=1):
+    """Prend jusqu'à `limit` tâches prêtes.
+
+    SKIP LOCKED fait passer les workers concurrents aux lignes suivantes au lieu de les attendre.
+    Une tâche restée en cours plus de JOB_LOCK_TIMEOUT secondes (worker arrêté brutalement)
+    est reprise.
+    """
+    now = timezone.now()
+    stale = now - timedelta(seconds=getattr(settings, 'JOB_LOCK_TIMEOUT', 600))
+    with transaction.atomic():
+        ids = list(
+            Job.objects.select_for_update(skip_locked=True)
+            .filter(Q(status=Job.QUEUED, run_at__lte=now) | Q(status=Job.RUNNING, locked_at__lt=stale))
+            .order_by('run_at', 'id')
+            .values_list('id', flat=True)[:limit]
+        )
+        if not ids:
+            return []
+        Job.objects.filter(id__in=ids).update(
+            status=Job.RUNNING, attempts=F('attempts') + 1, locked_by=worker_id, locked_at=now,
+        )
+    return list(Job.objects.filter(id__in=ids, locked_by=worker_id).order_by('run_at', 'id'))
+
+
+def _finish(job, **fields):
+    # Sans effet si la tâche a été reprise entre-temps par un autre worker
+    return Job.objects.filter(pk=job.pk, locked_by=job.locked_by, status=Job.RUNNING).update(**fields)
+
+
+def run_job(job):
+    """Exécute une tâche prise par `claim` et enregistre son résultat, ou la replanifie en cas d'échec."""
+    if job.attempts > job.max_attempts:
+        _finish(job, status=Job.FAILED, error="Abandonnée : nombre maximal de tentatives atteint",
+                finished_at=timezone.now())
+        return False
+    try:
+        func = HANDLERS.get(job.kind)
+        if func is None:
+            raise LookupError(f"Type de tâche inconnu : {job.kind}")
+        result = func(job)
+    except Exception:
+        error = traceback.format_exc()
+        logger.warning("Tâche %s #%s : échec de la tentative %d", job.kind, job.pk, job.attempts, exc_info=True)
+        if job.attempts < job.max_attempts:
+            try:
+                with transaction.atomic():
+                    _finish(job, status=Job.QUEUED, error=error, locked_by='', locked_at=None,
+                            run_at=timezone.now() + timedelta(seconds=retry_delay(job.attempts)))
+                return False
+            except IntegrityError:
+                # Une tâche identique a été mise en file pendant l'exécution : elle refera le travail
+                pass
+        _finish(job, status=Job.FAILED, error=error, finished_at=timezone.now())
+        return False
+    _finish(job, status=Job.SUCCEEDED, result=result, error='', finished_at=timezone.now())
+    return True
+
+
+class Worker:
+    """Boucle de traitement sur `threads` fils, chacun avec sa propre connexion à la base."""
+
+    def __init__(self, threads=1, poll_interval=None, burst=False, name=None, batch=1):
+        self.threads = threads
+        # Tâches prises par requête : moins d'allers-retours, mais réservées par un seul fil
+        self.batch = batch
+        self.poll_interval = poll_interval or getattr(settings, 'JOB_POLL_INTERVAL', 1.0)
+        # En mode rafale, chaque fil s'arrête dès que la file est vide
+        self.burst = burst
+        self.name = name or f'{socket.gethostname()}:{os.getpid()}'
+        self.stop_event = threading.Event()
+        self.processed = 0
+        self.lock = threading.Lock()
+
+    def stop(self, *args):
+        self.stop_event.set()
+
+    def run(self):
+        threads = [
+            threading.Thread(target=self.loop, args=(f'{self.name}:{index}',), daemon=True)
+            for index in range(self.threads)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            # Attente par intervalles pour que le fil principal reste réactif aux signaux
+            while thread.is_alive():
+                thread.join(0.5)
+        return self.processed
+
+    def loop(self, worker_id):
+        try:
+            while not self.stop_event.is_set():
+                close_old_connections()
+                try:
+                    jobs = claim(worker_id, self.batch)
+                    if not jobs:
+                        if self.burst:
+                            break
+                        self.stop_event.wait(self.poll_interval)
+                        continue
+                    # Un lot réservé est traité jusqu'au bout, même si l'arrêt est demandé entre-temps
+                    for job in jobs:
+                        run_job(job)
+                        with self.lock:
+                            self.processed += 1
+                except DatabaseError:
+                    # Connexion perdue ou base indisponible : une tâche non terminée sera reprise
+                    # après JOB_LOCK_TIMEOUT, la boucle réessaie après une pause
+                    logger.warning("Worker %s : file inaccessible", worker_id, exc_info=True)
+                    connections.close_all()
+                    self.stop_event.wait(self.poll_interval)
+        finally:
+            connections.close_all()
+
+
+def reindex(project_id):
+    """Recalcule un projet relu sous le verrou de ses données dérivées.
+
+    Deux recalculs du même projet ne se chevauchent pas ; les annotations ajoutées à la main sont
+    recalées depuis la révision où elles l'ont été pour la dernière fois. Retourne False si le projet
+    n'existe plus ou a changé entre-temps.
+    """
+    with transaction.atomic():
+        derived = ProjectDerivedData.objects.select_for_update().filter(project_id=project_id).first()
+        project = Project.objects.filter(pk=project_id).first()
+        if project is None:
+            return False
+        previous_content = None
+        anchor = derived.anchor_revision if derived is not None else None
+        if anchor is not None and anchor != project.revision:
+            try:
+                previous_content = reconstruct_content(project, anchor)
+            except ProjectRevision.DoesNotExist:
+                logger.warning("Projet %s : révision %s introuvable, annotations non recalées", project_id, anchor)
+        return project.reindex(previous_content)
+
+
+@handler('project.reindex')
+def reindex_project(job):
+    project_id = job.payload.get('project')
+    if not reindex(project_id):
+        return {'skipped': True}
+    return {'project': project_id}
+
+
+@handler('workspace.reindex')
+def reindex_workspace(job):
+    count = 0
+    for project_id in Project.objects.filter(user_id=job.user_id).order_by('id').values_list('id', flat=True):
+        count += reindex(project_id)
+    return {'projects': count}
@@ -0,0 +1,161 @@
+import copy
+
+
+class JsonPatchError(Exception):
+    pass
+
+
+def _parse_pointer(pointer):
+    if pointer == '':
+        return []
+    if not pointer.startswith('/'):
+        raise JsonPatchError(f"Pointeur JSON invalide : {pointer}")
+    return [part.replace('~1', '/').replace('~0', '~') for part in pointer[1:].split('/')]
+
+
+def _index(container, part, allow_end=False):
+    if part == '-' and allow_end:
+        return len(container)
+    if not part.isdigit() or (len(part) > 1 and part.startswith('0')):
+        raise JsonPatchError(f"Index de liste invalide : {part}")
+    index = int(part)
+    limit = len(container) + 1 if allow_end else len(container)
+    if index >= limit:
+        raise JsonPatchError(f"Index de liste hors limites : {part}")
+    return index
+
+
+def _resolve(document, parts):
+    node = document
+    for part in parts:
+        if isinstance(node, list):
+            node = node[_index(node, part)]
+        elif isinstance(node, dict):
+            if part not in node:
+                raise JsonPatchError(f"Chemin introuvable : {part}")
+            node = node[part]
+        else:
+            raise JsonPatchError(f"Chemin introuvable : {part}")
+    return node
+
+
+def _get(document, pointer):
+    return _resolve(document, _parse_pointer(pointer))
+
+
+def _add(document, pointer, value):
+    parts = _parse_pointer(pointer)
+    if not parts:
+        return value
+    parent = _resolve(document, parts[:-1])
+    key = parts[-1]
+    if isinstance(parent, list):
+        parent.insert(_index(parent, key, allow_end=True), value)
+    elif isinstance(parent, dict):
+        parent[key] = value
+    else:
+        raise JsonPatchError(f"Impossible d'ajouter à : {pointer}")
+    return document
+
+
+def _remove(document, pointer):
+    parts = _parse_pointer(pointer)
+    if not parts:
+        raise JsonPatchError("Impossible de supprimer la racine du document")
+    parent = _resolve(document, parts[:-1])
+    key = parts[-1]
+    if isinstance(parent, list):
+        return parent.pop(_index(parent, key))
+    if isinstance(parent, dict) and key in parent:
+        return parent.pop(key)
+    raise JsonPatchError(f"Chemin introuvable : {pointer}")
+
+
+def apply_patch(document, operations):
+    """Applique une liste d'opérations RFC 6902 (le document est modifié sur place)."""
+    if not isinstance(operations, list):
+        raise JsonPatchError("Le patch doit être une liste d'opérations")
+
+    for operation in operations:
+        if not isinstance(operation, dict) or 'op' not in operation or 'path' not in operation:
+            raise JsonPatchError("Opération de patch invalide")
+        try:
+            document = _apply_operation(document, operation)
+        except KeyError as e:
+            raise JsonPatchError(f"Champ manquant dans l'opération : {e.args[0]}") from e
+    return document
+
+
+def _apply_operation(document, operation):
+    op = operation['op']
+    path = operation['path']
+
+    if op == 'add':
+        document = _add(document, path, copy.deepcopy(operation['value']))
+    elif op == 'remove':
+        _remove(document, path)
+    elif op == 'replace':
+        if _parse_pointer(path):
+            _remove(document, path)
+        document = _add(document, path, copy.deepcopy(operation['value']))
+    elif op == 'move':
+        if path.startswith(operation['from'] + '/'):
+            raise JsonPatchError("Impossible de déplacer un nœud dans ses propres enfants")
+        value = _remove(document, operation['from'])
+        document = _add(document, path, value)
+    elif op == 'copy':
+        document = _add(document, path, copy.deepcopy(_get(document, operation['from'])))
+    elif op == 'test':
+        if _get(document, path) != operation['value']:
+            raise JsonPatchError(f"Le test a échoué pour : {path}")
+    else:
+        raise JsonPatchError(f"Opération inconnue : {op}")
+    return document
+
+
+def make_patch(previous, current):
+    """Calcule un patch au niveau des blocs de premier niveau d'un état Lexical.
+
+    Retourne None si les documents n'ont pas la forme attendue.
+    """
+    previous_root = previous.get('root') if isinstance(previous, dict) else None
+    current_root = current.get('root') if isinstance(current, dict) else None
+    if not isinstance(previous_root, dict) or not isinstance(current_root, dict):
+        return None
+    if previous.keys() != current.keys() or any(previous[k] != current[k] for k in previous if k != 'root'):
+        return None
+    previous_children = previous_root.get('children')
+    current_children = current_root.get('children')
+    if not isinstance(previous_children, list) or not isinstance(current_children, list):
+        return None
+
+    previous_attributes = {k: v for k, v in previous_root.items() if k != 'children'}
+    current_attributes = {k: v for k, v in current_root.items() if k != 'children'}
+    if previous_attributes != current_attributes:
+        return [{'op': 'replace', 'path': '/root', 'value': current_root}]
+
+    # Les blocs inchangés en tête et en fin sont écartés : un bloc inséré ou supprimé au milieu
+    # du document ne décale plus tous les suivants
+    prefix = 0
+    limit = min(len(previous_children), len(current_children))
+    while prefix < limit and previous_children[prefix] == current_children[prefix]:
+        prefix += 1
+    suffix = 0
+    while (
+        suffix < limit - prefix
+        and previous_children[-1 - suffix] == current_children[-1 - suffix]
+    ):
+        suffix += 1
+    previous_middle = previous_children[prefix:len(previous_children) - suffix]
+    current_middle = current_children[prefix:len(current_children) - suffix]
+
+    operations = []
+    common = min(len(previous_middle), len(current_middle))
+    for i in range(common):
+        if previous_middle[i] != current_middle[i]:
+            operations.append({'op': 'replace', 'path': f'/root/children/{prefix + i}', 'value': current_middle[i]})
+    for i in range(common, len(current_middle)):
+        operations.append({'op': 'add', 'path': f'/root/children/{prefix + i}', 'value': current_middle[i]})
+    for i in range(len(previous_middle) - 1, common - 1, -1):
+        operations.append({'op': 'remove', 'path': f'/root/children/{prefix + i}'})
+    return operations
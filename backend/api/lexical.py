@@ -0,0 +1,104 @@
+import json
+from collections import namedtuple
+
+EXCERPT_LENGTH = 200
+
+Derived = namedtuple('Derived', ['blocks', 'comments', 'outline'])
+
+
+def load_state(content):
+    """Retourne l'état Lexical désérialisé, ou None si le contenu n'est pas du JSON valide."""
+    if not content:
+        return None
+    try:
+        state = json.loads(content)
+    except ValueError:
+        return None
+    return state if isinstance(state, dict) else None
+
+
+def _collect(node, position, comments):
+    """Texte brut d'un nœud ; les nœuds de commentaire rencontrés sont ajoutés à `comments`."""
+    if node.get('type') == 'linebreak':
+        return '\n'
+    if isinstance(node.get('text'), str):
+        return node['text']
+    children = node.get('children')
+    if not isinstance(children, list):
+        return ''
+
+    parts = []
+    length = 0
+    for child in children:
+        if isinstance(child, dict):
+            part = _collect(child, position + length, comments)
+            parts.append(part)
+            length += len(part)
+    text = ''.join(parts)
+
+    if comments is not None and node.get('type') == 'comment' and node.get('uuid'):
+        comments.append({
+            'uuid': str(node['uuid']),
+            'text': text,
+            'comments': node.get('comments') if isinstance(node.get('comments'), list) else [],
+            'start_index': position,
+            'end_index': position + len(text),
+        })
+    return text
+
+
+def _blocks(state):
+    root = state.get('root') if isinstance(state, dict) else None
+    children = root.get('children') if isinstance(root, dict) else None
+    if not isinstance(children, list):
+        return []
+    return [child for child in children if isinstance(child, dict)]
+
+
+def block_texts(state):
+    """Texte brut de chaque bloc de premier niveau de l'éditeur."""
+    return [_collect(block, 0, None) for block in _blocks(state)]
+
+
+def extract_text(state):
+    return '\n'.join(block_texts(state))
+
+
+def derive(state):
+    """Texte de chaque bloc, commentaires et plan (titres) du document, en un seul parcours."""
+    blocks = []
+    comments = []
+    outline = []
+    position = 0
+    for block in _blocks(state):
+        text = _collect(block, position, comments)
+        if block.get('type') == 'heading':
+            level = str(block.get('tag', ''))[1:]
+            outline.append({
+                'level': int(level) if level.isdigit() else 1,
+                'text': text,
+                'block': len(blocks),
+                'start_index': position,
+            })
+        blocks.append(text)
+        position += len(text) + 1
+    return Derived(blocks, comments, outline)
+
+
+def plain_text(content, state=None):
+    """Texte brut d'un contenu d'éditeur ; le contenu est repris tel quel s'il n'est pas un état Lexical."""
+    if not content:
+        return ''
+    if state is None:
+        state = load_state(content)
+    return extract_text(state) if state is not None else content
+
+
+def summarize(content, text=None):
+    """Taille en octets, nombre de mots et extrait d'un contenu d'éditeur."""
+    if not content:
+        return 0, 0, ''
+    if text is None:
+        text = plain_text(content)
+    excerpt = ' '.join(text.split())[:EXCERPT_LENGTH]
+    return len(content.encode('utf-8')), len(text.split()), excerpt
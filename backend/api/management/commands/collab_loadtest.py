@@ -0,0 +1,34 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api.benchmark import collab_run
+
+
+class Command(BaseCommand):
+    help = "Édition simultanée d'un projet de mesure par plusieurs connexions WebSocket"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--editors', type=int, default=50, help="Connexions simultanées sur le même projet")
+        parser.add_argument('--updates', type=int, default=20, help="Patchs envoyés par éditeur")
+        parser.add_argument('--interval', type=float, default=0.0, help="Pause (s) entre deux patchs d'un éditeur")
+        parser.add_argument('--project', type=int, help="Projet édité (par défaut, le premier projet de mesure)")
+        parser.add_argument(
+            '--url', help="Serveur lancé à part, par exemple ws://127.0.0.1:8000 (en processus par défaut)",
+        )
+        parser.add_argument('--output', help="Fichier où écrire le rapport JSON")
+
+    def handle(self, *args, **options):
+        try:
+            report = collab_run(
+                editors=max(1, options['editors']), updates=max(1, options['updates']),
+                interval=max(0.0, options['interval']), url=options['url'], project_id=options['project'],
+            )
+        except ValueError as e:
+            raise CommandError(str(e))
+        self.stdout.write(json.dumps(report, indent=2, ensure_ascii=False))
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as f:
+                json.dump(report, f, indent=2, ensure_ascii=False)
+        if not report['converged']:
+            raise CommandError("Les éditeurs n'ont pas convergé vers le même document")
@@ -0,0 +1,31 @@
+import sys
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from api.workspace import export_ndjson, export_zip
+
+
+class Command(BaseCommand):
+    help = "Exporte les projets, textes et annotations d'un utilisateur en NDJSON ou en archive zip"
+
+    def add_arguments(self, parser):
+        parser.add_argument('username')
+        parser.add_argument('--output', help="Fichier de destination (sortie standard par défaut)")
+        parser.add_argument('--zip', action='store_true', help="Produire une archive zip")
+
+    def handle(self, *args, **options):
+        try:
+            user = User.objects.get(username=options['username'])
+        except User.DoesNotExist:
+            raise CommandError(f"Utilisateur introuvable : {options['username']}")
+
+        chunks = export_zip(user) if options['zip'] else export_ndjson(user)
+        if options['output']:
+            with open(options['output'], 'wb') as output:
+                for chunk in chunks:
+                    output.write(chunk)
+            self.stderr.write(self.style.SUCCESS(f"Export écrit dans {options['output']}"))
+        else:
+            for chunk in chunks:
+                sys.stdout.buffer.write(chunk)
@@ -0,0 +1,33 @@
+import zipfile
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from api.workspace import WorkspaceImporter, WorkspaceImportError, iter_archive_lines
+
+
+class Command(BaseCommand):
+    help = "Importe un export NDJSON ou zip dans l'espace de travail d'un utilisateur"
+
+    def add_arguments(self, parser):
+        parser.add_argument('username')
+        parser.add_argument('path', help="Fichier NDJSON ou archive zip produit par export_workspace")
+
+    def handle(self, *args, **options):
+        try:
+            user = User.objects.get(username=options['username'])
+        except User.DoesNotExist:
+            raise CommandError(f"Utilisateur introuvable : {options['username']}")
+
+        try:
+            with open(options['path'], 'rb') as source:
+                lines = iter_archive_lines(source) if zipfile.is_zipfile(source) else source
+                source.seek(0)
+                counts = WorkspaceImporter(user).run(lines)
+        except (OSError, WorkspaceImportError) as e:
+            raise CommandError(str(e))
+
+        self.stdout.write(self.style.SUCCESS(
+            f"{counts['projects']} projet(s), {counts['texts']} texte(s) et "
+            f"{counts['annotations']} annotation(s) importé(s)"
+        ))
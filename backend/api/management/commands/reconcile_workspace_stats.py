@@ -0,0 +1,50 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from api.models import UserWorkspaceStats
+
+
+class Command(BaseCommand):
+    help = "Recompte les statistiques d'espace de travail (UserWorkspaceStats) et corrige les écarts"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', help="Limiter le recomptage à un utilisateur (nom d'utilisateur)")
+        parser.add_argument('--batch', type=int, default=500, help="Utilisateurs recomptés par transaction")
+
+    def handle(self, *args, **options):
+        users = User.objects.order_by('id')
+        if options['user']:
+            users = users.filter(username=options['user'])
+            if not users.exists():
+                raise CommandError(f"Utilisateur introuvable : {options['user']}")
+        user_ids = list(users.values_list('id', flat=True))
+        batch = max(1, options['batch'])
+
+        drifted = 0
+        for start in range(0, len(user_ids), batch):
+            ids = user_ids[start:start + batch]
+            with transaction.atomic():
+                # Les lignes verrouillées font attendre les écritures concurrentes jusqu'à la fin du recomptage,
+                # qui les voit alors ou les laisse s'appliquer par-dessus
+                before = {
+                    stats.user_id: stats
+                    for stats in UserWorkspaceStats.objects.select_for_update().filter(user_id__in=ids)
+                }
+                for stats in UserWorkspaceStats.recount(ids):
+                    previous = before.get(stats.user_id)
+                    if previous is None:
+                        continue
+                    changes = {
+                        field: (getattr(previous, field), getattr(stats, field))
+                        for field in UserWorkspaceStats.COUNTER_FIELDS
+                        if getattr(previous, field) != getattr(stats, field)
+                    }
+                    if changes:
+                        drifted += 1
+                        if options['verbosity'] > 1:
+                            detail = ', '.join(f'{field} {old} -> {new}' for field, (old, new) in changes.items())
+                            self.stdout.write(f"Utilisateur {stats.user_id} : {detail}")
+        self.stdout.write(self.style.SUCCESS(
+            f"{len(user_ids)} utilisateur(s) recompté(s), {drifted} écart(s) corrigé(s)"
+        ))
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from api.lexical import load_state
+from api.models import Project
+
+
+class Command(BaseCommand):
+    help = "Reconstruit l'index des commentaires extraits du contenu des projets"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--project', type=int, help="Limiter la réindexation à un projet")
+
+    def handle(self, *args, **options):
+        projects = Project.objects.only('id', 'user_id', 'editor_content').order_by('id')
+        if options['project']:
+            projects = projects.filter(id=options['project'])
+
+        count = 0
+        for project in projects.iterator(chunk_size=100):
+            project.sync_annotations(load_state(project.editor_content))
+            count += 1
+        self.stdout.write(self.style.SUCCESS(f"{count} projet(s) réindexé(s)"))
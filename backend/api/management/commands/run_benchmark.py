@@ -0,0 +1,69 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api.benchmark import SCENARIOS, compare, run
+
+
+class Command(BaseCommand):
+    help = "Mesure débit, latences et requêtes SQL des parcours principaux de l'API sur le jeu de seed_benchmark"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'scenarios', nargs='*', metavar='scenario',
+            help=f"Parcours à mesurer parmi {', '.join(SCENARIOS)} (tous par défaut)",
+        )
+        parser.add_argument('--requests', type=int, default=200, help="Requêtes mesurées par parcours")
+        parser.add_argument('--concurrency', type=int, default=1, help="Fils clients, un utilisateur de mesure chacun")
+        parser.add_argument('--warmup', type=int, default=5, help="Requêtes non mesurées par fil avant la mesure")
+        parser.add_argument('--throttle', action='store_true', help="Garder la limitation de débit active")
+        parser.add_argument(
+            '--url', help="Adresse d'un serveur lancé à part (gunicorn, uvicorn) sur la même base, par exemple "
+                          "http://127.0.0.1:8000 ; par défaut les requêtes sont servies dans ce processus",
+        )
+        parser.add_argument('--output', help="Fichier où écrire le rapport JSON")
+        parser.add_argument('--compare', help="Rapport JSON de référence (par exemple celui d'un autre commit)")
+
+    def handle(self, *args, **options):
+        unknown = [name for name in options['scenarios'] if name not in SCENARIOS]
+        if unknown:
+            raise CommandError(f"Parcours inconnu(s) : {', '.join(unknown)}")
+        baseline = None
+        if options['compare']:
+            try:
+                with open(options['compare'], encoding='utf-8') as f:
+                    baseline = json.load(f)
+            except (OSError, ValueError) as e:
+                raise CommandError(f"Rapport de référence illisible : {e}")
+        try:
+            report = run(
+                options['scenarios'] or list(SCENARIOS), requests=max(1, options['requests']),
+                concurrency=max(1, options['concurrency']), warmup=max(0, options['warmup']),
+                throttle=options['throttle'], url=options['url'],
+            )
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        if report['meta']['debug']:
+            self.stderr.write(self.style.WARNING("DEBUG est actif : les mesures ne sont pas représentatives"))
+        self.stdout.write(f"{'parcours':<18} {'req':>5} {'err':>4} {'req/s':>8} {'p50':>8} {'p95':>8} "
+                          f"{'p99':>8} {'max':>8} {'SQL':>6}")
+        for name, result in report['scenarios'].items():
+            latency = result['latency_ms']
+            self.stdout.write(
+                f"{name:<18} {result['requests']:>5} {result['errors']:>4} {result['throughput_rps']:>8} "
+                f"{latency['p50']:>8} {latency['p95']:>8} {latency['p99']:>8} {latency['max']:>8} "
+                f"{result['queries']['mean'] if result['queries']['mean'] is not None else '-':>6}"
+            )
+            if 'items_per_s' in result:
+                self.stdout.write(f"{'':<18} {result['items_per_s']} objets/s")
+        if baseline is not None:
+            commit = baseline.get('meta', {}).get('commit')
+            self.stdout.write(f"\nÉcarts par rapport à {options['compare']} ({commit}) :")
+            for name, label, before, after, change in compare(report, baseline):
+                shown = f"{change:+.1f} %" if change is not None else '-'
+                self.stdout.write(f"{name:<18} {label:<15} {before!s:>10} -> {after!s:<10} {shown}")
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as f:
+                json.dump(report, f, indent=2, ensure_ascii=False)
+            self.stdout.write(self.style.SUCCESS(f"Rapport écrit dans {options['output']}"))
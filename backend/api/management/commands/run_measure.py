@@ -0,0 +1,113 @@
+import inspect
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api.benchmark import MEASURES, SCENARIOS
+
+
+class Command(BaseCommand):
+    help = "Mesure un composant isolé (révisions, index, limitation de débit…) sur les comptes de seed_benchmark"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', help="Fichier où écrire le rapport JSON")
+        # Les options de chaque mesure portent le nom des paramètres de sa fonction dans api.benchmark
+        measures = parser.add_subparsers(dest='measure', required=True, metavar='mesure')
+
+        revisions = measures.add_parser(
+            'revisions', help="Stockage par sauvegarde et reconstruction de la dernière révision",
+        )
+        revisions.add_argument('--count', type=int, default=1000, help="Sauvegardes enregistrées")
+        revisions.add_argument('--doc-kb', type=int, default=50, help="Taille approximative du document (Ko)")
+        revisions.add_argument('--repeat', type=int, default=20, help="Reconstructions mesurées")
+
+        saves = measures.add_parser(
+            'saves', help="Sauvegarde complète et patch JSON : octets envoyés, écrits et latence par taille",
+        )
+        saves.add_argument(
+            '--sizes', type=int, nargs='+', default=[1024, 10240], help="Tailles des documents (Ko)",
+        )
+        saves.add_argument('--count', type=int, default=30, help="Sauvegardes mesurées par mode et par taille")
+
+        chunks = measures.add_parser(
+            'chunks', help="Premier morceau et sauvegarde d'un bloc d'un grand document, découpé ou non",
+        )
+        chunks.add_argument('--doc-kb', type=int, default=20480, help="Taille approximative du document (Ko)")
+        chunks.add_argument('--count', type=int, default=10, help="Lectures et sauvegardes mesurées par mode")
+
+        ranges = measures.add_parser(
+            'annotation_ranges', help="Requêtes de position sur les annotations d'un texte, avec et sans GiST",
+        )
+        ranges.add_argument('--count', type=int, default=100000, help="Annotations du texte")
+        ranges.add_argument('--text-length', type=int, default=1000000, help="Longueur du texte (caractères)")
+        ranges.add_argument('--repeat', type=int, default=200, help="Requêtes mesurées par forme")
+
+        transfer = measures.add_parser(
+            'workspace_transfer', help="Mémoire résidente de l'export et de l'import d'un espace de travail",
+        )
+        transfer.add_argument(
+            '--sizes-mb', type=int, nargs='+', default=[512, 5120], help="Tailles des espaces de travail (Mo)",
+        )
+        transfer.add_argument('--doc-kb', type=int, default=1024, help="Taille approximative de chaque projet (Ko)")
+        transfer.add_argument('--annotations', type=int, default=10, help="Annotations par projet")
+
+        throttle = measures.add_parser('throttle', help="Coût d'une vérification de limitation de débit")
+        throttle.add_argument('--count', type=int, default=100000, help="Vérifications mesurées par cas")
+        throttle.add_argument('--keys', type=int, default=20000, help="Clients distincts du second cas")
+
+        authentication = measures.add_parser(
+            'authentication', help="Authentification par cookie JWT, utilisateur lu dans le jeton ou en base",
+        )
+        authentication.add_argument('--count', type=int, default=2000, help="Authentifications mesurées par mode")
+
+        jobs = measures.add_parser('jobs', help="Tâches traitées par seconde selon le nombre de fils du worker")
+        jobs.add_argument('--count', type=int, default=2000, help="Tâches par mesure")
+        jobs.add_argument('--threads', type=int, nargs='+', default=[1, 2, 4, 8], help="Fils du worker")
+        jobs.add_argument('--batch', type=int, default=1, help="Tâches prises par requête")
+
+        instrumentation = measures.add_parser(
+            'instrumentation', help="Surcoût du middleware d'instrumentation, activé contre désactivé",
+        )
+        instrumentation.add_argument(
+            '--names', nargs='+', choices=sorted(SCENARIOS), default=['project_list', 'project_open', 'autosave'],
+            help="Scénarios servis dans chaque mode",
+        )
+        instrumentation.add_argument('--requests', type=int, default=300, help="Requêtes par scénario et par tour")
+        instrumentation.add_argument('--rounds', type=int, default=4, help="Tours alternant les deux modes")
+        instrumentation.add_argument('--warmup', type=int, default=5, help="Requêtes non mesurées par série")
+
+        derived = measures.add_parser(
+            'derived', help="Analyse d'un grand document contre lecture des données dérivées enregistrées",
+        )
+        derived.add_argument('--doc-kb', type=int, default=10240, help="Taille approximative du document (Ko)")
+        derived.add_argument('--comments', type=int, default=200, help="Nœuds de commentaire du document")
+        derived.add_argument('--repeat', type=int, default=10, help="Mesures par étape")
+
+        pool = measures.add_parser(
+            'connections', help="Parcours avec pool, connexions persistantes ou une connexion par requête",
+        )
+        pool.add_argument(
+            '--names', nargs='+', choices=sorted(SCENARIOS), default=['project_list', 'project_open'],
+            help="Scénarios mesurés dans chaque mode",
+        )
+        pool.add_argument('--requests', type=int, default=300, help="Requêtes par scénario et par mode")
+        pool.add_argument('--concurrency', type=int, default=1, help="Fils clients de run_benchmark")
+        pool.add_argument('--connects', type=int, default=50, help="Ouvertures de connexion chronométrées")
+
+    def handle(self, *args, **options):
+        measure = MEASURES[options['measure']]
+        kwargs = {name: options[name] for name in inspect.signature(measure).parameters if name in options}
+        numbers = [number for value in kwargs.values() for number in (value if isinstance(value, list) else [value])]
+        if any(isinstance(number, int) and number < 1 for number in numbers):
+            raise CommandError("Les nombres et tailles doivent être positifs")
+        try:
+            report = measure(**kwargs)
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        if report['meta']['debug']:
+            self.stderr.write(self.style.WARNING("DEBUG est actif : les mesures ne sont pas représentatives"))
+        self.stdout.write(json.dumps(report, indent=2, ensure_ascii=False))
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as f:
+                json.dump(report, f, indent=2, ensure_ascii=False)
@@ -0,0 +1,65 @@
+import multiprocessing
+import signal
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from api.jobs import Worker
+
+
+def _close_connections():
+    # Les processus fils ouvrent leurs propres connexions : rien ne doit être hérité du parent
+    for connection in connections.all(initialized_only=True):
+        connection.close()
+        if hasattr(connection, 'close_pool'):
+            connection.close_pool()
+
+
+def _run_worker(threads, poll_interval, burst, batch):
+    worker = Worker(threads=threads, poll_interval=poll_interval, burst=burst, batch=batch)
+    signal.signal(signal.SIGTERM, worker.stop)
+    signal.signal(signal.SIGINT, worker.stop)
+    return worker.run()
+
+
+class Command(BaseCommand):
+    help = "Exécute les tâches de fond de la file (table api_job), sans courtier externe"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int, default=1, help="Nombre de processus workers")
+        parser.add_argument(
+            '--threads', type=int, default=1,
+            help="Fils par processus ; chacun garde une connexion, à accorder avec DB_POOL_MAX_SIZE",
+        )
+        parser.add_argument('--batch', type=int, default=1, help="Tâches réservées à chaque interrogation de la file")
+        parser.add_argument('--poll-interval', type=float, help="Attente (en secondes) quand la file est vide")
+        parser.add_argument('--burst', action='store_true', help="S'arrêter dès que la file est vide")
+
+    def handle(self, *args, **options):
+        threads = max(1, options['threads'])
+        processes = max(1, options['processes'])
+        worker_args = (threads, options['poll_interval'], options['burst'], max(1, options['batch']))
+        if processes == 1:
+            processed = _run_worker(*worker_args)
+            self.stdout.write(self.style.SUCCESS(f"{processed} tâche(s) traitée(s)"))
+            return
+
+        _close_connections()
+        context = multiprocessing.get_context('fork')
+        children = [
+            context.Process(target=_run_worker, args=worker_args)
+            for _ in range(processes)
+        ]
+        for child in children:
+            child.start()
+
+        def forward(signum, frame):
+            for child in children:
+                if child.is_alive():
+                    child.terminate()
+
+        signal.signal(signal.SIGTERM, forward)
+        signal.signal(signal.SIGINT, forward)
+        for child in children:
+            child.join()
+        self.stdout.write(self.style.SUCCESS(f"{processes} processus arrêté(s)"))
@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from api.benchmark import seed
+
+
+class Command(BaseCommand):
+    help = "Génère un jeu de données de mesure (comptes bench_*) pour run_benchmark"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=5, help="Nombre d'utilisateurs")
+        parser.add_argument('--projects', type=int, default=10, help="Projets par utilisateur")
+        parser.add_argument('--doc-kb', type=int, default=50, help="Taille approximative de chaque document (Ko)")
+        parser.add_argument('--comments', type=int, default=5, help="Commentaires par document")
+        parser.add_argument('--annotations', type=int, default=20, help="Annotations par projet")
+        parser.add_argument('--seed', type=int, default=0, help="Graine du générateur, pour un jeu reproductible")
+        parser.add_argument(
+            '--allow-destructive', action='store_true',
+            help="Autoriser hors DEBUG la suppression des comptes bench_* existants (base dédiée aux mesures)",
+        )
+
+    def handle(self, *args, **options):
+        try:
+            counts = seed(
+                users=options['users'], projects=options['projects'], doc_kb=options['doc_kb'],
+                comments=options['comments'], annotations=options['annotations'], random_seed=options['seed'],
+                allow_destructive=options['allow_destructive'],
+            )
+        except ValueError as e:
+            raise CommandError(f"{e} (--allow-destructive)")
+        self.stdout.write(self.style.SUCCESS(
+            f"{counts['users']} utilisateur(s), {counts['projects']} projet(s), "
+            f"{counts['annotations']} annotation(s) générés"
+        ))
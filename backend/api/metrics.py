@@ -0,0 +1,185 @@
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+
+# Mesures de la requête en cours ; la variable de contexte suit aussi les appels sync_to_async
+current_stats = ContextVar('request_stats', default=None)
+
+
+class RequestStats:
+    __slots__ = ('queries', 'query_time', 'serializer_time', 'serializer_depth')
+
+    def __init__(self):
+        self.queries = 0
+        self.query_time = 0.0
+        self.serializer_time = 0.0
+        self.serializer_depth = 0
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(names, values, extra=()):
+    pairs = [*zip(names, values), *extra]
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+class Counter:
+    def __init__(self, name, documentation, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+        self.series = {}
+        self.lock = threading.Lock()
+
+    def inc(self, labels, amount=1):
+        with self.lock:
+            self.series[labels] = self.series.get(labels, 0) + amount
+
+    def render(self, extra=()):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} counter']
+        with self.lock:
+            series = list(self.series.items())
+        lines.extend(f'{self.name}{_labels(self.labels, labels, extra)} {value}' for labels, value in series)
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, documentation, buckets, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.buckets = tuple(buckets)
+        self.labels = labels
+        # Par série : compte par intervalle (le dernier pour +Inf), somme et total
+        self.series = {}
+        self.lock = threading.Lock()
+
+    def observe(self, labels, value):
+        index = bisect_left(self.buckets, value)
+        with self.lock:
+            series = self.series.get(labels)
+            if series is None:
+                series = self.series[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self, extra=()):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} histogram']
+        with self.lock:
+            series = [(labels, list(counts), total, count) for labels, (counts, total, count) in self.series.items()]
+        for labels, counts, total, count in series:
+            cumulative = 0
+            for bound, bucket_count in zip((*self.buckets, '+Inf'), counts):
+                cumulative += bucket_count
+                lines.append(f'{self.name}_bucket{_labels(self.labels, labels, [*extra, ("le", bound)])} {cumulative}')
+            lines.append(f'{self.name}_sum{_labels(self.labels, labels, extra)} {total}')
+            lines.append(f'{self.name}_count{_labels(self.labels, labels, extra)} {count}')
+        return lines
+
+
+REQUEST_LABELS = ('view', 'method')
+
+requests_total = Counter(
+    'scriptalium_http_requests_total', 'Requêtes HTTP traitées', ('view', 'method', 'status'),
+)
+request_duration = Histogram(
+    'scriptalium_http_request_duration_seconds', 'Durée de traitement des requêtes',
+    (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10), REQUEST_LABELS,
+)
+request_queries = Histogram(
+    'scriptalium_http_request_db_queries', 'Requêtes SQL par requête HTTP',
+    (0, 1, 2, 3, 5, 10, 20, 50, 100), REQUEST_LABELS,
+)
+query_seconds = Counter(
+    'scriptalium_http_db_query_seconds_total', 'Temps passé dans les requêtes SQL', REQUEST_LABELS,
+)
+serializer_seconds = Counter(
+    'scriptalium_http_serializer_seconds_total', 'Temps passé dans les sérialiseurs', REQUEST_LABELS,
+)
+response_size = Histogram(
+    'scriptalium_http_response_size_bytes', 'Taille des réponses',
+    (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304), REQUEST_LABELS,
+)
+read_cache_requests = Counter(
+    'scriptalium_read_cache_requests_total', 'Lectures du cache de lecture par niveau servi (local, shared, miss)',
+    ('cache', 'tier'),
+)
+METRICS = [
+    requests_total, request_duration, request_queries, query_seconds, serializer_seconds, response_size,
+    read_cache_requests,
+]
+
+
+# Début du processus : un changement signale le redémarrage d'un worker (remise à zéro des compteurs)
+STARTED_AT = time.time()
+
+
+def render_metrics():
+    """Métriques du processus au format texte Prometheus.
+
+    Chaque worker tient ses propres compteurs : toutes les séries portent le label worker (pid),
+    pour qu'elles restent distinctes d'un worker à l'autre et s'agrègent avec sum by (...).
+    """
+    # pid lu à chaque rendu : les workers sont forkés après l'import du module
+    worker = (('worker', os.getpid()),)
+    lines = [
+        '# HELP scriptalium_process_start_time_seconds Début du processus (secondes depuis epoch)',
+        '# TYPE scriptalium_process_start_time_seconds gauge',
+        f'scriptalium_process_start_time_seconds{_labels((), (), worker)} {STARTED_AT}',
+    ]
+    for metric in METRICS:
+        lines.extend(metric.render(worker))
+    return '\n'.join(lines) + '\n'
+
+
+def record_request(view, method, status, duration, stats, size):
+    labels = (view, method)
+    requests_total.inc((view, method, str(status)))
+    request_duration.observe(labels, duration)
+    request_queries.observe(labels, stats.queries)
+    response_size.observe(labels, size)
+    if stats.query_time:
+        query_seconds.inc(labels, stats.query_time)
+    if stats.serializer_time:
+        serializer_seconds.inc(labels, stats.serializer_time)
+
+
+def count_query(execute, sql, params, many, context):
+    """Wrapper d'exécution installé sur chaque connexion : compte les requêtes de la requête HTTP en cours."""
+    stats = current_stats.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        stats.queries += 1
+        stats.query_time += time.perf_counter() - start
+
+
+def install_query_counter(connection, **kwargs):
+    if count_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(count_query)
+
+
+class TimedSerializerMixin:
+    """Mesure le temps de to_representation ; seul l'appel le plus externe est compté."""
+
+    def to_representation(self, instance):
+        stats = current_stats.get()
+        if stats is None:
+            return super().to_representation(instance)
+        stats.serializer_depth += 1
+        start = time.perf_counter()
+        try:
+            return super().to_representation(instance)
+        finally:
+            stats.serializer_depth -= 1
+            if not stats.serializer_depth:
+                stats.serializer_time += time.perf_counter() - start
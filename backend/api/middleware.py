@@ -0,0 +1,73 @@
+import logging
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.db.backends.signals import connection_created
+
+from .metrics import RequestStats, current_stats, install_query_counter, record_request
+
+logger = logging.getLogger('api.metrics')
+
+
+class InstrumentationMiddleware:
+    """Durée, requêtes SQL, temps de sérialisation et taille de réponse par vue, exposés sur /metrics.
+
+    Désactivé (sans aucun coût) quand METRICS_ENABLED est faux. Avertit dans le journal
+    api.metrics lorsqu'une requête dépasse METRICS_QUERY_BUDGET requêtes SQL.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'METRICS_ENABLED', True):
+            raise MiddlewareNotUsed()
+        self.get_response = get_response
+        self.query_budget = getattr(settings, 'METRICS_QUERY_BUDGET', None)
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+        connection_created.connect(install_query_counter, dispatch_uid='api_metrics_query_counter')
+        for connection in connections.all(initialized_only=True):
+            install_query_counter(connection)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        stats = RequestStats()
+        token = current_stats.set(stats)
+        start = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            current_stats.reset(token)
+        self.record(request, response, stats, time.perf_counter() - start)
+        return response
+
+    async def __acall__(self, request):
+        stats = RequestStats()
+        token = current_stats.set(stats)
+        start = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            current_stats.reset(token)
+        self.record(request, response, stats, time.perf_counter() - start)
+        return response
+
+    def record(self, request, response, stats, duration):
+        match = request.resolver_match
+        # Nom de route plutôt que chemin, pour garder un nombre de séries borné
+        view = (match.view_name or match.route) if match is not None else 'unmatched'
+        size = 0 if response.streaming else len(response.content)
+        record_request(view, request.method, response.status_code, duration, stats, size)
+
+        if self.query_budget is not None and stats.queries > self.query_budget:
+            logger.warning(
+                "%s %s (%s) : %d requêtes SQL, au-delà du budget de %d",
+                request.method, request.path, view, stats.queries, self.query_budget,
+            )
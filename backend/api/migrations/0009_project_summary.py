@@ -0,0 +1,80 @@
+# Generated by Django 5.1.1 on 2026-10-18 09:20
+
+import json
+
+from django.db import migrations, models
+
+# Copie figée de api.lexical.summarize à la date de cette migration
+EXCERPT_LENGTH = 200
+
+
+def node_text(node):
+    if node.get('type') == 'linebreak':
+        return '\n'
+    if isinstance(node.get('text'), str):
+        return node['text']
+    children = node.get('children')
+    if not isinstance(children, list):
+        return ''
+    return ''.join(node_text(child) for child in children if isinstance(child, dict))
+
+
+def plain_text(content):
+    try:
+        state = json.loads(content)
+    except ValueError:
+        return content
+    if not isinstance(state, dict):
+        return content
+    root = state.get('root')
+    children = root.get('children') if isinstance(root, dict) else None
+    if not isinstance(children, list):
+        return ''
+    return '\n'.join(node_text(child) for child in children if isinstance(child, dict))
+
+
+def summarize(content):
+    if not content:
+        return 0, 0, ''
+    text = plain_text(content)
+    excerpt = ' '.join(text.split())[:EXCERPT_LENGTH]
+    return len(content.encode('utf-8')), len(text.split()), excerpt
+
+
+def fill_summaries(apps, schema_editor):
+    Project = apps.get_model('api', 'Project')
+    batch = []
+    for project in Project.objects.only('id', 'editor_content').iterator(chunk_size=100):
+        project.content_size, project.word_count, project.excerpt = summarize(project.editor_content)
+        batch.append(project)
+        if len(batch) == 100:
+            Project.objects.bulk_update(batch, ['content_size', 'word_count', 'excerpt'])
+            batch = []
+    if batch:
+        Project.objects.bulk_update(batch, ['content_size', 'word_count', 'excerpt'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0008_projectrevision'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='project',
+            name='content_size',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='project',
+            name='excerpt',
+            field=models.CharField(blank=True, default='', max_length=255),
+        ),
+        migrations.AddField(
+            model_name='project',
+            name='word_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(fill_summaries, migrations.RunPython.noop),
+    ]
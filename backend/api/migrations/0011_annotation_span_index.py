@@ -0,0 +1,34 @@
+# Generated by Django 5.1.1 on 2026-10-18 09:22
+
+import django.contrib.postgres.fields.ranges
+import django.contrib.postgres.indexes
+import django.db.models.functions.comparison
+from django.conf import settings
+from django.db import migrations, models
+
+
+SPAN_INDEX = django.contrib.postgres.indexes.GistIndex(models.Func(django.db.models.functions.comparison.Least('start_index', 'end_index'), django.db.models.functions.comparison.Greatest('start_index', 'end_index'), function='int4range', output_field=django.contrib.postgres.fields.ranges.IntegerRangeField()), name='annotation_span_gist')
+
+
+# L'index GiST n'existe que sous PostgreSQL ; il n'est pas déclaré dans Annotation.Meta
+# pour que les autres bases puissent reconstruire la table sans lui
+def add_span_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.add_index(apps.get_model('api', 'Annotation'), SPAN_INDEX)
+
+
+def remove_span_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.remove_index(apps.get_model('api', 'Annotation'), SPAN_INDEX)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0010_annotation_project_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(add_span_index, remove_span_index),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.1 on 2026-10-18 09:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0011_annotation_span_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='annotation',
+            name='detached',
+            field=models.BooleanField(default=False),
+        ),
+    ]
@@ -0,0 +1,103 @@
+# Generated by Django 5.1.1 on 2026-10-18 09:25
+
+import json
+
+import django.contrib.postgres.search
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVector
+from django.db import migrations
+from django.db.models import Value
+
+# Copies figées de api.search et api.lexical à la date de cette migration : le code de l'application
+# peut évoluer sans changer ce que fait la migration
+SEARCH_CONFIGS = ('french', 'english')
+SEARCH_TEXT_LIMIT = 500000
+
+
+def weighted_vector(*parts):
+    vector = None
+    for expression, weight in parts:
+        for config in SEARCH_CONFIGS:
+            part = SearchVector(expression, weight=weight, config=config)
+            vector = part if vector is None else vector + part
+    return vector
+
+
+def node_text(node):
+    if node.get('type') == 'linebreak':
+        return '\n'
+    if isinstance(node.get('text'), str):
+        return node['text']
+    children = node.get('children')
+    if not isinstance(children, list):
+        return ''
+    return ''.join(node_text(child) for child in children if isinstance(child, dict))
+
+
+def plain_text(content):
+    if not content:
+        return ''
+    try:
+        state = json.loads(content)
+    except ValueError:
+        return content
+    if not isinstance(state, dict):
+        return content
+    root = state.get('root')
+    children = root.get('children') if isinstance(root, dict) else None
+    if not isinstance(children, list):
+        return ''
+    return '\n'.join(node_text(child) for child in children if isinstance(child, dict))
+
+
+SEARCH_INDEXES = [
+    ('Annotation', GinIndex(fields=['search_vector'], name='annotation_search_gin')),
+    ('Project', GinIndex(fields=['search_vector'], name='project_search_gin')),
+]
+
+
+# Comme l'index GiST de 0011, les index GIN ne sont créés que sous PostgreSQL
+def add_search_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for model_name, index in SEARCH_INDEXES:
+        schema_editor.add_index(apps.get_model('api', model_name), index)
+
+    Annotation = apps.get_model('api', 'Annotation')
+    Annotation.objects.update(search_vector=weighted_vector(
+        ('title', 'A'), ('selected_text', 'B'), ('description', 'C'),
+    ))
+    Project = apps.get_model('api', 'Project')
+    for project in Project.objects.only('id', 'editor_content').iterator(chunk_size=100):
+        text = plain_text(project.editor_content)
+        Project.objects.filter(pk=project.pk).update(search_vector=weighted_vector(
+            ('title', 'A'), ('description', 'B'), (Value(text[:SEARCH_TEXT_LIMIT]), 'C'),
+        ))
+
+
+def remove_search_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for model_name, index in SEARCH_INDEXES:
+        schema_editor.remove_index(apps.get_model('api', model_name), index)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0012_annotation_detached'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='annotation',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='project',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.RunPython(add_search_indexes, remove_search_indexes),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.1.1 on 2026-10-18 09:32
+
+import hashlib
+
+from django.db import migrations, models
+
+
+def fill_content_hashes(apps, schema_editor):
+    Project = apps.get_model('api', 'Project')
+    batch = []
+    for project in Project.objects.only('id', 'editor_content').iterator(chunk_size=100):
+        project.content_hash = hashlib.sha256((project.editor_content or '').encode('utf-8')).hexdigest()
+        batch.append(project)
+        if len(batch) == 100:
+            Project.objects.bulk_update(batch, ['content_hash'])
+            batch = []
+    if batch:
+        Project.objects.bulk_update(batch, ['content_hash'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0013_search_vectors'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='project',
+            name='content_hash',
+            field=models.CharField(blank=True, default='', editable=False, max_length=64),
+        ),
+        migrations.RunPython(fill_content_hashes, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,95 @@
+import zlib
+
+from django.db import migrations, models
+
+import api.fields
+
+BATCH_SIZE = 100
+
+# Copie figée du format de api.fields.CompressedText à la date de cette migration : la colonne est
+# d'abord un BinaryField, pour que la conversion ne dépende pas du champ de l'application
+MAGIC = b'SCZ'
+RAW = 0
+GZIP = 1
+
+
+def encode(text):
+    if text is None:
+        return None
+    raw = text.encode('utf-8')
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    compressed = compressor.compress(raw) + compressor.flush()
+    if len(compressed) < len(raw):
+        return MAGIC + bytes([GZIP]) + compressed
+    return MAGIC + bytes([RAW]) + raw
+
+
+def decode(data):
+    if data is None:
+        return None
+    data = bytes(data)
+    if not data.startswith(MAGIC) or len(data) == len(MAGIC):
+        return data.decode('utf-8')
+    payload = data[len(MAGIC) + 1:]
+    if data[len(MAGIC)] == GZIP:
+        return zlib.decompress(payload, 31).decode('utf-8')
+    return payload.decode('utf-8')
+
+
+def compress_contents(apps, schema_editor):
+    Project = apps.get_model('api', 'Project')
+    batch = []
+    for project in Project.objects.only('id', 'editor_content').iterator(chunk_size=BATCH_SIZE):
+        project.compressed_content = encode(project.editor_content)
+        batch.append(project)
+        if len(batch) == BATCH_SIZE:
+            Project.objects.bulk_update(batch, ['compressed_content'])
+            batch = []
+    if batch:
+        Project.objects.bulk_update(batch, ['compressed_content'])
+
+
+def decompress_contents(apps, schema_editor):
+    Project = apps.get_model('api', 'Project')
+    batch = []
+    for project in Project.objects.only('id', 'compressed_content').iterator(chunk_size=BATCH_SIZE):
+        project.editor_content = decode(project.compressed_content)
+        batch.append(project)
+        if len(batch) == BATCH_SIZE:
+            Project.objects.bulk_update(batch, ['editor_content'])
+            batch = []
+    if batch:
+        Project.objects.bulk_update(batch, ['editor_content'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0014_project_content_hash'),
+    ]
+
+    # Une transaction par lot plutôt qu'une seule pour toute la table
+    atomic = False
+
+    operations = [
+        migrations.AddField(
+            model_name='project',
+            name='compressed_content',
+            field=models.BinaryField(blank=True, null=True),
+        ),
+        migrations.RunPython(compress_contents, decompress_contents, atomic=False),
+        migrations.RemoveField(
+            model_name='project',
+            name='editor_content',
+        ),
+        migrations.RenameField(
+            model_name='project',
+            old_name='compressed_content',
+            new_name='editor_content',
+        ),
+        migrations.AlterField(
+            model_name='project',
+            name='editor_content',
+            field=api.fields.CompressedTextField(blank=True, null=True),
+        ),
+    ]
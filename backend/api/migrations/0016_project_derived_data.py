@@ -0,0 +1,111 @@
+# Generated by Django 5.1.1 on 2026-10-18 09:47
+
+import json
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+# Copie figée de api.lexical.derive à la date de cette migration
+def collect(node, position, comments):
+    if node.get('type') == 'linebreak':
+        return '\n'
+    if isinstance(node.get('text'), str):
+        return node['text']
+    children = node.get('children')
+    if not isinstance(children, list):
+        return ''
+    parts = []
+    length = 0
+    for child in children:
+        if isinstance(child, dict):
+            part = collect(child, position + length, comments)
+            parts.append(part)
+            length += len(part)
+    text = ''.join(parts)
+    if node.get('type') == 'comment' and node.get('uuid'):
+        comments.append({'uuid': str(node['uuid']), 'text': text})
+    return text
+
+
+def derive(content):
+    """Texte brut, commentaires et plan d'un contenu ; le texte est le contenu lui-même s'il n'est pas du JSON."""
+    try:
+        state = json.loads(content) if content else None
+    except ValueError:
+        state = None
+    if not isinstance(state, dict):
+        return content, [], []
+    root = state.get('root')
+    children = root.get('children') if isinstance(root, dict) else None
+    blocks = []
+    comments = []
+    outline = []
+    position = 0
+    for block in children if isinstance(children, list) else []:
+        if not isinstance(block, dict):
+            continue
+        text = collect(block, position, comments)
+        if block.get('type') == 'heading':
+            level = str(block.get('tag', ''))[1:]
+            outline.append({
+                'level': int(level) if level.isdigit() else 1,
+                'text': text,
+                'block': len(blocks),
+                'start_index': position,
+            })
+        blocks.append(text)
+        position += len(text) + 1
+    return '\n'.join(blocks), comments, outline
+
+
+def fill_derived_data(apps, schema_editor):
+    # Les projets non traités ici seraient de toute façon calculés à leur première lecture
+    Project = apps.get_model('api', 'Project')
+    ProjectDerivedData = apps.get_model('api', 'ProjectDerivedData')
+    batch = []
+    projects = Project.objects.only('id', 'editor_content', 'content_hash', 'updated_at')
+    for project in projects.iterator(chunk_size=20):
+        content = project.editor_content
+        if content is not None and not isinstance(content, str):
+            content = content.decode()
+        text, comments, outline = derive(content or '')
+        batch.append(ProjectDerivedData(
+            project_id=project.id,
+            plain_text=text,
+            char_count=len(text),
+            word_count=len(text.split()),
+            comment_count=len({comment['uuid'] for comment in comments}),
+            outline=outline,
+            content_hash=project.content_hash,
+            source_updated_at=project.updated_at,
+        ))
+        if len(batch) == 20:
+            ProjectDerivedData.objects.bulk_create(batch)
+            batch = []
+    if batch:
+        ProjectDerivedData.objects.bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0015_compress_editor_content'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProjectDerivedData',
+            fields=[
+                ('project', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='derived', serialize=False, to='api.project')),
+                ('plain_text', models.TextField(blank=True, default='')),
+                ('char_count', models.PositiveIntegerField(default=0)),
+                ('word_count', models.PositiveIntegerField(default=0)),
+                ('comment_count', models.PositiveIntegerField(default=0)),
+                ('outline', models.JSONField(blank=True, default=list)),
+                ('content_hash', models.CharField(blank=True, default='', max_length=64)),
+                ('source_updated_at', models.DateTimeField(null=True)),
+            ],
+        ),
+        migrations.RunPython(fill_derived_data, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 5.1.1 on 2026-10-18 09:58
+
+import api.fields
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0018_job'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='project',
+            name='chunked',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.CreateModel(
+            name='ProjectChunk',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('index', models.PositiveIntegerField()),
+                ('start_block', models.PositiveIntegerField(default=0)),
+                ('block_count', models.PositiveIntegerField(default=0)),
+                ('size', models.PositiveIntegerField(default=0)),
+                ('hash', models.CharField(max_length=40)),
+                ('data', api.fields.CompressedTextField()),
+                ('project', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='chunks', to='api.project')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['project', 'index'], name='projectchunk_project_index_idx')],
+            },
+        ),
+    ]
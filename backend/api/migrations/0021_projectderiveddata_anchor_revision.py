@@ -0,0 +1,29 @@
+# Generated by Django 5.1.1 on 2026-10-18 14:05
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def fill_anchor_revisions(apps, schema_editor):
+    # Jusqu'ici les annotations étaient recalées à chaque sauvegarde : elles le sont sur la révision courante
+    Project = apps.get_model('api', 'Project')
+    ProjectDerivedData = apps.get_model('api', 'ProjectDerivedData')
+    ProjectDerivedData.objects.update(
+        anchor_revision=Subquery(Project.objects.filter(pk=OuterRef('project_id')).values('revision')[:1]),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0020_user_workspace_stats'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='projectderiveddata',
+            name='anchor_revision',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.RunPython(fill_anchor_revisions, migrations.RunPython.noop),
+    ]
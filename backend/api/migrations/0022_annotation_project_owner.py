@@ -0,0 +1,24 @@
+# Generated by Django 5.1.1 on 2026-10-18 14:40
+
+from django.db import migrations
+from django.db.models import OuterRef, Subquery
+
+
+def assign_project_owner(apps, schema_editor):
+    # Les annotations d'un projet appartiennent à son propriétaire : la liste filtre sur user seul
+    Annotation = apps.get_model('api', 'Annotation')
+    Project = apps.get_model('api', 'Project')
+    Annotation.objects.filter(project__isnull=False, user__isnull=True).update(
+        user=Subquery(Project.objects.filter(pk=OuterRef('project_id')).values('user')[:1]),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0021_projectderiveddata_anchor_revision'),
+    ]
+
+    operations = [
+        migrations.RunPython(assign_project_owner, migrations.RunPython.noop),
+    ]
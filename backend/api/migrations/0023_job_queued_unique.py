@@ -0,0 +1,35 @@
+# Generated by Django 5.1.1 on 2026-10-18 12:36
+
+import json
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def remove_duplicate_queued_jobs(apps, schema_editor):
+    # Les doublons déjà en attente refont le même travail : seul le plus ancien est gardé
+    Job = apps.get_model('api', 'Job')
+    seen = set()
+    duplicates = []
+    for job_id, kind, payload in Job.objects.filter(status='queued').order_by('id').values_list('id', 'kind', 'payload'):
+        key = (kind, json.dumps(payload, sort_keys=True))
+        if key in seen:
+            duplicates.append(job_id)
+        seen.add(key)
+    Job.objects.filter(id__in=duplicates).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0022_annotation_project_owner'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicate_queued_jobs, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='job',
+            constraint=models.UniqueConstraint(condition=models.Q(('status', 'queued')), fields=('kind', 'payload'), name='job_queued_unique'),
+        ),
+    ]
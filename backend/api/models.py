@@ -1,7 +1,20 @@
-from django.db import models
+from django.db import models, connection
+from django.db.models import Count, F, Func, Max, Sum, Value
+from django.db.models.functions import Greatest, Least
+from django.contrib.postgres.fields import IntegerRangeField
+from django.contrib.postgres.search import SearchVectorField
+from django.db.backends.postgresql.psycopg_any import NumericRange
 from django.contrib.auth.models import User
 from django.utils import timezone
 from django.conf import settings
+from .fields import CHUNKED, CompressedText, CompressedTextField, decoded_text, stored_text
+from .chunking import ChunkedContent, assembled_size, manifest_hash, split_blocks, split_state
+from .lexical import load_state, summarize, derive, block_texts, plain_text
+from .remapping import remap_annotations
+from .search import weighted_vector, SEARCH_TEXT_LIMIT
+from .readcache import invalidate_project
+import hashlib
+import json
 
 class Text(models.Model):
     content = models.TextField(blank=True, null=True)
@@ -11,16 +24,89 @@ class Text(models.Model):
         return f"Text {self.id}"
 
 
+def annotation_span():
+    # Intervalle [début, fin) d'une annotation, indexé en GiST sous PostgreSQL (migration 0011)
+    return Func(
+        Least('start_index', 'end_index'),
+        Greatest('start_index', 'end_index'),
+        function='int4range',
+        output_field=IntegerRangeField(),
+    )
+
+
+class AnnotationQuerySet(models.QuerySet):
+    def _with_span(self):
+        return self.alias(span=annotation_span())
+
+    def covering(self, offset):
+        if connection.vendor == 'postgresql':
+            return self._with_span().filter(span__contains=offset)
+        return self.covering_bounds(offset)
+
+    def overlapping(self, start, end):
+        if connection.vendor == 'postgresql':
+            return self._with_span().filter(span__overlap=NumericRange(start, end))
+        return self.overlapping_bounds(start, end)
+
+    def within(self, start, end):
+        if connection.vendor == 'postgresql':
+            # Un intervalle vide est contenu dans tous les autres : les annotations de longueur nulle
+            # sont écartées, comme pour le chevauchement
+            return self._with_span().filter(span__contained_by=NumericRange(start, end), span__isempty=False)
+        return self.within_bounds(start, end)
+
+    # Mêmes filtres sur les colonnes de début et de fin, pour les bases sans index GiST
+
+    def covering_bounds(self, offset):
+        return self.filter(start_index__lte=offset, end_index__gt=offset)
+
+    def overlapping_bounds(self, start, end):
+        if end <= start:
+            # Un intervalle vide ne chevauche rien
+            return self.none()
+        return self.filter(start_index__lt=end, end_index__gt=start).exclude(start_index=F('end_index'))
+
+    def within_bounds(self, start, end):
+        return self.filter(start_index__gte=start, end_index__lte=end).exclude(start_index=F('end_index'))
+
+    def update_search_vectors(self):
+        # Index plein texte maintenu uniquement sous PostgreSQL (GIN, migration 0013)
+        if connection.vendor != 'postgresql':
+            return 0
+        return self.update(search_vector=weighted_vector(
+            ('title', 'A'), ('selected_text', 'B'), ('description', 'C'),
+        ))
+
+
 class Annotation(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE, null=True, blank=True)
-    text = models.ForeignKey(Text, on_delete=models.CASCADE, related_name="annotations")
+    text = models.ForeignKey(Text, on_delete=models.CASCADE, related_name="annotations", null=True, blank=True)
+    # Renseignés pour les commentaires extraits du contenu d'un projet
+    project = models.ForeignKey('Project', on_delete=models.CASCADE, related_name="annotations", null=True, blank=True)
+    node_uuid = models.CharField(max_length=64, null=True, blank=True)
+    node_hash = models.CharField(max_length=40, blank=True, default='')
+    comments = models.JSONField(default=list, blank=True)
     title = models.CharField(max_length=255)
     description = models.TextField()
     start_index = models.IntegerField()
     end_index = models.IntegerField()
     selected_text = models.TextField(null=True, blank=True)
+    # Vrai lorsque le texte annoté a disparu après une modification du projet
+    detached = models.BooleanField(default=False)
+    search_vector = SearchVectorField(null=True, editable=False)
     created_at = models.DateTimeField(default=timezone.now)
 
+    objects = AnnotationQuerySet.as_manager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['project', 'node_uuid'], name='unique_project_comment_node'),
+        ]
+        indexes = [
+            models.Index(fields=['text', 'start_index'], name='annotation_text_start_idx'),
+            models.Index(fields=['user', 'created_at'], name='annotation_user_created_idx'),
+        ]
+
     def __str__(self):
         return self.title
 
@@ -34,9 +120,543 @@ class Project(models.Model):
     )
     title = models.CharField(max_length=255)
     description = models.TextField()
-    editor_content = models.TextField(blank=True, null=True)
+    editor_content = CompressedTextField(blank=True, null=True)
+    # Contenu découpé en morceaux (ProjectChunk) : editor_content ne stocke alors que l'enveloppe
+    chunked = models.BooleanField(default=False)
+    revision = models.PositiveIntegerField(default=0)
+    # Résumé précalculé pour afficher la liste sans charger editor_content
+    content_size = models.PositiveIntegerField(default=0)
+    word_count = models.PositiveIntegerField(default=0)
+    excerpt = models.CharField(max_length=255, blank=True, default='')
+    # Empreinte du contenu calculée à la sauvegarde, pour les ETag
+    content_hash = models.CharField(max_length=64, blank=True, default='', editable=False)
+    search_vector = SearchVectorField(null=True, editable=False)
     created_at = models.DateTimeField(default=timezone.now)
     updated_at = models.DateTimeField(auto_now=True) 
 
+    # Si vrai, save() n'enregistre que le contenu, sa taille et son empreinte : le reste est recalculé
+    # par la tâche project.reindex, que l'appelant met en file
+    defer_derived = False
+
     def __str__(self):
-        return self.title
\ No newline at end of file
+        return self.title
+
+    @property
+    def etag(self):
+        """ETag fort construit sans lire le contenu : empreinte enregistrée et date de modification."""
+        return f'"{self.content_hash[:32]}-{int(self.updated_at.timestamp() * 1000000):x}"'
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        stored = instance.__dict__.get('editor_content')
+        if isinstance(stored, CompressedText) and stored.version == CHUNKED:
+            # Les morceaux ne sont lus que si le texte complet est demandé
+            pk = instance.pk
+            instance.__dict__['editor_content'] = ChunkedContent(
+                stored.decode(),
+                lambda: ProjectChunk.objects.filter(project_id=pk).order_by('index').values_list('data', flat=True),
+            )
+        # Contenu tel que chargé, pour recaler les annotations à la prochaine sauvegarde
+        instance._loaded_content = instance.__dict__.get('editor_content')
+        instance._stored_chunked = instance.__dict__.get('chunked', False)
+        # Nombre de mots enregistré, pour reporter l'écart dans UserWorkspaceStats
+        instance._stored_word_count = instance.__dict__.get('word_count')
+        return instance
+
+    def chunk_envelope(self):
+        """Enveloppe d'un contenu découpé, lue sans charger les morceaux (None si le contenu n'est pas découpé)."""
+        value = self.__dict__.get('editor_content')
+        if not isinstance(value, ChunkedContent):
+            value = Project.objects.filter(pk=self.pk).values_list('editor_content', flat=True).get()
+            if not isinstance(value, CompressedText) or value.version != CHUNKED:
+                return None
+            return value.decode()
+        return value.envelope
+
+    def stored_content(self):
+        """Contenu sous sa forme compressée, sans le décompresser s'il vient d'être chargé."""
+        if 'editor_content' not in self.__dict__:
+            self.refresh_from_db(fields=['editor_content'])
+        return stored_text(self.__dict__['editor_content'])
+
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get('update_fields')
+        content_changed = update_fields is None or 'editor_content' in update_fields
+        adding = self._state.adding
+        # Hors création, l'index de recherche, les commentaires, le recalage des annotations et le résumé
+        # sont alors laissés à la tâche project.reindex (voir jobs.reindex_later)
+        deferred = content_changed and not adding and self.defer_derived
+        split = None
+        if content_changed:
+            if deferred:
+                previous_words = self.word_count
+                state = load_state(self.editor_content) if self.chunked else None
+                self.content_size = len((self.editor_content or '').encode('utf-8'))
+                self.content_hash = hashlib.sha256((self.editor_content or '').encode('utf-8')).hexdigest()
+            else:
+                previous_words = 0 if adding else self._previous_word_count()
+                state, text, parsed = self.compute_summary()
+            if self.chunked:
+                split = split_state(state)
+            if split is not None:
+                envelope, chunks = split
+                self.content_hash = manifest_hash(envelope, [chunk.hash for chunk in chunks])
+                # Le contenu précédent est lu avant que ses morceaux ne soient remplacés
+                self._loaded_content = decoded_text(getattr(self, '_loaded_content', None))
+                content = self.editor_content
+                self.__dict__['editor_content'] = CompressedText.envelope(envelope)
+            if update_fields is not None:
+                summary = ['content_size', 'content_hash'] if deferred else [
+                    'content_size', 'word_count', 'excerpt', 'content_hash',
+                ]
+                kwargs['update_fields'] = {*update_fields, 'chunked', *summary}
+        try:
+            super().save(*args, **kwargs)
+        finally:
+            if split is not None:
+                self.__dict__['editor_content'] = content
+        if content_changed:
+            if split is not None:
+                self.store_chunks(split[1])
+            elif getattr(self, '_stored_chunked', False):
+                # Retour au stockage d'un seul tenant
+                self.chunks.all().delete()
+            self._stored_chunked = split is not None
+            if not deferred:
+                self.update_search_vector(text)
+                self.sync_annotations(state, parsed.comments)
+                self.remap_annotations(getattr(self, '_loaded_content', None), state, parsed.blocks)
+                self.store_derived_data(text, parsed)
+            self._loaded_content = self.editor_content
+            self._stored_word_count = self.word_count
+        UserWorkspaceStats.record(
+            self.user_id, projects=int(adding), words=self.word_count - previous_words if content_changed else 0,
+        )
+
+    def _previous_word_count(self):
+        previous = getattr(self, '_stored_word_count', None)
+        if previous is None:
+            previous = Project.objects.filter(pk=self.pk).values_list('word_count', flat=True).first() or 0
+        return previous
+
+    def compute_summary(self):
+        """Recalcule le résumé et l'empreinte du contenu.
+
+        Retourne l'état Lexical, le texte brut et le résultat de `derive`, obtenus en un seul parcours.
+        """
+        state = load_state(self.editor_content)
+        parsed = derive(state)
+        if state is not None:
+            text = '\n'.join(parsed.blocks)
+        else:
+            text = plain_text(self.editor_content, state)
+        self.content_size, self.word_count, self.excerpt = summarize(self.editor_content, text)
+        self.content_hash = hashlib.sha256((self.editor_content or '').encode('utf-8')).hexdigest()
+        return state, text, parsed
+
+    def store_chunks(self, chunks):
+        """Enregistre les morceaux du contenu : seuls ceux dont l'empreinte est nouvelle sont écrits."""
+        existing = {}
+        # Requête sur ProjectChunk plutôt que self.chunks : le gestionnaire lié lirait project_id, différé
+        for row in ProjectChunk.objects.filter(project_id=self.pk).only('id', 'index', 'start_block', 'hash'):
+            existing.setdefault(row.hash, []).append(row)
+        self._write_chunks(existing, chunks)
+
+    def replace_chunks(self, changes):
+        """Remplace les blocs des morceaux `changes` ({index: blocs}) sans lire les autres morceaux.
+
+        Retourne le patch JSON équivalent, pour l'historique des révisions.
+        """
+        rows = list(
+            ProjectChunk.objects.filter(project_id=self.pk)
+            .only('id', 'index', 'start_block', 'block_count', 'size', 'hash').order_by('index')
+        )
+        by_index = {row.index: row for row in rows}
+        unknown = [index for index in changes if index not in by_index]
+        if unknown:
+            raise ValueError(f"Morceau inconnu : {unknown[0]}")
+
+        chunks = []
+        for row in rows:
+            if row.index in changes:
+                chunks.extend(split_blocks(changes[row.index]))
+            else:
+                chunks.append(row)
+        # Morceaux non modifiés retrouvés par empreinte ; les morceaux remplacés sont supprimés
+        existing = {}
+        for row in rows:
+            if row.index not in changes:
+                existing.setdefault(row.hash, []).append(row)
+        replaced = [by_index[index].id for index in changes]
+        self._write_chunks(existing, chunks, replaced)
+
+        # Les positions les plus hautes d'abord, pour que les précédentes restent valables
+        patch = []
+        for index in sorted(changes, reverse=True):
+            row = by_index[index]
+            patch.extend({'op': 'remove', 'path': f'/root/children/{row.start_block}'} for _ in range(row.block_count))
+            patch.extend(
+                {'op': 'add', 'path': f'/root/children/{row.start_block + offset}', 'value': block}
+                for offset, block in enumerate(changes[index])
+            )
+
+        envelope = self.chunk_envelope()
+        self.content_hash = manifest_hash(envelope, [chunk.hash for chunk in chunks])
+        self.content_size = assembled_size(envelope, [chunk.size for chunk in chunks])
+        return patch
+
+    def _write_chunks(self, existing, chunks, removed=()):
+        to_create = []
+        to_update = []
+        start = 0
+        for index, chunk in enumerate(chunks):
+            rows = existing.get(chunk.hash)
+            if rows:
+                row = rows.pop()
+                if row.index != index or row.start_block != start:
+                    row.index, row.start_block = index, start
+                    to_update.append(row)
+            else:
+                to_create.append(ProjectChunk(
+                    project=self, index=index, start_block=start, block_count=chunk.block_count,
+                    size=chunk.size, hash=chunk.hash, data=chunk.data,
+                ))
+            start += chunk.block_count
+        removed = [*removed, *(row.id for rows in existing.values() for row in rows)]
+        if removed:
+            ProjectChunk.objects.filter(id__in=removed).delete()
+        if to_update:
+            ProjectChunk.objects.bulk_update(to_update, ['index', 'start_block'])
+        if to_create:
+            ProjectChunk.objects.bulk_create(to_create)
+
+    def store_derived_data(self, text, parsed, anchored=True):
+        """Enregistre (upsert) les données dérivées du contenu qui vient d'être sauvegardé.
+
+        `anchored` indique que les annotations ajoutées à la main viennent d'être recalées sur ce contenu.
+        """
+        derived = ProjectDerivedData.build(self, text, parsed, anchored)
+        fields = ProjectDerivedData.DATA_FIELDS + ['anchor_revision'] if anchored else ProjectDerivedData.DATA_FIELDS
+        ProjectDerivedData.objects.bulk_create(
+            [derived], update_conflicts=True, unique_fields=['project'], update_fields=fields,
+        )
+        return derived
+
+    def get_derived_data(self):
+        """Données dérivées à jour ; recalculées seulement si le projet a changé depuis leur calcul."""
+        derived = ProjectDerivedData.objects.filter(project_id=self.pk).first()
+        if derived is not None and derived.is_current(self):
+            return derived
+        if derived is not None and derived.content_hash == self.content_hash:
+            # Seuls le titre ou la description ont changé : le contenu n'a pas à être relu
+            derived.source_updated_at = self.updated_at
+            derived.save(update_fields=['source_updated_at'])
+            return derived
+        state = load_state(self.editor_content)
+        parsed = derive(state)
+        text = '\n'.join(parsed.blocks) if state is not None else plain_text(self.editor_content)
+        # Les annotations restent calées sur la révision précédente jusqu'au passage de project.reindex
+        return self.store_derived_data(text, parsed, anchored=False)
+
+    def reindex(self, previous_content=None):
+        """Recalcule résumé, index de recherche, commentaires et données dérivées sans toucher au contenu.
+
+        `previous_content` est le contenu sur lequel les annotations ajoutées à la main sont encore calées.
+        Sans effet si le projet a été modifié depuis sa lecture : la tâche mise en file par cette
+        modification fera le recalcul. Retourne False dans ce cas.
+        """
+        previous_words = self._previous_word_count()
+        state, text, parsed = self.compute_summary()
+        summary = {'content_size': self.content_size, 'word_count': self.word_count, 'excerpt': self.excerpt}
+        if not self.chunked:
+            # L'empreinte d'un contenu découpé est celle de ses morceaux, déjà à jour
+            summary['content_hash'] = self.content_hash
+        if not Project.objects.filter(pk=self.pk, revision=self.revision).update(**summary):
+            return False
+        # update() ne déclenche pas post_save
+        invalidate_project(self.pk, self.user_id)
+        self._stored_word_count = self.word_count
+        UserWorkspaceStats.record(self.user_id, words=self.word_count - previous_words, activity=False)
+        self.update_search_vector(text)
+        self.sync_annotations(state, parsed.comments)
+        self.remap_annotations(previous_content, state, parsed.blocks)
+        self.store_derived_data(text, parsed)
+        return True
+
+    def update_search_vector(self, text):
+        if connection.vendor != 'postgresql':
+            return
+        Project.objects.filter(pk=self.pk).update(search_vector=weighted_vector(
+            ('title', 'A'), ('description', 'B'), (Value(text[:SEARCH_TEXT_LIMIT]), 'C'),
+        ))
+
+    def remap_annotations(self, previous_content, state, blocks=None):
+        """Recale les annotations ajoutées à la main (hors nœuds de commentaire) après une modification."""
+        previous_content = decoded_text(previous_content)
+        if previous_content is None or previous_content == self.editor_content:
+            return
+        annotations = self.annotations.filter(node_uuid__isnull=True)
+        if not annotations.exists():
+            return
+        previous_state = load_state(previous_content)
+        if previous_state is None or state is None:
+            return
+        if blocks is None:
+            blocks = block_texts(state)
+        remap_annotations(annotations, block_texts(previous_state), blocks)
+
+    def sync_annotations(self, state, comments=None):
+        """Met à jour l'index des commentaires en ne touchant que les nœuds ajoutés, modifiés ou supprimés."""
+        if comments is None:
+            comments = derive(state).comments if state is not None else []
+        extracted = {}
+        for comment in comments:
+            extracted.setdefault(comment['uuid'], comment)
+
+        existing = {
+            node_uuid: (annotation_id, node_hash)
+            for annotation_id, node_uuid, node_hash in self.annotations.filter(node_uuid__isnull=False)
+            .values_list('id', 'node_uuid', 'node_hash')
+        }
+
+        to_create = []
+        to_update = []
+        for node_uuid, comment in extracted.items():
+            node_hash = hashlib.sha1(json.dumps(comment, sort_keys=True).encode('utf-8')).hexdigest()
+            annotation = Annotation(
+                user_id=self.user_id,
+                project=self,
+                node_uuid=node_uuid,
+                node_hash=node_hash,
+                comments=comment['comments'],
+                title=comment['text'][:255],
+                description='\n'.join(
+                    str(entry.get('content', '')) for entry in comment['comments'] if isinstance(entry, dict)
+                ),
+                start_index=comment['start_index'],
+                end_index=comment['end_index'],
+                selected_text=comment['text'],
+            )
+            if node_uuid not in existing:
+                to_create.append(annotation)
+            elif existing[node_uuid][1] != node_hash:
+                annotation.id = existing[node_uuid][0]
+                to_update.append(annotation)
+
+        removed = [annotation_id for node_uuid, (annotation_id, _) in existing.items() if node_uuid not in extracted]
+        if removed:
+            Annotation.objects.filter(id__in=removed).delete()
+        if to_create:
+            Annotation.objects.bulk_create(to_create)
+            # bulk_create ne déclenche pas post_save
+            UserWorkspaceStats.record(self.user_id, annotations=len(to_create))
+        if to_update:
+            Annotation.objects.bulk_update(to_update, [
+                'user', 'node_hash', 'comments', 'title', 'description', 'start_index', 'end_index', 'selected_text',
+            ])
+        if to_create or to_update:
+            changed = [annotation.id for annotation in to_create + to_update]
+            Annotation.objects.filter(id__in=changed).update_search_vectors()
+
+class ProjectChunk(models.Model):
+    """Suite ordonnée de blocs de premier niveau d'un projet découpé, en JSON (tableau)."""
+
+    project = models.ForeignKey(Project, on_delete=models.CASCADE, related_name='chunks')
+    index = models.PositiveIntegerField()
+    # Position du premier bloc du morceau dans root.children
+    start_block = models.PositiveIntegerField(default=0)
+    block_count = models.PositiveIntegerField(default=0)
+    # Taille en octets du JSON non compressé
+    size = models.PositiveIntegerField(default=0)
+    hash = models.CharField(max_length=40)
+    data = CompressedTextField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['project', 'index'], name='projectchunk_project_index_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.project_id} #{self.index}"
+
+class ProjectDerivedData(models.Model):
+    """Texte brut, comptages et plan d'un projet, calculés une fois par sauvegarde du contenu."""
+
+    DATA_FIELDS = [
+        'plain_text', 'char_count', 'word_count', 'comment_count', 'outline', 'content_hash', 'source_updated_at',
+    ]
+
+    project = models.OneToOneField(Project, on_delete=models.CASCADE, primary_key=True, related_name='derived')
+    plain_text = models.TextField(blank=True, default='')
+    char_count = models.PositiveIntegerField(default=0)
+    word_count = models.PositiveIntegerField(default=0)
+    comment_count = models.PositiveIntegerField(default=0)
+    # Titres du document : niveau, texte, index du bloc et position dans le texte brut
+    outline = models.JSONField(default=list, blank=True)
+    # Empreinte et date de modification du projet au moment du calcul
+    content_hash = models.CharField(max_length=64, blank=True, default='')
+    source_updated_at = models.DateTimeField(null=True)
+    # Révision du projet sur laquelle sont calées les annotations ajoutées à la main
+    anchor_revision = models.PositiveIntegerField(null=True, blank=True)
+
+    def __str__(self):
+        return f"Données dérivées du projet {self.project_id}"
+
+    @classmethod
+    def build(cls, project, text, parsed, anchored=True):
+        return cls(
+            project=project,
+            plain_text=text,
+            char_count=len(text),
+            word_count=len(text.split()),
+            comment_count=len({comment['uuid'] for comment in parsed.comments}),
+            outline=parsed.outline,
+            content_hash=project.content_hash,
+            source_updated_at=project.updated_at,
+            anchor_revision=project.revision if anchored else None,
+        )
+
+    def is_current(self, project):
+        return self.source_updated_at is not None and self.source_updated_at >= project.updated_at
+
+class ProjectRevision(models.Model):
+    project = models.ForeignKey(Project, on_delete=models.CASCADE, related_name="revisions")
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True)
+    revision = models.PositiveIntegerField()
+    # Révision de l'image complète à partir de laquelle reconstruire celle-ci
+    keyframe = models.PositiveIntegerField()
+    is_keyframe = models.BooleanField(default=False)
+    data = models.BinaryField()
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        unique_together = ('project', 'revision')
+
+    def __str__(self):
+        return f"{self.project_id} r{self.revision}"
+
+
+class Job(models.Model):
+    """Tâche de fond exécutée par `manage.py runworker` (voir api/jobs.py)."""
+
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    SUCCEEDED = 'succeeded'
+    FAILED = 'failed'
+    STATUS_CHOICES = [
+        (QUEUED, 'En attente'),
+        (RUNNING, 'En cours'),
+        (SUCCEEDED, 'Terminée'),
+        (FAILED, 'Échouée'),
+    ]
+
+    kind = models.CharField(max_length=64)
+    payload = models.JSONField(default=dict, blank=True)
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.CASCADE, null=True, blank=True, related_name='jobs',
+    )
+    status = models.CharField(max_length=16, choices=STATUS_CHOICES, default=QUEUED)
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=5)
+    # Date à partir de laquelle la tâche peut être prise (repoussée entre deux tentatives)
+    run_at = models.DateTimeField(default=timezone.now)
+    locked_by = models.CharField(max_length=128, blank=True, default='')
+    locked_at = models.DateTimeField(null=True, blank=True)
+    result = models.JSONField(null=True, blank=True)
+    error = models.TextField(blank=True, default='')
+    created_at = models.DateTimeField(default=timezone.now)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'run_at'], name='job_status_run_at_idx'),
+            models.Index(fields=['user', 'created_at'], name='job_user_created_idx'),
+        ]
+        constraints = [
+            # Une seule tâche identique en attente : enqueue_once s'appuie dessus sous concurrence
+            models.UniqueConstraint(
+                fields=['kind', 'payload'], condition=models.Q(status='queued'), name='job_queued_unique',
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.kind} #{self.pk} ({self.status})"
+
+
+class UserWorkspaceStats(models.Model):
+    """Compteurs de l'espace de travail d'un utilisateur, tenus à jour à chaque écriture.
+
+    Les écritures reportent leur écart dans la même transaction ; manage.py
+    reconcile_workspace_stats recompte tout pour corriger une éventuelle dérive.
+    """
+
+    COUNTER_FIELDS = ['project_count', 'word_count', 'annotation_count']
+
+    user = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True, related_name='workspace_stats')
+    # Entiers signés : une dérive ne doit pas faire échouer une suppression
+    project_count = models.IntegerField(default=0)
+    word_count = models.BigIntegerField(default=0)
+    annotation_count = models.IntegerField(default=0)
+    # Dernière écriture sur un projet ou une annotation de l'utilisateur
+    last_activity_at = models.DateTimeField(null=True, blank=True)
+    reconciled_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"Statistiques de l'utilisateur {self.user_id}"
+
+    @classmethod
+    def record(cls, user_id, projects=0, words=0, annotations=0, activity=True):
+        """Reporte un écart sur les compteurs de l'utilisateur.
+
+        Sans ligne existante, rien n'est écrit : elle sera créée par un recomptage, qui inclut cet écart.
+        """
+        if user_id is None:
+            return
+        changes = {}
+        for field, amount in (('project_count', projects), ('word_count', words), ('annotation_count', annotations)):
+            if amount:
+                changes[field] = F(field) + amount
+        if activity:
+            changes['last_activity_at'] = timezone.now()
+        if changes:
+            cls.objects.filter(user_id=user_id).update(**changes)
+
+    @classmethod
+    def recount(cls, user_ids):
+        """Recalcule et enregistre (upsert) les compteurs des utilisateurs `user_ids`."""
+        user_ids = list(user_ids)
+        projects = {
+            row['user_id']: row
+            for row in Project.objects.filter(user_id__in=user_ids).order_by().values('user_id').annotate(
+                count=Count('id'), words=Sum('word_count'), last=Max('updated_at'),
+            )
+        }
+        annotations = {
+            row['user_id']: row
+            for row in Annotation.objects.filter(user_id__in=user_ids).order_by().values('user_id').annotate(
+                count=Count('id'), last=Max('created_at'),
+            )
+        }
+        now = timezone.now()
+        stats = []
+        for user_id in user_ids:
+            project = projects.get(user_id, {})
+            annotation = annotations.get(user_id, {})
+            stats.append(cls(
+                user_id=user_id,
+                project_count=project.get('count', 0),
+                word_count=project.get('words') or 0,
+                annotation_count=annotation.get('count', 0),
+                last_activity_at=max(filter(None, (project.get('last'), annotation.get('last'))), default=None),
+                reconciled_at=now,
+            ))
+        cls.objects.bulk_create(
+            stats, update_conflicts=True, unique_fields=['user'],
+            update_fields=[*cls.COUNTER_FIELDS, 'last_activity_at', 'reconciled_at'],
+        )
+        return stats
+
+    @classmethod
+    def for_user(cls, user_id):
+        return cls.objects.filter(user_id=user_id).first() or cls.recount([user_id])[0]
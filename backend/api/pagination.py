@@ -0,0 +1,16 @@
+from rest_framework.pagination import CursorPagination
+
+
+class ProjectCursorPagination(CursorPagination):
+    ordering = '-created_at'
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 200
+
+
+class AnnotationCursorPagination(CursorPagination):
+    # Pagination par clé : ?ordering=start_index (avec ?text=) suit l'index (text_id, start_index)
+    ordering = '-created_at'
+    page_size = 100
+    page_size_query_param = 'page_size'
+    max_page_size = 500
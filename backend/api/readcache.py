@@ -0,0 +1,172 @@
+import pickle
+import threading
+import time
+import uuid
+from collections import OrderedDict, namedtuple
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+
+from .checks import is_process_local
+from .metrics import read_cache_requests
+
+PREFIX = 'readcache:'
+
+# Ce qu'attendent set_validators et conditional_response, sans instance de Project
+Validators = namedtuple('Validators', ['etag', 'updated_at'])
+
+
+class LocalLRU:
+    """Entrées en mémoire du processus ; au-delà de max_bytes, les moins récemment lues sont évincées."""
+
+    def __init__(self, max_bytes, ttl):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.size = 0
+        # Par clé : (valeur, expiration, taille)
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        now = time.monotonic()
+        with self.lock:
+            item = self.entries.get(key)
+            if item is None:
+                return None
+            if item[1] <= now:
+                self._remove(key)
+                return None
+            self.entries.move_to_end(key)
+            return item[0]
+
+    def set(self, key, value, size):
+        with self.lock:
+            if key in self.entries:
+                self._remove(key)
+            if size > self.max_bytes:
+                return
+            self.entries[key] = (value, time.monotonic() + self.ttl, size)
+            self.size += size
+            while self.size > self.max_bytes:
+                self._remove(next(iter(self.entries)))
+
+    def _remove(self, key):
+        self.size -= self.entries.pop(key)[2]
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.size = 0
+
+
+def _size(value):
+    # Taille sérialisée, proche de ce que le niveau partagé stocke pour la même entrée
+    return len(pickle.dumps(value, pickle.HIGHEST_PROTOCOL))
+
+
+class ReadCache:
+    """Cache de lecture à deux niveaux : LRU du processus, devant le cache Django partagé READ_CACHE_SHARED.
+
+    Chaque clé a une version, conservée dans le niveau partagé et remplacée après le commit de toute
+    écriture qui la concerne : les entrées enregistrées sous une ancienne version ne sont plus jamais
+    lues, par aucun processus.
+    """
+
+    def __init__(self, alias):
+        self.alias = alias
+        self.timeout = getattr(settings, 'READ_CACHE_TIMEOUT', 60)
+        self.local = LocalLRU(getattr(settings, 'READ_CACHE_MAX_BYTES', 64 * 1024 * 1024), self.timeout)
+        self.shared = caches[alias]
+
+    def version(self, key):
+        version_key = f'{PREFIX}version:{key}'
+        version = self.shared.get(version_key)
+        if version is None:
+            version = uuid.uuid4().hex
+            if not self.shared.add(version_key, version, self.timeout):
+                version = self.shared.get(version_key) or version
+        return version
+
+    def get(self, name, key, variant=''):
+        """(version, valeur) ; la valeur vaut None en cas d'absence, à enregistrer ensuite avec set().
+
+        `variant` distingue plusieurs entrées d'une même clé (pages d'une liste), invalidées ensemble.
+        """
+        version = self.version(key)
+        entry_key = f'{PREFIX}{key}:{version}:{variant}'
+        value = self.local.get(entry_key)
+        if value is not None:
+            read_cache_requests.inc((name, 'local'))
+            return version, value
+        value = self.shared.get(entry_key)
+        if value is not None:
+            self.local.set(entry_key, value, _size(value))
+            read_cache_requests.inc((name, 'shared'))
+            return version, value
+        read_cache_requests.inc((name, 'miss'))
+        return version, None
+
+    def set(self, key, version, value, variant=''):
+        entry_key = f'{PREFIX}{key}:{version}:{variant}'
+        self.local.set(entry_key, value, _size(value))
+        self.shared.set(entry_key, value, self.timeout)
+
+    def bump(self, *keys):
+        for key in keys:
+            self.shared.set(f'{PREFIX}version:{key}', uuid.uuid4().hex, self.timeout)
+
+    def invalidate(self, *keys):
+        # Après le commit : une lecture concurrente ne peut pas enregistrer l'ancien état sous la nouvelle version
+        transaction.on_commit(lambda: self.bump(*keys))
+
+
+_cache = None
+
+
+def get_cache():
+    global _cache
+    alias = getattr(settings, 'READ_CACHE_SHARED', '')
+    if _cache is None or _cache.alias != alias:
+        _cache = ReadCache(alias)
+    return _cache
+
+
+def enabled():
+    """Actif seulement avec un niveau partagé : sans lui, une écriture n'invaliderait que son processus."""
+    alias = getattr(settings, 'READ_CACHE_SHARED', '')
+    return getattr(settings, 'READ_CACHE_ENABLED', True) and bool(alias) and not is_process_local(alias)
+
+
+def project_key(project_id):
+    return f'project:{project_id}'
+
+
+def user_projects_key(user_id):
+    return f'user-projects:{user_id}'
+
+
+def invalidate_project(project_id, user_id):
+    """Invalide le détail du projet et la liste des projets de son propriétaire."""
+    if not enabled():
+        return
+    keys = [project_key(project_id)]
+    if user_id is not None:
+        keys.append(user_projects_key(user_id))
+    get_cache().invalidate(*keys)
+
+
+def invalidate_user_projects(user_id):
+    if enabled():
+        get_cache().invalidate(user_projects_key(user_id))
+
+
+def project_changed(sender, instance, **kwargs):
+    invalidate_project(instance.pk, instance.user_id)
+
+
+def project_entry(project, data):
+    """Entrée du détail d'un projet ; None si le contenu dépasse READ_CACHE_MAX_CONTENT caractères."""
+    if len(data.get('editor_content') or '') > getattr(settings, 'READ_CACHE_MAX_CONTENT', 1024 * 1024):
+        return None
+    return {'user_id': project.user_id, 'validators': Validators(project.etag, project.updated_at), 'data': data}
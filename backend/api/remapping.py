@@ -0,0 +1,135 @@
+import difflib
+from collections import namedtuple
+
+from django.db.models import Case, F, Q, When
+
+# Au-delà, les modifications sont fusionnées en une seule pour garder une requête de taille bornée
+MAX_EDITS = 100
+# Taille minimale de la fenêtre de recherche autour de la position attendue
+ANCHOR_WINDOW = 200
+FUZZY_RATIO = 0.8
+
+Edit = namedtuple('Edit', ['start', 'end', 'length'])
+
+
+def _offsets(blocks):
+    offsets = [0]
+    for block in blocks:
+        offsets.append(offsets[-1] + len(block) + 1)
+    return offsets
+
+
+def _common_prefix(a, b):
+    limit = min(len(a), len(b))
+    i = 0
+    while i < limit and a[i] == b[i]:
+        i += 1
+    return i
+
+
+def text_edits(old_blocks, new_blocks):
+    """Modifications (début, fin, longueur insérée) en coordonnées de l'ancien texte brut.
+
+    Le diff est calculé bloc par bloc puis resserré sur le préfixe et le suffixe communs.
+    """
+    old_offsets = _offsets(old_blocks)
+    new_offsets = _offsets(new_blocks)
+    matcher = difflib.SequenceMatcher(None, old_blocks, new_blocks, autojunk=False)
+
+    edits = []
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == 'equal':
+            continue
+        old_segment = ''.join(block + '\n' for block in old_blocks[i1:i2])
+        new_segment = ''.join(block + '\n' for block in new_blocks[j1:j2])
+        prefix = _common_prefix(old_segment, new_segment)
+        suffix = _common_prefix(old_segment[prefix:][::-1], new_segment[prefix:][::-1])
+        start = old_offsets[i1] + prefix
+        end = old_offsets[i1] + len(old_segment) - suffix
+        length = new_offsets[j2] - new_offsets[j1] - prefix - suffix
+        edits.append(Edit(start, end, length))
+
+    if len(edits) > MAX_EDITS:
+        delta = sum(edit.length - (edit.end - edit.start) for edit in edits)
+        first, last = edits[0], edits[-1]
+        edits = [Edit(first.start, last.end, last.end - first.start + delta)]
+    return edits
+
+
+def _map_position(position, edits):
+    delta = 0
+    for edit in edits:
+        if position < edit.start:
+            break
+        if position < edit.end:
+            return edit.start + delta
+        delta += edit.length - (edit.end - edit.start)
+    return position + delta
+
+
+def _anchor(text, selected_text, expected):
+    """Retrouve `selected_text` au plus près de `expected`, exactement puis approximativement."""
+    window = max(ANCHOR_WINDOW, 2 * len(selected_text))
+    low = max(0, expected - window)
+    high = min(len(text), expected + len(selected_text) + window)
+
+    candidates = []
+    after = text.find(selected_text, expected, high)
+    if after != -1:
+        candidates.append(after)
+    before = text.rfind(selected_text, low, expected + len(selected_text))
+    if before != -1:
+        candidates.append(before)
+    if candidates:
+        start = min(candidates, key=lambda position: abs(position - expected))
+        return start, start + len(selected_text)
+
+    matcher = difflib.SequenceMatcher(None, text[low:high], selected_text, autojunk=False)
+    match = matcher.find_longest_match(0, high - low, 0, len(selected_text))
+    if match.size and match.size >= FUZZY_RATIO * len(selected_text):
+        start = max(0, low + match.a - match.b)
+        return start, min(len(text), start + len(selected_text))
+    return None
+
+
+def remap_annotations(queryset, old_blocks, new_blocks):
+    """Recale les annotations de `queryset` après une modification du texte.
+
+    Les annotations situées après une modification sont décalées par un seul UPDATE ;
+    seules celles qui chevauchent une modification sont relues et réancrées sur leur texte sélectionné.
+    """
+    edits = text_edits(old_blocks, new_blocks)
+    if not edits:
+        return 0
+
+    touched_filter = Q()
+    for edit in edits:
+        touched_filter |= Q(start_index__lt=edit.end, end_index__gt=edit.start)
+
+    delta = 0
+    start_cases = []
+    end_cases = []
+    for edit in edits:
+        delta += edit.length - (edit.end - edit.start)
+        start_cases.append(When(start_index__gte=edit.end, then=F('start_index') + delta))
+        end_cases.append(When(start_index__gte=edit.end, then=F('end_index') + delta))
+
+    touched = list(queryset.filter(touched_filter).only('id', 'start_index', 'end_index', 'selected_text'))
+
+    queryset.filter(start_index__gte=edits[0].end).exclude(touched_filter).update(
+        start_index=Case(*reversed(start_cases), default=F('start_index')),
+        end_index=Case(*reversed(end_cases), default=F('end_index')),
+    )
+
+    if touched:
+        text = '\n'.join(new_blocks)
+        for annotation in touched:
+            expected = _map_position(annotation.start_index, edits)
+            anchored = _anchor(text, annotation.selected_text, expected) if annotation.selected_text else None
+            if anchored is None:
+                annotation.detached = True
+            else:
+                annotation.start_index, annotation.end_index = anchored
+                annotation.detached = False
+        queryset.model.objects.bulk_update(touched, ['start_index', 'end_index', 'detached'], batch_size=1000)
+    return len(touched)
@@ -0,0 +1,79 @@
+import json
+import zlib
+
+from django.conf import settings
+
+from .jsonpatch import apply_patch, make_patch
+from .models import ProjectRevision
+
+
+def _compress(payload):
+    return zlib.compress(payload.encode('utf-8'))
+
+
+def _decompress(data):
+    return zlib.decompress(bytes(data)).decode('utf-8')
+
+
+def _load(content):
+    try:
+        return json.loads(content) if content else None
+    except ValueError:
+        return None
+
+
+def record_revision(project, previous_content, user=None, patch=None):
+    """Enregistre l'état courant de `project` sous forme de delta ou d'image complète.
+
+    `patch` peut être fourni lorsqu'il est déjà connu (sauvegarde par patch) pour éviter de recalculer le diff.
+    """
+    last = project.revisions.order_by('-revision').values('revision', 'keyframe').first()
+    chained = (
+        last is not None
+        and last['revision'] == project.revision - 1
+        and project.revision - last['keyframe'] < settings.PROJECT_REVISION_KEYFRAME_INTERVAL
+    )
+
+    if chained and patch is None:
+        previous, current = _load(previous_content), _load(project.editor_content)
+        if previous is not None and current is not None:
+            patch = make_patch(previous, current)
+
+    if chained and patch is not None:
+        return ProjectRevision.objects.create(
+            project=project,
+            user=user,
+            revision=project.revision,
+            keyframe=last['keyframe'],
+            data=_compress(json.dumps(patch, ensure_ascii=False, separators=(',', ':'))),
+        )
+
+    return ProjectRevision.objects.create(
+        project=project,
+        user=user,
+        revision=project.revision,
+        keyframe=project.revision,
+        is_keyframe=True,
+        data=_compress(project.editor_content or ''),
+    )
+
+
+def reconstruct_content(project, revision):
+    """Reconstruit le contenu d'une révision à partir de son image complète et des deltas suivants."""
+    target = project.revisions.only('keyframe').get(revision=revision)
+    chain = project.revisions.filter(revision__gte=target.keyframe, revision__lte=revision).order_by('revision')
+
+    content = None
+    document = None
+    for entry in chain.only('is_keyframe', 'data'):
+        payload = _decompress(entry.data)
+        if entry.is_keyframe:
+            content, document = payload, None
+            continue
+        if document is None:
+            document = json.loads(content)
+        document = apply_patch(document, json.loads(payload))
+
+    if document is not None:
+        content = json.dumps(document, ensure_ascii=False, separators=(',', ':'))
+    return content
@@ -0,0 +1,35 @@
+from django.contrib.postgres.search import SearchQuery, SearchVector
+
+# Les documents sont indexés dans les deux langues ; une requête peut cibler l'une ou l'autre
+SEARCH_CONFIGS = {
+    'fr': 'french',
+    'en': 'english',
+}
+# tsvector est limité à 1 Mo : au-delà, seul le début du texte est indexé
+SEARCH_TEXT_LIMIT = 500000
+# ts_headline relit le texte à chaque résultat : les extraits sont cherchés dans le début du document
+SNIPPET_TEXT_LIMIT = 50000
+
+
+def search_configs(lang=None):
+    if lang in SEARCH_CONFIGS:
+        return [SEARCH_CONFIGS[lang]]
+    return list(SEARCH_CONFIGS.values())
+
+
+def weighted_vector(*parts):
+    """Concatène les vecteurs de chaque (expression, poids) pour toutes les configurations."""
+    vector = None
+    for expression, weight in parts:
+        for config in SEARCH_CONFIGS.values():
+            part = SearchVector(expression, weight=weight, config=config)
+            vector = part if vector is None else vector + part
+    return vector
+
+
+def search_query(terms, configs):
+    query = None
+    for config in configs:
+        part = SearchQuery(terms, config=config, search_type='websearch')
+        query = part if query is None else query | part
+    return query
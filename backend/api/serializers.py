@@ -1,40 +1,142 @@
 from rest_framework import serializers
-from .models import Text, Annotation , Project
+from .models import Text, Annotation, Project, ProjectRevision, ProjectDerivedData, Job, UserWorkspaceStats
+from .metrics import TimedSerializerMixin
 from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
+from rest_framework_simplejwt.settings import api_settings
+from .tokens import FAMILY_CLAIM
 from django.contrib.auth.models import User
 from django.contrib.auth.password_validation import validate_password
 import re
 
-class TextSerializer(serializers.ModelSerializer):
+class TextSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = Text
         fields = ['id', 'content', 'annotations']
 
-class AnnotationSerializer(serializers.ModelSerializer):
+class AnnotationSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = Annotation
-        fields = ['id', 'title', 'description', 'start_index', 'end_index', 'text', 'created_at']
+        fields = [
+            'id', 'user', 'title', 'description', 'start_index', 'end_index', 'text', 'selected_text',
+            'project', 'node_uuid', 'comments', 'created_at',
+        ]
+        read_only_fields = ['user', 'project', 'node_uuid', 'comments']
+
+class AnnotationIngestSerializer(serializers.Serializer):
+    title = serializers.CharField(max_length=255)
+    description = serializers.CharField()
+    selectedText = serializers.CharField()
+    start_index = serializers.IntegerField(min_value=0)
+    end_index = serializers.IntegerField(min_value=0)
+    project = serializers.IntegerField(required=False, allow_null=True)
+
+    def validate(self, attrs):
+        if attrs['end_index'] < attrs['start_index']:
+            raise serializers.ValidationError(
+                {"end_index": "L'index de fin doit être supérieur ou égal à l'index de début."}
+            )
+        return attrs
+
+    @staticmethod
+    def build(data, text, user=None):
+        """Annotation non enregistrée construite à partir des données validées, seule ou par lot."""
+        return Annotation(
+            user=user,
+            text=text,
+            project_id=data.get('project'),
+            title=data['title'],
+            description=data['description'],
+            start_index=data['start_index'],
+            end_index=data['end_index'],
+            # Texte de référence pour réancrer l'annotation quand le projet est modifié
+            selected_text=data['selectedText'],
+        )
 
 class MyTokenObtainPairSerializer(TokenObtainPairSerializer):
     @classmethod
     def get_token(cls, user):
         token = super().get_token(user)
         token['username'] = user.username
+        # Les jetons qui remplaceront celui-ci à chaque rafraîchissement gardent cette famille
+        token[FAMILY_CLAIM] = token[api_settings.JTI_CLAIM]
         return token
 
 class LoginSerializer(serializers.Serializer):
     username = serializers.CharField()
     password = serializers.CharField()
-class ProjectSerializer(serializers.ModelSerializer):
+class ProjectSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = Project
-        fields = ['id', 'user', 'title', 'description', 'editor_content', 'created_at', 'updated_at']
-        read_only_fields = ['id', 'created_at', 'updated_at']
+        fields = [
+            'id', 'user', 'title', 'description', 'editor_content', 'chunked', 'revision',
+            'content_size', 'word_count', 'excerpt', 'created_at', 'updated_at',
+        ]
+        read_only_fields = ['id', 'revision', 'content_size', 'word_count', 'excerpt', 'created_at', 'updated_at']
+
+class ProjectSummarySerializer(TimedSerializerMixin, serializers.ModelSerializer):
+    class Meta:
+        model = Project
+        fields = [
+            'id', 'user', 'title', 'description', 'chunked', 'revision',
+            'content_size', 'word_count', 'excerpt', 'created_at', 'updated_at',
+        ]
+        read_only_fields = fields
+
+class ProjectDerivedDataSerializer(TimedSerializerMixin, serializers.ModelSerializer):
+    updated_at = serializers.DateTimeField(source='source_updated_at', read_only=True)
+
+    class Meta:
+        model = ProjectDerivedData
+        fields = ['project', 'plain_text', 'char_count', 'word_count', 'comment_count', 'outline', 'updated_at']
+        read_only_fields = fields
+
+class ProjectPatchSerializer(serializers.Serializer):
+    base_revision = serializers.IntegerField(min_value=0)
+    patch = serializers.ListField(child=serializers.DictField(), allow_empty=True)
+
+class ChunkChangeSerializer(serializers.Serializer):
+    index = serializers.IntegerField(min_value=0)
+    blocks = serializers.ListField(child=serializers.DictField(), allow_empty=True)
+
+class ProjectChunksUpdateSerializer(serializers.Serializer):
+    base_revision = serializers.IntegerField(min_value=0)
+    chunks = ChunkChangeSerializer(many=True, allow_empty=False)
+
+    def validate_chunks(self, value):
+        if len({change['index'] for change in value}) != len(value):
+            raise serializers.ValidationError("Chaque morceau ne peut être modifié qu'une fois.")
+        return value
+
+class ProjectRevisionSerializer(TimedSerializerMixin, serializers.ModelSerializer):
+    class Meta:
+        model = ProjectRevision
+        fields = ['revision', 'is_keyframe', 'user', 'created_at']
+
+class JobSerializer(TimedSerializerMixin, serializers.ModelSerializer):
+    class Meta:
+        model = Job
+        fields = [
+            'id', 'kind', 'payload', 'status', 'attempts', 'max_attempts', 'run_at', 'result', 'error',
+            'created_at', 'finished_at',
+        ]
+        read_only_fields = fields
+
+class UserWorkspaceStatsSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = UserWorkspaceStats
+        fields = ['project_count', 'word_count', 'annotation_count', 'last_activity_at']
+        read_only_fields = fields
+
+class UserSerializer(TimedSerializerMixin, serializers.ModelSerializer):
+    # Une seule ligne lue, créée par un recomptage si elle n'existe pas encore
+    stats = serializers.SerializerMethodField()
 
-class UserSerializer(serializers.ModelSerializer):
     class Meta:
         model = User
-        fields = ['id', 'username', 'email']
+        fields = ['id', 'username', 'email', 'stats']
+
+    def get_stats(self, user):
+        return UserWorkspaceStatsSerializer(UserWorkspaceStats.for_user(user.pk)).data
 
 class RegisterSerializer(serializers.ModelSerializer):
     password = serializers.CharField(write_only=True, required=True, validators=[validate_password])
@@ -0,0 +1,18 @@
+from .models import UserWorkspaceStats
+
+
+# Récepteurs de signaux (connectés dans ApiConfig.ready) ; les écritures en masse
+# (bulk_create) appellent UserWorkspaceStats.record elles-mêmes.
+
+def project_deleting(sender, instance, **kwargs):
+    # Avant la suppression, pour pouvoir encore lire un nombre de mots différé
+    UserWorkspaceStats.record(instance.user_id, projects=-1, words=-instance.word_count)
+
+
+def annotation_saved(sender, instance, created, **kwargs):
+    if created:
+        UserWorkspaceStats.record(instance.user_id, annotations=1)
+
+
+def annotation_deleted(sender, instance, **kwargs):
+    UserWorkspaceStats.record(instance.user_id, annotations=-1)
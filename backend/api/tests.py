@@ -1,3 +1,1580 @@
-from django.test import TestCase
+import asyncio
+import copy
+import gzip
+import json
+import os
+import random
+import tempfile
+import time
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+from channels.db import database_sync_to_async
+from channels.layers import channel_layers, get_channel_layer
+from channels.routing import URLRouter
+from channels.testing import WebsocketCommunicator
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser, User
+from django.core.cache import cache, caches
+from django.core.exceptions import ImproperlyConfigured
+from django.db import IntegrityError, OperationalError, connection, transaction
+from django.db.migrations.executor import MigrationExecutor
+from django.db.models import Q
+from django.db.models.query import QuerySet
+from django.test import RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from . import async_views, checks, chunking, collab, fields, jobs, readcache, throttling
+from .jobs import claim, run_job
+from .jsonpatch import apply_patch, make_patch
+from .lexical import EXCERPT_LENGTH
+from .models import Annotation, Job, Project, ProjectChunk, Text, UserWorkspaceStats
+from .pagination import ProjectCursorPagination
+from .revisions import reconstruct_content, record_revision
+from .routing import websocket_urlpatterns
+from .serializers import MyTokenObtainPairSerializer, ProjectSerializer
+from .views import save_project_update
+
+
+def _document(*blocks):
+    return {'root': {'type': 'root', 'children': [{'type': 'paragraph', 'text': block} for block in blocks]}}
+
+
+class MakePatchTests(SimpleTestCase):
+    def assertRoundTrip(self, previous, current):
+        patch = make_patch(previous, current)
+        self.assertEqual(apply_patch(copy.deepcopy(previous), patch), current)
+        return patch
+
+    def test_insert_in_middle_is_a_single_add(self):
+        previous = _document(*'abcdefgh')
+        current = _document(*'abcXdefgh')
+        patch = self.assertRoundTrip(previous, current)
+        self.assertEqual(patch, [{'op': 'add', 'path': '/root/children/3', 'value': current['root']['children'][3]}])
+
+    def test_remove_in_middle_is_a_single_remove(self):
+        patch = self.assertRoundTrip(_document(*'abcdefgh'), _document(*'abcefgh'))
+        self.assertEqual(patch, [{'op': 'remove', 'path': '/root/children/3'}])
+
+    def test_split_block(self):
+        patch = self.assertRoundTrip(_document('a', 'bc', 'd', 'e'), _document('a', 'b', 'c', 'd', 'e'))
+        self.assertEqual([operation['op'] for operation in patch], ['replace', 'add'])
+
+    def test_unchanged_document(self):
+        self.assertEqual(self.assertRoundTrip(_document('a', 'b'), _document('a', 'b')), [])
+
+    def test_repeated_blocks(self):
+        self.assertRoundTrip(_document(*'aaaa'), _document(*'aaaaaa'))
+        self.assertRoundTrip(_document(*'abab'), _document(*'ab'))
+        self.assertRoundTrip(_document(), _document(*'abc'))
+        self.assertRoundTrip(_document(*'abc'), _document())
+
+    def test_root_attributes_replace_root(self):
+        current = _document('a')
+        current['root']['direction'] = 'rtl'
+        self.assertEqual(self.assertRoundTrip(_document('a'), current)[0]['path'], '/root')
+
+
+@override_settings(THROTTLE_BUCKETS={})
+class PatchContentTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('auteur', 'auteur@example.com', 'secret-123')
+        self.project = Project.objects.create(
+            user=self.user, title='Projet', description='', editor_content=json.dumps(_document('a', 'b')),
+        )
+        record_revision(self.project, None, user=self.user)
+        self.url = f'/api/projects/{self.project.pk}/content/'
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def send(self, base_revision, patch, **headers):
+        return self.client.patch(
+            self.url, {'base_revision': base_revision, 'patch': patch}, format='json', headers=headers,
+        )
+
+    def test_patch_is_applied_on_the_base_revision(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.send(0, [
+                {'op': 'add', 'path': '/root/children/1', 'value': {'type': 'paragraph', 'text': 'x'}},
+            ])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['revision'], 1)
+        self.assertEqual(response['ETag'], Project.objects.get(pk=self.project.pk).etag)
+
+        project = Project.objects.get(pk=self.project.pk)
+        self.assertEqual(json.loads(project.editor_content), _document('a', 'x', 'b'))
+        # Le patch reçu est enregistré tel quel comme delta de la révision
+        revision = project.revisions.get(revision=1)
+        self.assertFalse(revision.is_keyframe)
+        self.assertEqual(json.loads(reconstruct_content(project, 1)), _document('a', 'x', 'b'))
+
+    def test_stale_base_revision_is_a_conflict(self):
+        self.send(0, [{'op': 'remove', 'path': '/root/children/0'}])
+        response = self.send(0, [{'op': 'remove', 'path': '/root/children/1'}])
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.json()['revision'], 1)
+        self.assertEqual(json.loads(Project.objects.get(pk=self.project.pk).editor_content), _document('b'))
+
+    def test_malformed_patch_is_refused_without_saving(self):
+        for patch in (
+            [{'op': 'remove', 'path': '/root/children/5'}],
+            [{'op': 'replace', 'path': 'root'}],
+            [{'op': 'copy', 'path': '/root/children/0'}],
+            [{'op': 'test', 'path': '/root/children/0/text', 'value': 'z'}],
+            'remove',
+        ):
+            response = self.send(0, patch)
+            self.assertEqual(response.status_code, 400, patch)
+        self.assertEqual(self.client.patch(self.url, {'patch': []}, format='json').status_code, 400)
+
+        project = Project.objects.get(pk=self.project.pk)
+        self.assertEqual(project.revision, 0)
+        self.assertEqual(json.loads(project.editor_content), _document('a', 'b'))
+
+    def test_if_match_precondition(self):
+        response = self.send(0, [{'op': 'remove', 'path': '/root/children/0'}], **{'If-Match': '"ancienne"'})
+        self.assertEqual(response.status_code, 412)
+        response = self.send(0, [{'op': 'remove', 'path': '/root/children/0'}], **{'If-Match': self.project.etag})
+        self.assertEqual(response.status_code, 200)
+
+
+class ProjectRevisionTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('auteur', 'auteur@example.com', 'secret-123')
+        self.project = Project.objects.create(
+            user=self.user, title='Projet', description='', editor_content=json.dumps(_document('a', 'b', 'c')),
+        )
+        record_revision(self.project, None, user=self.user)
+
+    def test_concurrent_saves_keep_the_revision_chain(self):
+        # Deux requêtes ont lu le projet avant que l'une d'elles ne sauvegarde
+        first = ProjectSerializer(Project.objects.get(pk=self.project.pk), partial=True, data={
+            'editor_content': json.dumps(_document('a', 'B', 'c')),
+        })
+        second = ProjectSerializer(Project.objects.get(pk=self.project.pk), partial=True, data={
+            'editor_content': json.dumps(_document('a', 'b', 'c', 'd')),
+        })
+        self.assertTrue(first.is_valid() and second.is_valid())
+        save_project_update(first, self.user)
+        project = save_project_update(second, self.user)
+
+        self.assertEqual(project.revision, 2)
+        self.assertEqual(json.loads(reconstruct_content(project, 1)), _document('a', 'B', 'c'))
+        self.assertEqual(json.loads(reconstruct_content(project, 2)), _document('a', 'b', 'c', 'd'))
+
+    @override_settings(PROJECT_REVISION_KEYFRAME_INTERVAL=3)
+    def test_keyframe_interval(self):
+        project = self.project
+        for letter in 'defgh':
+            previous = project.editor_content
+            project.editor_content = json.dumps(json.loads(previous) | _document('a', letter))
+            project.revision += 1
+            project.save()
+            record_revision(project, previous, user=self.user)
+        keyframes = list(project.revisions.filter(is_keyframe=True).values_list('revision', flat=True))
+        self.assertEqual(keyframes, [0, 3])
+        self.assertEqual(json.loads(reconstruct_content(project, 5)), _document('a', 'h'))
+
+
+class ProjectListTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('auteur', 'auteur@example.com', 'secret-123')
+        start = timezone.now()
+        long_paragraph = '  '.join(f'mot{number}' for number in range(100))
+        self.projects = [
+            Project.objects.create(
+                user=self.user, title=f'Projet {number}', description='', created_at=start + timedelta(minutes=number),
+                editor_content=_lexical('Titre', long_paragraph),
+            )
+            for number in range(5)
+        ]
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def pages(self, url, **params):
+        pages = []
+        while url:
+            response = self.client.get(url, params)
+            self.assertEqual(response.status_code, 200)
+            pages.append([project['id'] for project in response.json()['results']])
+            url, params = response.json()['next'], {}
+        return pages
+
+    def test_cursor_pages_follow_creation_order(self):
+        expected = [project.pk for project in reversed(self.projects)]
+        self.assertEqual(self.pages('/api/projects/', page_size=2), [expected[:2], expected[2:4], expected[4:]])
+        self.assertEqual(self.pages(f'/api/projects/user/{self.user.pk}/'), [expected])
+        with mock.patch.object(ProjectCursorPagination, 'max_page_size', 3):
+            self.assertEqual(self.pages('/api/projects/', page_size=50)[0], expected[:3])
+
+    def test_summary_replaces_the_content(self):
+        project = self.client.get('/api/projects/').json()['results'][0]
+        self.assertEqual(set(project), {
+            'id', 'user', 'title', 'description', 'chunked', 'revision', 'content_size', 'word_count', 'excerpt',
+            'created_at', 'updated_at',
+        })
+        content = self.projects[-1].editor_content
+        self.assertEqual(project['content_size'], len(content.encode('utf-8')))
+        self.assertEqual(project['word_count'], 101)
+        # Extrait tronqué, espaces normalisés
+        self.assertEqual(len(project['excerpt']), EXCERPT_LENGTH)
+        self.assertTrue(project['excerpt'].startswith('Titre mot0 mot1 mot2'))
+        self.assertIn('editor_content', self.client.get(f'/api/projects/{project["id"]}/').json())
+
+    def test_lists_do_not_read_the_content_column(self):
+        for client, url in ((self.client, '/api/projects/'), (APIClient(), f'/api/projects/user/{self.user.pk}/')):
+            with self.subTest(url=url), CaptureQueriesContext(connection) as queries:
+                self.assertEqual(client.get(url).status_code, 200)
+            selects = [query['sql'] for query in queries if 'api_project' in query['sql']]
+            self.assertTrue(selects)
+            self.assertFalse([sql for sql in selects if 'editor_content' in sql])
+
+
+def _commented(*paragraphs):
+    """Document Lexical ; un paragraphe (texte, uuid, sélection, remarque) contient un nœud de commentaire."""
+    children = []
+    for paragraph in paragraphs:
+        if isinstance(paragraph, str):
+            children.append({'type': 'paragraph', 'children': [{'type': 'text', 'text': paragraph}]})
+            continue
+        before, uuid, selected, remark = paragraph
+        children.append({'type': 'paragraph', 'children': [
+            {'type': 'text', 'text': before},
+            {'type': 'comment', 'uuid': uuid, 'comments': [{'content': remark}],
+             'children': [{'type': 'text', 'text': selected}]},
+        ]})
+    return json.dumps({'root': {'type': 'root', 'children': children}})
+
+
+class CommentIndexTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('auteur', 'auteur@example.com', 'secret-123')
+        self.project = Project.objects.create(
+            user=self.user, title='Projet', description='', editor_content=_commented(
+                'Titre', ('Il était ', 'a', 'une fois', 'Cliché'), ('Au bord de la ', 'b', 'mer', 'Lieu'),
+            ),
+        )
+
+    def indexed(self):
+        return {
+            annotation.node_uuid: annotation
+            for annotation in Annotation.objects.filter(project=self.project, node_uuid__isnull=False)
+        }
+
+    def save(self, *paragraphs):
+        self.project.editor_content = _commented(*paragraphs)
+        self.project.save()
+
+    def test_comment_nodes_are_indexed_on_save(self):
+        indexed = self.indexed()
+        self.assertEqual(set(indexed), {'a', 'b'})
+        text = 'Titre\nIl était une fois\nAu bord de la mer'
+        for uuid, selected, remark in (('a', 'une fois', 'Cliché'), ('b', 'mer', 'Lieu')):
+            annotation = indexed[uuid]
+            self.assertEqual(text[annotation.start_index:annotation.end_index], selected)
+            self.assertEqual((annotation.selected_text, annotation.description), (selected, remark))
+            self.assertEqual(annotation.comments, [{'content': remark}])
+            self.assertEqual(annotation.user, self.user)
+
+        client = APIClient()
+        client.force_authenticate(self.user)
+        response = client.get(f'/api/projects/{self.project.pk}/annotations/')
+        self.assertEqual([annotation['selected_text'] for annotation in response.json()], ['une fois', 'mer'])
+
+    def test_only_changed_comments_are_written(self):
+        before = self.indexed()
+        # Marque posée à la main : elle ne survit que si la ligne n'est pas réécrite
+        Annotation.objects.filter(pk=before['a'].pk).update(title='Marque')
+        manual = Annotation.objects.create(
+            user=self.user, project=self.project, title='Note', description='', start_index=0, end_index=5,
+        )
+        self.save(
+            'Titre', ('Il était ', 'a', 'une fois', 'Cliché'), ('Au bord du ', 'b', 'lac', 'Lieu'),
+            ('Puis ', 'c', 'la nuit', 'Fin'),
+        )
+        after = self.indexed()
+        self.assertEqual(set(after), {'a', 'b', 'c'})
+        self.assertEqual((after['a'].id, after['a'].title), (before['a'].id, 'Marque'))
+        # Le commentaire modifié garde sa ligne, mise à jour
+        self.assertEqual(after['b'].id, before['b'].id)
+        self.assertEqual(after['b'].selected_text, 'lac')
+        self.assertEqual(after['b'].start_index, len('Titre\nIl était une fois\nAu bord du '))
+        self.assertEqual(after['c'].description, 'Fin')
+
+        self.save('Titre', ('Puis ', 'c', 'la nuit', 'Fin'))
+        self.assertEqual(set(self.indexed()), {'c'})
+        self.assertTrue(Annotation.objects.filter(pk=manual.pk).exists())
+
+    def test_unchanged_comments_write_nothing(self):
+        self.project.title = 'Nouveau titre'
+        with CaptureQueriesContext(connection) as queries:
+            self.project.save()
+        self.assertFalse([
+            query['sql'] for query in queries
+            if 'api_annotation' in query['sql'] and query['sql'].startswith(('INSERT', 'UPDATE', 'DELETE'))
+        ])
+        self.assertEqual(set(self.indexed()), {'a', 'b'})
+
+
+@override_settings(THROTTLE_BUCKETS={})
+class BulkAnnotationTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('auteur', 'auteur@example.com', 'secret-123')
+        self.other = User.objects.create_user('autre', 'autre@example.com', 'secret-123')
+        self.project = Project.objects.create(user=self.user, title='Projet', description='')
+        self.foreign = Project.objects.create(user=self.other, title='Autre', description='')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def item(self, selected_text='une fois', **fields):
+        return {
+            'title': 'Note', 'description': 'Remarque', 'selectedText': selected_text, 'start_index': 0,
+            'end_index': len(selected_text), **fields,
+        }
+
+    def test_invalid_items_are_reported_by_index(self):
+        response = self.client.post('/api/texts/add-annotations/', [
+            self.item(project=self.project.pk),
+            self.item(end_index=-1),
+            self.item(project=self.foreign.pk),
+            {'title': 'Note'},
+            self.item('il était'),
+        ], format='json')
+        self.assertEqual(response.status_code, 201)
+        body = response.json()
+        self.assertEqual(body['created'], 2)
+        self.assertEqual([result['index'] for result in body['results']], [0, 4])
+        self.assertEqual([error['index'] for error in body['errors']], [1, 2, 3])
+        self.assertIn('end_index', body['errors'][0]['errors'])
+        self.assertEqual(body['errors'][1]['errors'], {'project': ['Projet introuvable.']})
+        self.assertFalse(Annotation.objects.filter(project=self.foreign).exists())
+
+    def test_batch_without_valid_item_is_refused(self):
+        response = self.client.post(
+            '/api/texts/add-annotations/', [self.item(project=self.foreign.pk)], format='json',
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['created'], 0)
+        self.assertFalse(Annotation.objects.exists())
+
+    def test_identical_selections_share_a_text(self):
+        response = self.client.post('/api/texts/add-annotations/', [
+            self.item(), self.item(project=self.project.pk), self.item('autre chose'),
+        ], format='json')
+        text_ids = [result['textId'] for result in response.json()['results']]
+        self.assertEqual(text_ids[0], text_ids[1])
+        self.assertNotEqual(text_ids[0], text_ids[2])
+        self.assertEqual(Text.objects.count(), 2)
+
+    def test_single_and_bulk_paths_give_the_same_owner(self):
+        self.assertEqual(self.client.post('/api/texts/add-annotation/', self.item(), format='json').status_code, 201)
+        self.client.post('/api/texts/add-annotations/', [self.item('il était')], format='json')
+        self.assertEqual(
+            list(Annotation.objects.order_by('id').values_list('user', flat=True)), [self.user.pk, self.user.pk],
+        )
+        listed = self.client.get('/api/annotations/').json()['results']
+        self.assertEqual(len(listed), 2)
+
+
+class TextAnnotationsTests(TestCase):
+    def setUp(self):
+        self.owner = User.objects.create_user('auteur', 'auteur@example.com', 'secret-123')
+        self.other = User.objects.create_user('autre', 'autre@example.com', 'secret-123')
+        self.project = Project.objects.create(user=self.owner, title='Projet', description='')
+        self.text = Text.objects.create(content='un texte partagé')
+        for user, project, start in ((self.owner, self.project, 0), (self.owner, None, 10), (self.other, None, 20)):
+            Annotation.objects.create(
+                user=user, project=project, text=self.text, title='Note', description='',
+                start_index=start, end_index=start + 5,
+            )
+        self.url = f'/api/texts/{self.text.pk}/annotations/'
+        self.client = APIClient()
+
+    def test_anonymous_request_is_refused(self):
+        self.assertEqual(self.client.get(self.url).status_code, 401)
+
+    def test_only_own_annotations_are_listed(self):
+        self.client.force_authenticate(self.owner)
+        response = self.client.get(self.url)
+        self.assertEqual([annotation['start_index'] for annotation in response.json()], [0, 10])
+        self.client.force_authenticate(self.other)
+        self.assertEqual([annotation['start_index'] for annotation in self.client.get(self.url).json()], [20])
+
+    def test_range_filter(self):
+        self.client.force_authenticate(self.owner)
+        response = self.client.get(self.url, {'covers': 12})
+        self.assertEqual([annotation['start_index'] for annotation in response.json()], [10])
+
+    def test_overlap_and_containment_filters(self):
+        self.client.force_authenticate(self.owner)
+        # [0, 5) et [10, 15) : un intervalle qui touche une borne de fin ne la chevauche pas
+        for params, expected in (
+            ({'overlaps': '5,10'}, []),
+            ({'overlaps': '4,11'}, [0, 10]),
+            ({'within': '0,5'}, [0]),
+            ({'within': '1,15'}, [10]),
+            ({'covers': 5}, []),
+        ):
+            response = self.client.get(self.url, params)
+            self.assertEqual([annotation['start_index'] for annotation in response.json()], expected, params)
+
+    def test_invalid_range_is_refused(self):
+        self.client.force_authenticate(self.owner)
+        for params in ({'covers': 'a'}, {'overlaps': '3'}, {'within': '9,2'}):
+            self.assertEqual(self.client.get(self.url, params).status_code, 400, params)
+
+    def test_indexed_and_column_filters_agree(self):
+        rng = random.Random(0)
+        Annotation.objects.bulk_create([
+            Annotation(
+                user=self.owner, text=self.text, title='Note', description='', start_index=start,
+                end_index=start + rng.randint(0, 30),
+            )
+            for start in (rng.randrange(200) for _ in range(300))
+        ])
+        annotations = Annotation.objects.filter(text=self.text)
+        for _ in range(50):
+            offset, width = rng.randrange(220), rng.randint(0, 40)
+            for indexed, bounds, args in (
+                ('covering', 'covering_bounds', (offset,)),
+                ('overlapping', 'overlapping_bounds', (offset, offset + width)),
+                ('within', 'within_bounds', (offset, offset + width)),
+            ):
+                self.assertEqual(
+                    set(getattr(annotations, indexed)(*args).values_list('id', flat=True)),
+                    set(getattr(annotations, bounds)(*args).values_list('id', flat=True)),
+                    (indexed, args),
+                )
+
+
+class AnnotationListTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('auteur', 'auteur@example.com', 'secret-123')
+        other = User.objects.create_user('autre', 'autre@example.com', 'secret-123')
+        project = Project.objects.create(user=self.user, title='Projet', description='')
+        text = Text.objects.create(content='un texte')
+        Annotation.objects.bulk_create([
+            Annotation(
+                user=self.user, project=project if index % 2 else None, text=text, title=f'Note {index}',
+                description='', start_index=index, end_index=index + 1,
+            )
+            for index in range(25)
+        ] + [Annotation(user=other, text=text, title='Autre', description='', start_index=0, end_index=1)])
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_query_count_does_not_grow_with_pages(self):
+        url = '/api/annotations/?page_size=10'
+        seen = []
+        while url:
+            with self.assertNumQueries(1):
+                response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            seen.extend(annotation['id'] for annotation in response.json()['results'])
+            url = response.json()['next']
+        self.assertEqual(len(seen), 25)
+        self.assertEqual(set(seen), set(Annotation.objects.filter(user=self.user).values_list('id', flat=True)))
+
+
+class SearchTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('auteur', 'auteur@example.com', 'secret-123')
+        self.project = Project.objects.create(
+            user=self.user, title='Projet', description='Une histoire de phare', editor_content='',
+        )
+        Annotation.objects.create(
+            user=self.user, project=self.project, text=Text.objects.create(content='le phare'), title='Note',
+            description='Lumière du phare', selected_text='phare', start_index=3, end_index=8,
+        )
+        Annotation.objects.update_search_vectors()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_projects_and_annotations_are_found(self):
+        response = self.client.get('/api/search/', {'q': 'phare'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([project['id'] for project in response.json()['projects']], [self.project.pk])
+        self.assertEqual(len(response.json()['annotations']), 1)
+
+
+class CompressedTextTests(SimpleTestCase):
+    def test_header_carries_the_format_version(self):
+        text = _lexical(*['Il était une fois.'] * 200)
+        stored = fields.CompressedText.encode(text)
+        self.assertEqual(stored.data[:4], fields.MAGIC + bytes([fields.GZIP]))
+        self.assertTrue(stored.is_gzip)
+        self.assertLess(len(stored.data), len(text) // 5)
+        # Conteneur gzip standard : servi tel quel avec Content-Encoding: gzip
+        self.assertEqual(gzip.decompress(stored.payload).decode('utf-8'), text)
+
+        # Un texte que la compression n'allège pas est gardé tel quel derrière l'en-tête
+        stored = fields.CompressedText.encode('é')
+        self.assertEqual(stored.data, fields.MAGIC + bytes([fields.RAW]) + 'é'.encode('utf-8'))
+        self.assertFalse(stored.is_gzip)
+        self.assertEqual(fields.CompressedText.envelope('{}').version, fields.CHUNKED)
+
+    def test_values_written_before_compression_are_read_as_text(self):
+        for text in ('{"root": {}}', 'é', 'SCZ', ''):
+            with self.subTest(text=text):
+                stored = fields.CompressedText(text.encode('utf-8'))
+                self.assertIsNone(stored.version)
+                self.assertEqual(stored.decode(), text)
+
+    def test_round_trip(self):
+        rng = random.Random(0)
+        alphabet = 'aé€😀 {}"\\\n'
+        for length in (0, 1, 10, 1000, 100000):
+            text = ''.join(rng.choice(alphabet) for _ in range(length))
+            with self.subTest(length=length):
+                self.assertEqual(fields.CompressedText.encode(text).decode(), text)
+                self.assertEqual(fields.stored_text(text).decode(), text)
+
+
+class CompressedContentTests(TestCase):
+    def test_project_content_is_stored_compressed_and_read_lazily(self):
+        user = User.objects.create_user('auteur', 'auteur@example.com', 'secret-123')
+        content = _lexical(*['Il était une fois.'] * 200)
+        project = Project.objects.create(user=user, title='Projet', description='', editor_content=content)
+        stored = Project.objects.filter(pk=project.pk).values_list('editor_content', flat=True).get()
+        self.assertTrue(stored.is_gzip)
+        self.assertEqual(stored.decode(), content)
+
+        project = Project.objects.get(pk=project.pk)
+        self.assertIsInstance(project.__dict__['editor_content'], fields.CompressedText)
+        self.assertEqual(project.editor_content, content)
+        self.assertEqual(project.__dict__['editor_content'], content)
+
+
+class CompressContentMigrationTests(TransactionTestCase):
+    before = [('api', '0014_project_content_hash')]
+    after = [('api', '0015_compress_editor_content')]
+
+    def migrate(self, targets):
+        executor = MigrationExecutor(connection)
+        executor.loader.build_graph()
+        executor.migrate(targets)
+        return executor.loader.project_state(targets).apps
+
+    def tearDown(self):
+        self.migrate(MigrationExecutor(connection).loader.graph.leaf_nodes())
+
+    def test_existing_text_rows_are_compressed_in_batches(self):
+        apps = self.migrate(self.before)
+        user = apps.get_model('auth', 'User').objects.create(username='auteur')
+        Project = apps.get_model('api', 'Project')
+        contents = [_lexical(f'Paragraphe {number}', 'Il était une fois.' * number) for number in range(250)]
+        contents += ['', None]
+        ids = [
+            Project.objects.create(user=user, title='Projet', description='', editor_content=content).pk
+            for content in contents
+        ]
+
+        apps = self.migrate(self.after)
+        stored = dict(apps.get_model('api', 'Project').objects.values_list('id', 'editor_content'))
+        for pk, content in zip(ids, contents):
+            if content is None:
+                self.assertIsNone(stored[pk])
+                continue
+            self.assertEqual(stored[pk].data, fields.CompressedText.encode(content).data)
+            self.assertEqual(stored[pk].decode(), content)
+
+        # Retour arrière : le texte est rétabli en clair
+        apps = self.migrate(self.before)
+        restored = dict(apps.get_model('api', 'Project').objects.values_list('id', 'editor_content'))
+        self.assertEqual([restored[pk] for pk in ids], contents)
+
+
+def _lexical(*paragraphs):
+    return json.dumps({'root': {'type': 'root', 'children': [
+        {'type': 'paragraph', 'children': [{'type': 'text', 'text': paragraph}]} for paragraph in paragraphs
+    ]}})
+
+
+class AnnotationCreateTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('auteur', 'auteur@example.com', 'secret-123')
+        self.project = Project.objects.create(
+            user=self.user, title='Projet', description='', editor_content=_lexical('Titre', 'Il était une fois.'),
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_annotation_follows_rewritten_paragraph(self):
+        start = len('Titre\n') + len('Il était ')
+        response = self.client.post('/api/texts/add-annotation/', {
+            'title': 'Note', 'description': 'Remarque', 'selectedText': 'une fois', 'start_index': start,
+            'end_index': start + len('une fois'), 'project': self.project.pk,
+        }, format='json')
+        self.assertEqual(response.status_code, 201)
+        annotation = Annotation.objects.get(project=self.project)
+        self.assertEqual(annotation.selected_text, 'une fois')
+
+        # Le paragraphe entier est réécrit : l'annotation est réancrée sur son texte sélectionné
+        self.project.editor_content = _lexical('Titre', 'Autrefois, il y avait une fois encore')
+        self.project.save()
+        annotation.refresh_from_db()
+        self.assertFalse(annotation.detached)
+        text = 'Titre\nAutrefois, il y avait une fois encore'
+        self.assertEqual(text[annotation.start_index:annotation.end_index], 'une fois')
+
+    def test_rest_save_leaves_remapping_to_the_reindex_job(self):
+        record_revision(self.project, None, user=self.user)
+        start = len('Titre\n') + len('Il était ')
+        annotation = Annotation.objects.create(
+            user=self.user, project=self.project, text=Text.objects.create(content='une fois'), title='Note',
+            description='', selected_text='une fois', start_index=start, end_index=start + len('une fois'),
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.patch(f'/api/projects/{self.project.pk}/', {
+                'editor_content': _lexical('Titre', 'Autrefois, il y avait une fois encore'),
+            }, format='json')
+        self.assertEqual(response.status_code, 200)
+        annotation.refresh_from_db()
+        self.assertEqual(annotation.start_index, start)
+
+        jobs = claim('test', limit=10)
+        self.assertEqual([job.kind for job in jobs], ['project.reindex'])
+        for job in jobs:
+            self.assertTrue(run_job(job))
+        annotation.refresh_from_db()
+        text = 'Titre\nAutrefois, il y avait une fois encore'
+        self.assertEqual(text[annotation.start_index:annotation.end_index], 'une fois')
+        project = Project.objects.get(pk=self.project.pk)
+        self.assertEqual(project.word_count, len(text.split()))
+        self.assertEqual(project.derived.anchor_revision, project.revision)
+
+    def test_sync_and_async_views_share_validation(self):
+        invalid = {'title': 'Note', 'description': 'Remarque', 'selectedText': 'une', 'start_index': 9, 'end_index': 2}
+        valid = dict(invalid, end_index=12)
+        client = APIClient()
+        for payload, status_code in ((invalid, 400), (valid, 201), (dict(valid, project=self.project.pk), 401)):
+            request = RequestFactory().post('/api/texts/add-annotation/', payload, content_type='application/json')
+            response = async_to_sync(async_views.add_annotation)(request)
+            expected = client.post('/api/texts/add-annotation/', payload, format='json')
+            self.assertEqual(response.status_code, status_code)
+            self.assertEqual(expected.status_code, status_code)
+            self.assertEqual(json.loads(response.content).keys(), expected.json().keys())
+        self.assertEqual(Annotation.objects.filter(selected_text='une', user=None).count(), 2)
+
+
+@override_settings(JOB_RETRY_BASE=5, JOB_RETRY_MAX=12, JOB_LOCK_TIMEOUT=600, THROTTLE_BUCKETS={})
+class JobQueueTests(TestCase):
+    def setUp(self):
+        self.now = timezone.now()
+        patcher = mock.patch('api.jobs.timezone.now', lambda: self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.calls = 0
+        patcher = mock.patch.dict(jobs.HANDLERS, {'test.flaky': self.flaky})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        # Les échecs voulus ne sont pas journalisés pendant les tests
+        patcher = mock.patch.object(jobs.logger, 'warning')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.failures = 0
+
+    def flaky(self, job):
+        self.calls += 1
+        if self.calls <= self.failures:
+            raise RuntimeError('panne')
+        return {'calls': self.calls}
+
+    def test_retry_delay_doubles_up_to_the_cap(self):
+        with override_settings(JOB_RETRY_MAX=600):
+            self.assertEqual([jobs.retry_delay(attempt) for attempt in range(1, 9)], [5, 10, 20, 40, 80, 160, 320, 600])
+
+    def test_failures_are_retried_with_backoff_then_failed(self):
+        self.failures = 10
+        job = jobs.enqueue('test.flaky', max_attempts=4)
+        delays = []
+        for _ in range(4):
+            claimed = claim('test')
+            self.assertEqual([entry.pk for entry in claimed], [job.pk])
+            self.assertFalse(run_job(claimed[0]))
+            job.refresh_from_db()
+            if job.status == Job.QUEUED:
+                delays.append((job.run_at - self.now).total_seconds())
+                # Pas de nouvelle tentative avant l'échéance
+                self.assertEqual(claim('test'), [])
+                self.now = job.run_at
+        self.assertEqual(delays, [5, 10, 12])
+        self.assertEqual((job.status, job.attempts), (Job.FAILED, 4))
+        self.assertIn('RuntimeError: panne', job.error)
+        self.assertIsNotNone(job.finished_at)
+        self.assertEqual(claim('test'), [])
+
+    def test_success_after_a_retry(self):
+        self.failures = 1
+        job = jobs.enqueue('test.flaky')
+        run_job(claim('test')[0])
+        self.now += timedelta(seconds=5)
+        self.assertTrue(run_job(claim('test')[0]))
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts, job.result, job.error), (Job.SUCCEEDED, 2, {'calls': 2}, ''))
+
+    def test_stale_running_job_is_reclaimed(self):
+        job = jobs.enqueue('test.flaky', max_attempts=2)
+        first = claim('worker-a')[0]
+        self.assertEqual(claim('worker-b'), [])
+        self.now += timedelta(seconds=601)
+        second = claim('worker-b')[0]
+        self.assertEqual((second.pk, second.attempts, second.locked_by), (job.pk, 2, 'worker-b'))
+        # Le worker dépossédé ne peut plus enregistrer de résultat
+        run_job(first)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.locked_by), (Job.RUNNING, 'worker-b'))
+        self.assertTrue(run_job(second))
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.SUCCEEDED)
+
+    def test_stale_job_beyond_its_attempts_is_abandoned(self):
+        job = jobs.enqueue('test.flaky', max_attempts=1)
+        claim('worker-a')
+        self.now += timedelta(seconds=601)
+        self.assertFalse(run_job(claim('worker-b')[0]))
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.FAILED)
+        self.assertEqual(self.calls, 0)
+
+    def test_enqueue_once_keeps_a_single_queued_job(self):
+        job = jobs.enqueue_once('test.flaky', {'project': 1})
+        self.assertEqual(jobs.enqueue_once('test.flaky', {'project': 1}).pk, job.pk)
+        self.assertNotEqual(jobs.enqueue_once('test.flaky', {'project': 2}).pk, job.pk)
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Job.objects.create(kind='test.flaky', payload={'project': 1})
+        # Une tâche déjà prise n'empêche pas d'en remettre une en file
+        claim('test', limit=10)
+        self.assertNotEqual(jobs.enqueue_once('test.flaky', {'project': 1}).pk, job.pk)
+
+    def test_concurrent_enqueue_once_returns_the_winner(self):
+        winner = jobs.enqueue('test.flaky', {'project': 1})
+        # La première lecture ne voit pas la tâche, comme si un autre processus l'insérait juste après
+        first = QuerySet.first
+        misses = [None]
+        with mock.patch.object(QuerySet, 'first', lambda queryset: misses.pop() if misses else first(queryset)):
+            job = jobs.enqueue_once('test.flaky', {'project': 1})
+        self.assertEqual(job.pk, winner.pk)
+        self.assertEqual(Job.objects.filter(kind='test.flaky').count(), 1)
+
+    def test_retry_is_dropped_when_an_identical_job_is_queued(self):
+        self.failures = 1
+        jobs.enqueue_once('test.flaky', {'project': 1})
+        running = claim('test')[0]
+        queued = jobs.enqueue_once('test.flaky', {'project': 1})
+        self.assertFalse(run_job(running))
+        running.refresh_from_db()
+        self.assertEqual(running.status, Job.FAILED)
+        self.assertEqual(Job.objects.get(status=Job.QUEUED).pk, queued.pk)
+
+    def test_reindex_requests_are_deduplicated_per_user(self):
+        users = [User.objects.create_user(name, f'{name}@example.com', 'secret-123') for name in ('auteur', 'lecteur')]
+        clients = [APIClient() for _ in users]
+        for client, user in zip(clients, users):
+            client.force_authenticate(user)
+        first = clients[0].post('/api/projects/reindex/')
+        self.assertEqual(first.status_code, 202)
+        self.assertEqual(clients[0].post('/api/projects/reindex/').json()['id'], first.json()['id'])
+        self.assertNotEqual(clients[1].post('/api/projects/reindex/').json()['id'], first.json()['id'])
+
+
+@override_settings(THROTTLE_BUCKETS={}, PROJECT_CHUNKS_FIRST=1)
+class ChunkedStorageTests(TestCase):
+    def setUp(self):
+        # Un morceau par bloc : frontière après chaque bloc dès le premier octet
+        patcher = mock.patch.multiple(chunking, CHUNK_MIN_BYTES=1, CHUNK_BOUNDARY=1)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.user = User.objects.create_user('auteur', 'auteur@example.com', 'secret-123')
+        self.project = Project.objects.create(
+            user=self.user, title='Projet', description='', chunked=True,
+            editor_content=_lexical('un', 'deux', 'trois', 'quatre'),
+        )
+        record_revision(self.project, None, user=self.user)
+        self.url = f'/api/projects/{self.project.pk}/chunks/'
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def texts(self, blocks):
+        return [block['children'][0]['text'] for block in blocks]
+
+    def test_manifest_and_first_chunks(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Accept-Ranges'], 'chunks')
+        body = response.json()
+        self.assertEqual([entry['start_block'] for entry in body['manifest']], [0, 1, 2, 3])
+        self.assertEqual([chunk['index'] for chunk in body['chunks']], [0])
+        self.assertEqual(body['envelope']['root']['children'], [])
+        response = self.client.get(self.url, {'first': 3})
+        self.assertEqual(len(response.json()['chunks']), 3)
+
+    def test_range_request_streams_ndjson(self):
+        response = self.client.get(self.url, headers={'Range': 'chunks=1-2'})
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        self.assertEqual(response['Content-Range'], 'chunks 1-2/4')
+        lines = [json.loads(line) for line in b''.join(response.streaming_content).splitlines()]
+        self.assertEqual([line['index'] for line in lines], [1, 2])
+        self.assertEqual([self.texts(line['blocks']) for line in lines], [['deux'], ['trois']])
+
+        response = self.client.get(self.url, headers={'Range': 'chunks=2-'})
+        self.assertEqual(response['Content-Range'], 'chunks 2-3/4')
+
+    def test_invalid_or_unsatisfiable_range(self):
+        for header in ('bytes=0-1', 'chunks=4-', 'chunks=2-1', 'chunks=0-1,3-3', 'chunks=a-'):
+            response = self.client.get(self.url, headers={'Range': header})
+            self.assertEqual(response.status_code, 416, header)
+            self.assertEqual(response['Content-Range'], 'chunks */4')
+
+    def test_unchunked_project_is_a_conflict(self):
+        project = Project.objects.create(user=self.user, title='Bloc', description='', editor_content=_lexical('un'))
+        self.assertEqual(self.client.get(f'/api/projects/{project.pk}/chunks/').status_code, 409)
+
+    def test_put_rewrites_only_the_changed_chunk(self):
+        before = dict(ProjectChunk.objects.filter(project=self.project).values_list('index', 'id'))
+        replacement = json.loads(_lexical('DEUX', 'deux bis'))['root']['children']
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.put(
+                self.url, {'base_revision': 0, 'chunks': [{'index': 1, 'blocks': replacement}]}, format='json',
+            )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['revision'], 1)
+        self.assertEqual([entry['start_block'] for entry in response.json()['manifest']], [0, 1, 2, 3, 4])
+
+        after = dict(ProjectChunk.objects.filter(project=self.project).values_list('index', 'id'))
+        self.assertEqual(after[0], before[0])
+        self.assertNotIn(before[1], after.values())
+        # L'enveloppe reste stockée au format CHUNKED, le contenu complet se reconstitue des morceaux
+        stored = Project.objects.filter(pk=self.project.pk).values_list('editor_content', flat=True).get()
+        self.assertEqual(stored.version, fields.CHUNKED)
+        project = Project.objects.get(pk=self.project.pk)
+        expected = json.loads(_lexical('un', 'DEUX', 'deux bis', 'trois', 'quatre'))
+        self.assertEqual(json.loads(project.editor_content), expected)
+        self.assertEqual(json.loads(reconstruct_content(project, 1)), expected)
+        self.assertEqual(project.content_size, len(project.editor_content.encode('utf-8')))
+
+    def test_put_refuses_stale_revision_and_unknown_chunk(self):
+        blocks = [{'type': 'paragraph', 'children': [{'type': 'text', 'text': 'x'}]}]
+        response = self.client.put(
+            self.url, {'base_revision': 3, 'chunks': [{'index': 0, 'blocks': blocks}]}, format='json',
+        )
+        self.assertEqual(response.status_code, 409)
+        response = self.client.put(
+            self.url, {'base_revision': 0, 'chunks': [{'index': 9, 'blocks': blocks}]}, format='json',
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(Project.objects.get(pk=self.project.pk).revision, 0)
+
+
+WORDS = ['phare', 'marée', 'écume', 'goéland', 'falaise', 'brume']
+
+
+def _commented_lexical(rng, paragraphs):
+    """Document Lexical aléatoire ; certains paragraphes contiennent un nœud de commentaire."""
+    children = []
+    for _ in range(paragraphs):
+        nodes = [{'type': 'text', 'text': ' '.join(rng.choice(WORDS) for _ in range(rng.randint(0, 8)))}]
+        if rng.random() < 0.3:
+            nodes.append({
+                'type': 'comment', 'uuid': f'{rng.getrandbits(32):08x}', 'comments': [{'content': 'Remarque'}],
+                'children': [{'type': 'text', 'text': rng.choice(WORDS)}],
+            })
+        children.append({'type': 'paragraph', 'children': nodes})
+    return json.dumps({'root': {'type': 'root', 'children': children}})
+
+
+@override_settings(THROTTLE_BUCKETS={})
+class WorkspaceStatsTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('auteur', 'auteur@example.com', 'secret-123')
+        UserWorkspaceStats.recount([self.user.pk])
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def annotation(self, project_id):
+        return {
+            'title': 'Note', 'description': 'Remarque', 'selectedText': 'phare', 'start_index': 0, 'end_index': 5,
+            'project': project_id,
+        }
+
+    def run_jobs(self):
+        for job in claim('test', limit=100):
+            run_job(job)
+
+    def test_anonymous_bulk_ingest(self):
+        client = APIClient()
+        response = client.post('/api/texts/add-annotations/', [self.annotation(None)] * 2, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()['created'], 2)
+        self.assertEqual(Annotation.objects.filter(user=None).count(), 2)
+
+    def test_counters_match_a_recount_after_random_workloads(self):
+        for seed in range(3):
+            rng = random.Random(seed)
+            for _ in range(60):
+                projects = list(Project.objects.filter(user=self.user).values_list('id', flat=True))
+                operation = rng.choice(
+                    ['create', 'update', 'update', 'delete', 'annotate', 'bulk', 'unannotate', 'jobs'],
+                )
+                with self.captureOnCommitCallbacks(execute=True):
+                    if operation == 'create' or not projects:
+                        response = self.client.post('/api/projects/', {
+                            'title': 'Projet', 'description': 'Récit', 'editor_content': _commented_lexical(rng, 4),
+                        }, format='json')
+                        self.assertEqual(response.status_code, 201)
+                    elif operation == 'update':
+                        response = self.client.patch(f'/api/projects/{rng.choice(projects)}/', {
+                            'editor_content': _commented_lexical(rng, rng.randint(0, 6)),
+                        }, format='json')
+                        self.assertEqual(response.status_code, 200)
+                    elif operation == 'delete':
+                        self.assertEqual(self.client.delete(f'/api/projects/{rng.choice(projects)}/').status_code, 204)
+                    elif operation == 'annotate':
+                        response = self.client.post(
+                            '/api/texts/add-annotation/', self.annotation(rng.choice(projects)), format='json',
+                        )
+                        self.assertEqual(response.status_code, 201)
+                    elif operation == 'bulk':
+                        items = [self.annotation(rng.choice([None, *projects])) for _ in range(rng.randint(1, 4))]
+                        response = self.client.post('/api/texts/add-annotations/', items, format='json')
+                        self.assertEqual(response.status_code, 201)
+                    elif operation == 'unannotate':
+                        annotation = Annotation.objects.filter(user=self.user, node_uuid__isnull=True).first()
+                        if annotation is not None:
+                            annotation.delete()
+                    else:
+                        self.run_jobs()
+
+            with self.subTest(seed=seed):
+                self.run_jobs()
+                counters = UserWorkspaceStats.objects.get(user=self.user)
+                recounted = UserWorkspaceStats.recount([self.user.pk])[0]
+                for field in UserWorkspaceStats.COUNTER_FIELDS:
+                    self.assertEqual(getattr(counters, field), getattr(recounted, field), field)
+
+
+@override_settings(THROTTLE_BUCKETS={})
+class WorkspaceTransferTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('auteur', 'auteur@example.com', 'secret-123')
+        self.other = User.objects.create_user('lecteur', 'lecteur@example.com', 'secret-123')
+        self.target = User.objects.create_user('copie', 'copie@example.com', 'secret-123')
+        rng = random.Random(0)
+        for title in ('Premier', 'Second'):
+            project = Project.objects.create(
+                user=self.user, title=title, description='Récit', editor_content=_commented_lexical(rng, 5),
+            )
+            Annotation.objects.create(
+                user=self.user, project=project, text=Text.objects.create(content='phare'), title='Note',
+                description='', selected_text='phare', start_index=0, end_index=5,
+            )
+        Annotation.objects.create(
+            user=self.user, text=Text.objects.create(content='brume'), title='Libre', description='',
+            selected_text='brume', start_index=0, end_index=5,
+        )
+        # Données d'un autre utilisateur, absentes de l'export
+        foreign = Project.objects.create(
+            user=self.other, title='Étranger', description='', editor_content=_lexical('ailleurs'),
+        )
+        Annotation.objects.create(
+            user=self.other, project=foreign, text=Text.objects.create(content='ailleurs'), title='Autre',
+            description='', selected_text='ailleurs', start_index=0, end_index=8,
+        )
+
+    def export(self, **params):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        response = client.get('/api/export/', params)
+        self.assertEqual(response.status_code, 200)
+        return b''.join(response.streaming_content)
+
+    def import_(self, body, content_type='application/x-ndjson'):
+        client = APIClient()
+        client.force_authenticate(self.target)
+        return client.post('/api/import/', body, content_type=content_type)
+
+    def workspace(self, user):
+        projects = {
+            project.pk: (project.title, project.description, project.editor_content)
+            for project in Project.objects.filter(user=user)
+        }
+        titles = {pk: project[0] for pk, project in projects.items()}
+        annotations = sorted(
+            (annotation.title, getattr(annotation.text, 'content', None), titles.get(annotation.project_id))
+            for annotation in Annotation.objects.filter(user=user).select_related('text')
+        )
+        return sorted(projects.values()), annotations
+
+    def test_ndjson_round_trip(self):
+        body = self.export()
+        records = [json.loads(line) for line in body.splitlines()]
+        self.assertEqual(records[0]['type'], 'meta')
+        self.assertNotIn('Étranger', [record.get('title') for record in records])
+        self.assertNotIn('Autre', [record.get('title') for record in records])
+
+        response = self.import_(body)
+        self.assertEqual(response.status_code, 201)
+        # Les annotations des nœuds de commentaire sont exportées avec celles créées par l'API
+        annotations = Annotation.objects.filter(user=self.user).count()
+        self.assertEqual(response.json(), {'projects': 2, 'texts': 3, 'annotations': annotations})
+        self.assertEqual(self.workspace(self.target), self.workspace(self.user))
+        # Les identifiants sont renumérotés : les annotations pointent vers les projets importés
+        self.assertFalse(Annotation.objects.filter(user=self.target).exclude(
+            Q(project__isnull=True) | Q(project__user=self.target),
+        ).exists())
+        self.assertEqual(Project.objects.get(user=self.target, title='Premier').revisions.count(), 1)
+
+    def test_zip_round_trip(self):
+        response = self.import_(self.export(type='zip'), content_type='application/zip')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(self.workspace(self.target), self.workspace(self.user))
+
+    def test_malformed_archive_imports_nothing(self):
+        body = self.export()
+        lines = body.splitlines()
+        meta = json.loads(lines[0])
+        annotation = json.dumps({'type': 'annotation', 'id': 1, 'title': 'Note', 'text': 999, 'project': None})
+        cases = [
+            (b'pas une archive', 'application/zip'),
+            (lines[0] + b'\n' + lines[1] + b'\n{"type": "project",', 'application/x-ndjson'),
+            (lines[0] + b'\n' + annotation.encode(), 'application/x-ndjson'),
+            (json.dumps(dict(meta, version=99)).encode() + b'\n' + lines[1], 'application/x-ndjson'),
+            (lines[0] + b'\n{"type": "inconnu"}', 'application/x-ndjson'),
+        ]
+        for content, content_type in cases:
+            with self.subTest(content=content[-40:]):
+                response = self.import_(content, content_type)
+                self.assertEqual(response.status_code, 400)
+                self.assertIn('error', response.json())
+                self.assertFalse(Project.objects.filter(user=self.target).exists())
+                self.assertFalse(Annotation.objects.filter(user=self.target).exists())
+
+    def test_transfer_requires_authentication(self):
+        client = APIClient()
+        self.assertIn(client.get('/api/export/').status_code, (401, 403))
+        response = client.post('/api/import/', self.export(), content_type='application/x-ndjson')
+        self.assertIn(response.status_code, (401, 403))
+        self.assertEqual(Project.objects.count(), 3)
+
+
+# Le cache de lecture n'est actif qu'avec un niveau partagé entre processus : ici des fichiers
+shared_read_cache = override_settings(
+    CACHES={**settings.CACHES, 'readcache': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.path.join(tempfile.gettempdir(), 'scriptalium-tests-readcache'),
+    }},
+    READ_CACHE_SHARED='readcache',
+)
+
+
+@shared_read_cache
+class ConditionalGetTests(TestCase):
+    def setUp(self):
+        caches['readcache'].clear()
+        readcache.get_cache().local.clear()
+        self.user = User.objects.create_user('auteur', 'auteur@example.com', 'secret-123')
+        self.project = Project.objects.create(
+            user=self.user, title='Projet', description='', editor_content=_lexical(*['Un long paragraphe.'] * 200),
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def assertRevalidatedWithoutContent(self, path, queries):
+        etag = self.client.get(path)['ETag']
+        with CaptureQueriesContext(connection) as captured:
+            response = self.client.get(path, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b'')
+        self.assertEqual(len(captured), queries)
+        for query in captured:
+            self.assertNotIn('editor_content', query['sql'])
+
+    @override_settings(READ_CACHE_ENABLED=False)
+    def test_not_modified_reads_only_validators(self):
+        for path in ('', 'content/', 'derived/'):
+            with self.subTest(path=path):
+                self.assertRevalidatedWithoutContent(f'/api/projects/{self.project.pk}/{path}', queries=1)
+
+    def test_not_modified_from_read_cache_reads_no_row(self):
+        self.assertRevalidatedWithoutContent(f'/api/projects/{self.project.pk}/', queries=0)
+
+    @override_settings(READ_CACHE_ENABLED=False)
+    def test_async_not_modified_reads_only_validators(self):
+        token = MyTokenObtainPairSerializer.get_token(self.user).access_token
+        factory = RequestFactory()
+        factory.cookies[settings.SIMPLE_JWT['AUTH_COOKIE']] = str(token)
+        etag = async_to_sync(async_views.project_detail)(factory.get('/'), pk=self.project.pk)['ETag']
+        with CaptureQueriesContext(connection) as captured:
+            response = async_to_sync(async_views.project_detail)(
+                factory.get('/', HTTP_IF_NONE_MATCH=etag), pk=self.project.pk,
+            )
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b'')
+        self.assertEqual([query for query in captured if 'editor_content' in query['sql']], [])
+
+    def test_modified_project_is_sent_again(self):
+        path = f'/api/projects/{self.project.pk}/'
+        etag = self.client.get(path)['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            self.project.editor_content = _lexical('Réécrit')
+            self.project.save()
+        response = self.client.get(path, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['editor_content'], _lexical('Réécrit'))
+
+
+@shared_read_cache
+class ReadCacheTests(TestCase):
+    def setUp(self):
+        caches['readcache'].clear()
+        readcache.get_cache().local.clear()
+        self.user = User.objects.create_user('auteur', 'auteur@example.com', 'secret-123')
+        self.other = User.objects.create_user('autre', 'autre@example.com', 'secret-123')
+        self.project = Project.objects.create(
+            user=self.user, title='Projet', description='', editor_content=_lexical('Premier jet'),
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def save(self, content):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.project.editor_content = content
+            self.project.save()
+
+    def test_save_invalidates_detail_and_list(self):
+        detail = f'/api/projects/{self.project.pk}/'
+        listing = f'/api/projects/user/{self.user.pk}/'
+        self.client.get(detail)
+        self.client.get(listing)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get(detail).json()['editor_content'], _lexical('Premier jet'))
+            self.client.get(listing)
+
+        self.project.title = 'Renommé'
+        self.save(_lexical('Second jet'))
+        self.assertEqual(self.client.get(detail).json()['editor_content'], _lexical('Second jet'))
+        self.assertEqual(self.client.get(listing).json()['results'][0]['title'], 'Renommé')
+
+    def test_cached_detail_is_not_served_to_another_user(self):
+        detail = f'/api/projects/{self.project.pk}/'
+        self.assertEqual(self.client.get(detail).status_code, 200)
+        self.client.force_authenticate(self.other)
+        self.assertEqual(self.client.get(detail).status_code, 404)
+        token = MyTokenObtainPairSerializer.get_token(self.other).access_token
+        factory = RequestFactory()
+        factory.cookies[settings.SIMPLE_JWT['AUTH_COOKIE']] = str(token)
+        response = async_to_sync(async_views.project_detail)(factory.get('/'), pk=self.project.pk)
+        self.assertEqual(response.status_code, 404)
+
+    def test_no_stale_read_in_another_process(self):
+        # Un autre processus : son propre niveau local, le même niveau partagé
+        worker = readcache.ReadCache('readcache')
+        key = readcache.project_key(self.project.pk)
+        self.client.get(f'/api/projects/{self.project.pk}/')
+        self.assertIsNotNone(worker.get('project', key)[1])
+
+        self.save(_lexical('Second jet'))
+        self.assertIsNone(worker.get('project', key)[1])
+        response = self.client.get(f'/api/projects/{self.project.pk}/')
+        self.assertEqual(response.json()['editor_content'], _lexical('Second jet'))
+        self.assertEqual(worker.get('project', key)[1]['data']['editor_content'], _lexical('Second jet'))
+
+    def test_disabled_without_shared_tier(self):
+        self.assertTrue(readcache.enabled())
+        with override_settings(READ_CACHE_SHARED=''):
+            self.assertFalse(readcache.enabled())
+        with override_settings(
+            CACHES={**settings.CACHES, 'local': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}},
+            READ_CACHE_SHARED='local',
+        ):
+            self.assertFalse(readcache.enabled())
+
+    def test_local_tier_is_bounded_by_bytes(self):
+        lru = readcache.LocalLRU(max_bytes=1000, ttl=60)
+        lru.set('a', 'a', 400)
+        lru.set('b', 'b', 400)
+        lru.get('a')
+        lru.set('c', 'c', 400)
+        self.assertEqual((lru.get('a'), lru.get('b'), lru.get('c')), ('a', None, 'c'))
+        self.assertEqual(lru.size, 800)
+        lru.set('d', 'd', 1001)
+        self.assertIsNone(lru.get('d'))
+        self.assertEqual(lru.size, 800)
+
+
+class StatelessAuthenticationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('auteur', 'auteur@example.com', 'secret-123')
+        Project.objects.create(user=self.user, title='Projet', description='', editor_content=_lexical('un'))
+        self.client = APIClient()
+        self.login(MyTokenObtainPairSerializer.get_token(self.user).access_token)
+
+    def login(self, access):
+        self.client.cookies[settings.SIMPLE_JWT['AUTH_COOKIE']] = str(access)
+
+    def user_queries(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/projects/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()['results']), 1)
+        return len(queries), [query['sql'] for query in queries if 'auth_user' in query['sql']]
+
+    def test_request_reads_no_user_row(self):
+        # Le premier appel met en cache le statut actif ; les suivants n'interrogent plus la table
+        self.user_queries()
+        count, user_queries = self.user_queries()
+        self.assertEqual(user_queries, [])
+        with self.assertNumQueries(count):
+            self.client.get('/api/projects/')
+
+        with override_settings(JWT_STATELESS_USER=False):
+            stateful, user_queries = self.user_queries()
+        self.assertEqual(len(user_queries), 1)
+        self.assertEqual(stateful, count + 1)
+
+    def test_token_without_username_is_resolved_from_the_database(self):
+        self.login(RefreshToken.for_user(self.user).access_token)
+        self.user_queries()
+        self.assertEqual(len(self.user_queries()[1]), 1)
+
+    def test_deactivated_or_deleted_user_is_refused(self):
+        self.user_queries()
+        # La sauvegarde invalide le statut mis en cache : le jeton encore valide est refusé aussitôt
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self.client.get('/api/projects/').status_code, 401)
+
+        self.user.is_active = True
+        self.user.save()
+        self.assertEqual(self.client.get('/api/projects/').status_code, 200)
+        self.user.delete()
+        self.assertEqual(self.client.get('/api/projects/').status_code, 401)
+
+
+@override_settings(THROTTLE_BUCKETS={}, JWT_ROTATE_REFRESH=True, JWT_REFRESH_REUSE_GRACE=30)
+class TokenRotationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('auteur', 'auteur@example.com', 'secret-123')
+        self.refresh = MyTokenObtainPairSerializer.get_token(self.user)
+        self.client = APIClient()
+        self.now = time.time()
+
+    def post(self, raw_token, elapsed=0):
+        with mock.patch('api.tokens.time.time', return_value=self.now + elapsed):
+            return self.client.post('/api/auth/token/refresh/', {'refresh': str(raw_token)}, format='json')
+
+    def test_rotated_token_keeps_expiry_and_family(self):
+        response = self.post(self.refresh)
+        self.assertEqual(response.status_code, 200)
+        rotated = RefreshToken(response.json()['refresh'])
+        self.assertEqual(rotated['exp'], self.refresh['exp'])
+        self.assertEqual(rotated['family'], self.refresh['family'])
+        self.assertNotEqual(rotated['jti'], self.refresh['jti'])
+
+    def test_refresh_reads_no_row_once_the_user_status_is_cached(self):
+        rotated = self.post(self.refresh).json()['refresh']
+        with self.assertNumQueries(0):
+            self.assertEqual(self.post(rotated).status_code, 200)
+
+    def test_reuse_within_the_grace_period_is_accepted(self):
+        self.assertEqual(self.post(self.refresh).status_code, 200)
+        # Deux onglets rafraîchissent en même temps avec le même jeton
+        self.assertEqual(self.post(self.refresh, elapsed=5).status_code, 200)
+
+    def test_reuse_after_the_grace_period_revokes_the_family(self):
+        rotated = self.post(self.refresh).json()['refresh']
+        self.assertEqual(self.post(self.refresh, elapsed=60).status_code, 401)
+        # Le jeton légitime issu de la rotation est révoqué avec toute la session
+        self.assertEqual(self.post(rotated, elapsed=61).status_code, 401)
+
+    def test_logout_revokes_the_family(self):
+        rotated = self.post(self.refresh).json()['refresh']
+        self.client.cookies[settings.SIMPLE_JWT['AUTH_COOKIE_REFRESH']] = str(self.refresh)
+        self.assertEqual(self.client.post('/api/auth/logout/').status_code, 200)
+        self.client.cookies.clear()
+        self.assertEqual(self.post(rotated).status_code, 401)
+
+        # Une autre connexion du même utilisateur n'est pas touchée
+        other = MyTokenObtainPairSerializer.get_token(self.user)
+        self.assertEqual(self.post(other).status_code, 200)
+
+    def test_inactive_user_cannot_refresh(self):
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self.post(self.refresh).status_code, 401)
+
+
+class _ThrottledView:
+    throttle_scope = 'test'
+
+
+@override_settings(THROTTLE_BACKEND='local', THROTTLE_BUCKETS={'test': {'rate': '60/min', 'burst': 3}})
+class BucketThrottleTests(TestCase):
+    def setUp(self):
+        # Un magasin neuf par test, à une horloge arrêtée
+        patcher = mock.patch.object(throttling, '_store', None)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.now = 1000.0
+        patcher = mock.patch('api.throttling.time.time', lambda: self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.factory = RequestFactory()
+
+    def allow(self, user=None, address='10.0.0.1'):
+        request = self.factory.post('/', REMOTE_ADDR=address)
+        request.user = user or AnonymousUser()
+        throttle = throttling.BucketThrottle()
+        return throttle.allow_request(request, _ThrottledView()), throttle.wait()
+
+    def test_parse_rate(self):
+        for rate, expected in (('10/s', 10), ('120/min', 2), ('36/hour', 0.01), ('864/day', 0.01)):
+            self.assertAlmostEqual(throttling.parse_rate(rate), expected, msg=rate)
+
+    def test_burst_then_sustained_rate(self):
+        self.assertEqual([self.allow()[0] for _ in range(4)], [True, True, True, False])
+        # Un jeton par seconde à 60/min : l'attente annoncée est le temps d'en gagner un
+        self.assertAlmostEqual(self.allow()[1], 1.0)
+        self.now += 0.5
+        self.assertEqual(self.allow(), (False, 0.5))
+        self.now += 0.5
+        self.assertEqual(self.allow(), (True, 0))
+        self.assertFalse(self.allow()[0])
+
+    def test_refill_is_capped_at_the_burst(self):
+        for _ in range(3):
+            self.allow()
+        self.now += 3600
+        self.assertEqual([self.allow()[0] for _ in range(4)], [True, True, True, False])
+
+    def test_users_and_addresses_have_their_own_buckets(self):
+        first = User.objects.create_user('auteur', 'auteur@example.com', 'secret-123')
+        second = User.objects.create_user('lecteur', 'lecteur@example.com', 'secret-123')
+        for _ in range(3):
+            self.assertTrue(self.allow(first)[0])
+        self.assertFalse(self.allow(first)[0])
+        # Un utilisateur connecté n'est pas limité par l'adresse qu'il partage avec un autre
+        self.assertTrue(self.allow(second)[0])
+        self.assertTrue(self.allow()[0])
+        self.assertTrue(self.allow(address='10.0.0.2')[0])
+        for _ in range(2):
+            self.allow()
+        self.assertFalse(self.allow()[0])
+        self.assertTrue(self.allow(address='10.0.0.2')[0])
+
+    @override_settings(THROTTLE_BACKEND='cache', THROTTLE_CACHE='default')
+    def test_cache_backend_shares_buckets_between_stores(self):
+        cache.clear()
+        self.assertEqual([self.allow()[0] for _ in range(2)], [True, True])
+        # Un autre processus : nouveau magasin, mêmes seaux dans le cache
+        throttling._store = None
+        self.assertEqual([self.allow()[0] for _ in range(2)], [True, False])
+
+    @override_settings(THROTTLE_BACKEND='memcached')
+    def test_unknown_backend(self):
+        with self.assertRaises(ImproperlyConfigured):
+            self.allow()
+
+    @override_settings(THROTTLE_BUCKETS={'register': {'rate': '5/hour', 'burst': 1}})
+    def test_refused_request_carries_retry_after(self):
+        client = APIClient()
+        payload = {'username': 'auteur', 'email': 'auteur@example.com', 'password': 'Secret-mot-1!'}
+        self.assertNotEqual(client.post('/api/register/', payload, format='json').status_code, 429)
+        response = client.post('/api/register/', dict(payload, username='lecteur'), format='json')
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response['Retry-After'], '720')
+        self.assertFalse(User.objects.filter(username='lecteur').exists())
+
+
+class DeploymentCheckTests(SimpleTestCase):
+    @override_settings(WEB_CONCURRENCY=3, JWT_REVOCATION_CACHE='default', CACHES={
+        'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+    })
+    def test_process_local_revocation_list_fails_with_several_workers(self):
+        self.assertEqual([error.id for error in checks.check_jwt_revocation(None)], ['api.E003'])
+        with override_settings(WEB_CONCURRENCY=1):
+            self.assertEqual(checks.check_jwt_revocation(None), [])
+        with override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.redis.RedisCache'}}):
+            self.assertEqual(checks.check_jwt_revocation(None), [])
+
+
+class MetricsTests(TestCase):
+    @override_settings(METRICS_TOKEN='')
+    def test_denied_without_configured_token(self):
+        self.assertEqual(self.client.get('/metrics').status_code, 403)
+        self.assertEqual(self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer ').status_code, 403)
+
+    @override_settings(METRICS_TOKEN='secret')
+    def test_series_are_labelled_by_worker(self):
+        self.assertEqual(self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer autre').status_code, 401)
+        response = self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer secret')
+        self.assertEqual(response.status_code, 200)
+        samples = [line for line in response.content.decode().splitlines() if not line.startswith('#')]
+        self.assertTrue(samples)
+        for line in samples:
+            self.assertIn(f'worker="{os.getpid()}"', line)
+
+
+def _websocket_application(user):
+    router = URLRouter(websocket_urlpatterns)
+
+    async def application(scope, receive, send):
+        return await router({**scope, 'user': user}, receive, send)
+    return application
+
+
+class CollabTests(TransactionTestCase):
+    def setUp(self):
+        cache.clear()
+        # Chaque test tourne sur sa propre boucle : couche de canaux et hôte des salles neufs
+        channel_layers.backends.clear()
+        collab._host = None
+        self.user = User.objects.create_user('auteur', 'auteur@example.com', 'secret-123')
+        self.project = Project.objects.create(
+            user=self.user, title='Projet', description='', editor_content=_lexical('un', 'deux'),
+        )
+        self.path = f'/ws/projects/{self.project.pk}/'
+
+    async def connect(self):
+        communicator = WebsocketCommunicator(_websocket_application(self.user), self.path)
+        connected, _ = await communicator.connect()
+        self.assertTrue(connected)
+        init = await self.receive(communicator, 'init')
+        return communicator, init
+
+    async def receive(self, communicator, message_type):
+        # Les messages de présence peuvent s'intercaler à tout moment
+        while True:
+            message = await communicator.receive_json_from(timeout=5)
+            if message['type'] == message_type:
+                return message
+
+    async def wait_room_closed(self):
+        # Le dernier départ compacte la salle puis libère l'inscription du propriétaire
+        for _ in range(50):
+            if await cache.aget(collab.owner_key(self.project.pk)) is None:
+                return
+            await asyncio.sleep(0.1)
+        self.fail("La salle n'a pas été fermée")
+
+    def paragraph(self, text):
+        return {'type': 'paragraph', 'children': [{'type': 'text', 'text': text}]}
+
+    async def test_concurrent_updates_are_ordered_for_every_editor(self):
+        first, init = await self.connect()
+        second, _ = await self.connect()
+        # Les deux patchs partent de la même séquence : le second est transformé par rapport au premier validé
+        await first.send_json_to({'type': 'update', 'base': init['seq'], 'patch': [
+            {'op': 'add', 'path': '/root/children/0', 'value': self.paragraph('zéro')},
+        ]})
+        await second.send_json_to({'type': 'update', 'base': init['seq'], 'patch': [
+            {'op': 'replace', 'path': '/root/children/0', 'value': self.paragraph('UN')},
+        ]})
+        received = []
+        for communicator in (first, second):
+            updates = [await self.receive(communicator, 'update') for _ in range(2)]
+            self.assertEqual([update['seq'] for update in updates], [1, 2])
+            received.append([update['patch'] for update in updates])
+        self.assertEqual(received[0], received[1])
+        await first.disconnect()
+        await second.disconnect()
+        await self.wait_room_closed()
+
+        project = await Project.objects.aget(pk=self.project.pk)
+        texts = [block['children'][0]['text'] for block in json.loads(project.editor_content)['root']['children']]
+        self.assertEqual(texts, ['zéro', 'UN', 'deux'])
+        self.assertEqual(project.revision, 1)
+
+    async def test_compaction_rebases_pending_edits_onto_a_rest_save(self):
+        editor, init = await self.connect()
+        saved = _lexical('un', 'DEUX', 'trois')
+
+        def save():
+            project = Project.objects.get(pk=self.project.pk)
+            project.editor_content = saved
+            project.revision += 1
+            project.save()
+        await database_sync_to_async(save)()
+
+        with mock.patch.object(collab, 'COMPACT_EVERY', 2):
+            await editor.send_json_to({'type': 'update', 'base': init['seq'], 'patch': [
+                {'op': 'add', 'path': '/root/children/0', 'value': self.paragraph('zéro')},
+            ]})
+            update = await self.receive(editor, 'update')
+            await editor.send_json_to({'type': 'update', 'base': update['seq'], 'patch': [
+                {'op': 'remove', 'path': '/root/children/1'},
+            ]})
+            await self.receive(editor, 'update')
+            resync = await self.receive(editor, 'resync')
+        # Les deux modifications de l'éditeur et celles de l'enregistrement REST sont conservées
+        texts = [block['children'][0]['text'] for block in resync['document']['root']['children']]
+        self.assertEqual(texts, ['zéro', 'DEUX', 'trois'])
+
+        await editor.send_json_to({'type': 'update', 'base': resync['seq'], 'patch': [
+            {'op': 'add', 'path': '/root/children/-', 'value': self.paragraph('quatre')},
+        ]})
+        await self.receive(editor, 'update')
+        await editor.disconnect()
+        await self.wait_room_closed()
+
+        project = await Project.objects.aget(pk=self.project.pk)
+        texts = [block['children'][0]['text'] for block in json.loads(project.editor_content)['root']['children']]
+        self.assertEqual(texts, ['zéro', 'DEUX', 'trois', 'quatre'])
+        self.assertEqual(project.revision, 3)
+
+    async def test_failed_compaction_keeps_pending_edits(self):
+        room = collab.Room(self.project.pk)
+        await room.load()
+        room.submit(0, [{'op': 'remove', 'path': '/root/children/0'}])
+        with mock.patch.object(collab.Room, '_save', side_effect=OperationalError('connexion perdue')):
+            with self.assertRaises(OperationalError):
+                await room.compact()
+        self.assertEqual(room.pending, 1)
+
+        self.assertTrue(await room.compact())
+        self.assertEqual(room.pending, 0)
+        project = await Project.objects.aget(pk=self.project.pk)
+        self.assertEqual(json.loads(project.editor_content), json.loads(_lexical('deux')))
+
+    async def test_room_is_saved_when_ownership_is_lost(self):
+        with mock.patch.object(collab, 'OWNER_TTL', 0.3):
+            editor, init = await self.connect()
+            await editor.send_json_to({'type': 'update', 'base': init['seq'], 'patch': [
+                {'op': 'remove', 'path': '/root/children/0'},
+            ]})
+            await self.receive(editor, 'update')
+            # Un autre processus a repris la salle : celle-ci est enregistrée avant d'être abandonnée
+            await cache.aset(collab.owner_key(self.project.pk), 'collab.autre', 30)
+            while (output := await editor.receive_output(timeout=5))['type'] != 'websocket.close':
+                pass
+        self.assertEqual(output['code'], 4409)
+        self.assertEqual(collab._host.rooms, {})
+
+        project = await Project.objects.aget(pk=self.project.pk)
+        self.assertEqual(json.loads(project.editor_content), json.loads(_lexical('deux')))
+        self.assertEqual(project.revision, 1)
+
+    async def test_room_owned_by_another_process(self):
+        # Un second hôte sur la même couche de canaux joue le rôle d'un autre processus
+        other = collab.RoomHost(get_channel_layer())
+        await other.start()
+        try:
+            self.assertEqual(await other.claim(self.project.pk), other.channel)
+            editor, init = await self.connect()
+            self.assertIn(self.project.pk, other.rooms)
+            await editor.send_json_to({'type': 'update', 'base': init['seq'], 'patch': [
+                {'op': 'remove', 'path': '/root/children/1'},
+            ]})
+            self.assertEqual((await self.receive(editor, 'update'))['seq'], 1)
+            await editor.disconnect()
+            await self.wait_room_closed()
+            self.assertNotIn(self.project.pk, other.rooms)
+        finally:
+            other.stop()
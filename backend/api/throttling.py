@@ -0,0 +1,112 @@
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.exceptions import ImproperlyConfigured
+from rest_framework.throttling import BaseThrottle
+
+# Nombre maximal de seaux conservés par processus ; les plus anciens repartent pleins
+LOCAL_MAX_BUCKETS = 10000
+DURATIONS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+
+
+def parse_rate(rate):
+    """'120/min' -> jetons par seconde."""
+    count, period = rate.split('/')
+    return int(count) / DURATIONS[period[0]]
+
+
+class LocalBucketStore:
+    """Seaux en mémoire du processus : suffisant quand l'API tourne sur un seul nœud."""
+
+    def __init__(self):
+        self.buckets = OrderedDict()
+        self.lock = threading.Lock()
+
+    def take(self, key, rate, capacity, now):
+        with self.lock:
+            tokens, last = self.buckets.pop(key, (capacity, now))
+            tokens, wait = _refill_and_take(tokens, last, rate, capacity, now)
+            self.buckets[key] = (tokens, now)
+            if len(self.buckets) > LOCAL_MAX_BUCKETS:
+                self.buckets.popitem(last=False)
+        return wait
+
+
+class CacheBucketStore:
+    """Seaux partagés entre les nœuds via le cache Django (Redis, Memcached…).
+
+    La lecture puis l'écriture ne sont pas atomiques : sous forte concurrence, quelques
+    requêtes simultanées d'un même client peuvent passer au-delà de la rafale.
+    """
+
+    def __init__(self, alias='default'):
+        self.cache = caches[alias]
+
+    def take(self, key, rate, capacity, now):
+        tokens, last = self.cache.get(f'throttle:{key}', (capacity, now))
+        tokens, wait = _refill_and_take(tokens, last, rate, capacity, now)
+        # Au-delà de ce délai le seau est de nouveau plein : inutile de le garder
+        self.cache.set(f'throttle:{key}', (tokens, now), int(capacity / rate) + 1)
+        return wait
+
+
+def _refill_and_take(tokens, last, rate, capacity, now):
+    tokens = min(capacity, tokens + (now - last) * rate)
+    if tokens >= 1:
+        return tokens - 1, 0
+    return tokens, (1 - tokens) / rate
+
+
+_store = None
+
+
+def get_store():
+    global _store
+    if _store is None:
+        backend = getattr(settings, 'THROTTLE_BACKEND', 'local')
+        if backend == 'local':
+            _store = LocalBucketStore()
+        elif backend == 'cache':
+            _store = CacheBucketStore(getattr(settings, 'THROTTLE_CACHE', 'default'))
+        else:
+            raise ImproperlyConfigured(f"THROTTLE_BACKEND inconnu : {backend}")
+    return _store
+
+
+def bucket_wait(scope, ident):
+    """Consomme un jeton du seau `scope` de `ident` ; retourne 0 ou le délai d'attente en secondes."""
+    config = getattr(settings, 'THROTTLE_BUCKETS', {}).get(scope)
+    if config is None:
+        return 0
+    rate = parse_rate(config['rate'])
+    return get_store().take(f'{scope}:{ident}', rate, config.get('burst', 1), time.time())
+
+
+def user_key(user):
+    return f'user:{user.pk}'
+
+
+class BucketThrottle(BaseThrottle):
+    """Limitation par seau à jetons : débit soutenu et rafale par portée (throttle_scope de la vue).
+
+    Les utilisateurs connectés sont identifiés par leur id, les autres par leur adresse IP.
+    """
+
+    def get_cache_key(self, request):
+        user = getattr(request, 'user', None)
+        if user is not None and user.is_authenticated:
+            return user_key(user)
+        return f'ip:{self.get_ident(request)}'
+
+    def allow_request(self, request, view):
+        scope = getattr(view, 'throttle_scope', None)
+        if scope is None:
+            return True
+        self.delay = bucket_wait(scope, self.get_cache_key(request))
+        return not self.delay
+
+    def wait(self):
+        return self.delay
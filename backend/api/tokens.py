@@ -0,0 +1,99 @@
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from .authentication import is_user_active
+
+# Claim commun à tous les jetons de rafraîchissement issus d'une même connexion
+FAMILY_CLAIM = 'family'
+
+
+class RevocationList:
+    """Jetons de rafraîchissement révoqués, conservés dans le cache Django jusqu'à leur expiration.
+
+    Une entrée ne contient que l'instant de révocation : la liste reste compacte et se vide
+    d'elle-même. Avec un cache partagé (Redis, Memcached…), la révocation vaut pour tous les nœuds.
+    """
+
+    def __init__(self, alias='default'):
+        self.cache = caches[alias]
+
+    def _set(self, key, expires_at):
+        timeout = int(expires_at - time.time()) + 1
+        if timeout > 0:
+            self.cache.set(key, int(time.time()), timeout)
+
+    def revoke(self, jti, expires_at):
+        self._set(f'jwt:revoked:{jti}', expires_at)
+
+    def revoke_family(self, family, expires_at):
+        self._set(f'jwt:revoked-family:{family}', expires_at)
+
+    def lookup(self, jti, family):
+        """(instant de révocation du jeton ou None, famille révoquée) en une seule lecture."""
+        keys = [f'jwt:revoked:{jti}', f'jwt:revoked-family:{family}']
+        values = self.cache.get_many(keys)
+        return values.get(keys[0]), keys[1] in values
+
+
+_revocations = None
+
+
+def get_revocations():
+    global _revocations
+    if _revocations is None:
+        _revocations = RevocationList(getattr(settings, 'JWT_REVOCATION_CACHE', 'default'))
+    return _revocations
+
+
+def rotate(raw_token):
+    """Valide un jeton de rafraîchissement et retourne celui qui le remplace, sans lecture en base.
+
+    Vérifie la signature, l'expiration et la liste de révocation. Avec JWT_ROTATE_REFRESH, le jeton
+    présenté est révoqué et remplacé par un nouveau de même expiration et de même famille.
+    Un jeton déjà remplacé, présenté après JWT_REFRESH_REUSE_GRACE secondes, est considéré comme
+    volé : toute sa famille est révoquée. Le délai de grâce couvre les onglets qui rafraîchissent
+    en même temps avec le même jeton.
+    """
+    try:
+        token = RefreshToken(raw_token)
+    except TokenError as e:
+        raise InvalidToken(str(e))
+    jti = token[api_settings.JTI_CLAIM]
+    family = token.get(FAMILY_CLAIM, jti)
+    revocations = get_revocations()
+    revoked_at, family_revoked = revocations.lookup(jti, family)
+    if family_revoked:
+        raise InvalidToken('Session révoquée')
+    if revoked_at is not None and time.time() - revoked_at > getattr(settings, 'JWT_REFRESH_REUSE_GRACE', 30):
+        revocations.revoke_family(family, token['exp'])
+        raise InvalidToken('Jeton de rafraîchissement déjà utilisé')
+    user_id = token.get(api_settings.USER_ID_CLAIM)
+    if user_id is None or not is_user_active(user_id):
+        raise InvalidToken('Utilisateur inactif ou supprimé')
+
+    if not getattr(settings, 'JWT_ROTATE_REFRESH', True):
+        return token
+    replacement = RefreshToken()
+    for claim, value in token.payload.items():
+        if claim not in ('iat', api_settings.JTI_CLAIM):
+            replacement[claim] = value
+    # Même expiration que le jeton d'origine : la rotation ne prolonge pas la session
+    replacement[FAMILY_CLAIM] = family
+    if revoked_at is None:
+        revocations.revoke(jti, token['exp'])
+    return replacement
+
+
+def revoke(raw_token):
+    """Révoque la famille d'un jeton de rafraîchissement (déconnexion) ; un jeton invalide est ignoré."""
+    try:
+        token = RefreshToken(raw_token)
+    except TokenError:
+        return
+    jti = token[api_settings.JTI_CLAIM]
+    get_revocations().revoke_family(token.get(FAMILY_CLAIM, jti), token['exp'])
@@ -1,17 +1,68 @@
-from rest_framework import viewsets, permissions, generics, status
-from rest_framework.decorators import api_view
+from rest_framework import viewsets, permissions, generics, status, mixins
+from rest_framework.decorators import api_view, action, parser_classes, permission_classes
+from rest_framework.parsers import JSONParser
 from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
+from rest_framework_simplejwt.exceptions import InvalidToken
 from rest_framework.views import APIView
 from rest_framework.response import Response
-from .models import Text, Annotation, Project
-from .serializers import TextSerializer, AnnotationSerializer, ProjectSerializer, MyTokenObtainPairSerializer , UserSerializer , RegisterSerializer
+from rest_framework.exceptions import ValidationError
+from rest_framework.filters import OrderingFilter
+from .models import Text, Annotation, Project, Job, UserWorkspaceStats
+from .serializers import (
+    TextSerializer,
+    AnnotationSerializer,
+    AnnotationIngestSerializer,
+    ProjectSerializer,
+    ProjectPatchSerializer,
+    ProjectChunksUpdateSerializer,
+    ProjectRevisionSerializer,
+    ProjectSummarySerializer,
+    ProjectDerivedDataSerializer,
+    JobSerializer,
+    MyTokenObtainPairSerializer,
+    UserSerializer,
+    RegisterSerializer,
+)
+from .parsers import NDJSONParser
+from .pagination import ProjectCursorPagination, AnnotationCursorPagination
+from .filters import AnnotationFilter
+from .conditional import has_validators, set_validators, conditional_response, check_preconditions
+from .jsonpatch import apply_patch, JsonPatchError
+from .revisions import record_revision, reconstruct_content
+from .search import search_configs, search_query, SNIPPET_TEXT_LIMIT
+from .throttling import BucketThrottle
+from .metrics import render_metrics
+from .tokens import rotate, revoke as revoke_refresh_token
+from . import readcache
+from .jobs import enqueue_once, reindex_later
+from .chunking import parse_chunk_range
+from .workspace import WorkspaceImporter, WorkspaceImportError, export_ndjson, export_zip, iter_archive_lines
 from django.views.decorators.csrf import ensure_csrf_cookie
-from django.http import JsonResponse
+from django.http import HttpResponse, StreamingHttpResponse
 from django.conf import settings
 from django.contrib.auth.models import User
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework.permissions import IsAuthenticated
 from django.middleware.csrf import get_token
+from django.db import transaction, connection
+from django.db.models import Q, F, TextField, Value
+from django.db.models.functions import Coalesce, Concat, Left
+from django.contrib.postgres.search import SearchRank, SearchHeadline
+from django.shortcuts import get_object_or_404
+from django.urls import reverse
+import hmac
+import json
+import shutil
+import tempfile
+
+def metrics(request):
+    """Métriques du processus au format Prometheus ; inaccessibles tant que METRICS_TOKEN n'est pas défini."""
+    token = getattr(settings, 'METRICS_TOKEN', '')
+    if not token:
+        return HttpResponse(status=status.HTTP_403_FORBIDDEN)
+    if not hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}'):
+        return HttpResponse(status=status.HTTP_401_UNAUTHORIZED)
+    return HttpResponse(render_metrics(), content_type='text/plain; version=0.0.4; charset=utf-8')
 
 @api_view(['GET'])
 @ensure_csrf_cookie
@@ -27,98 +78,594 @@ def create_text(request):
         return Response({'textId': text.id}, status=status.HTTP_201_CREATED)
     return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
+def create_annotation(data, user):
+    """Valide puis crée une annotation et son texte ; retourne (corps de réponse, statut HTTP).
+
+    Partagée par la vue synchrone et la vue asynchrone ; `user` est None ou anonyme sans authentification.
+    """
+    serializer = AnnotationIngestSerializer(data=data)
+    if not serializer.is_valid():
+        return serializer.errors, status.HTTP_400_BAD_REQUEST
+    data = serializer.validated_data
+
+    project_id = data.get('project')
+    if project_id is not None:
+        if user is None or not user.is_authenticated:
+            return {'error': 'Authentification requise'}, status.HTTP_401_UNAUTHORIZED
+        if not Project.objects.filter(pk=project_id, user=user).exists():
+            return {'detail': 'Projet introuvable'}, status.HTTP_404_NOT_FOUND
+
+    with transaction.atomic():
+        text = Text.objects.create(content=data['selectedText'])
+        # Même propriétaire que pour l'import en lot : l'utilisateur authentifié, avec ou sans projet
+        owner = user if user is not None and user.is_authenticated else None
+        annotation = AnnotationIngestSerializer.build(data, text, user=owner)
+        annotation.save()
+        Annotation.objects.filter(pk=annotation.pk).update_search_vectors()
+    return {'message': 'Annotation added', 'textId': text.id}, status.HTTP_201_CREATED
+
 @api_view(['POST'])
 def add_annotation(request):
-    data = request.data
-    selected_text = data.get('selectedText')
-    start_index = data.get('start_index')
-    end_index = data.get('end_index')
-
-    if not selected_text or start_index is None or end_index is None:
-        return Response({'error': 'Invalid data'}, status=status.HTTP_400_BAD_REQUEST)
-
-    text = Text.objects.create(content=selected_text)
-    annotation_data = {
-        'title': data.get('title'),
-        'description': data.get('description'),
-        'start_index': start_index,
-        'end_index': end_index,
-        'text': text.id,
-    }
-
-    annotation_serializer = AnnotationSerializer(data=annotation_data)
-    
-    if annotation_serializer.is_valid():
-        annotation_serializer.save()
-        return Response({'message': 'Annotation added', 'textId': text.id}, status=status.HTTP_201_CREATED)
-    return Response(annotation_serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+    body, status_code = create_annotation(request.data, request.user)
+    return Response(body, status=status_code)
+
+def _parse_range(value, name):
+    try:
+        start, end = (int(part) for part in value.split(','))
+    except ValueError:
+        raise ValidationError({name: "Format attendu : début,fin"})
+    if end < start:
+        raise ValidationError({name: "La fin doit être supérieure ou égale au début"})
+    return start, end
+
+def filter_annotation_range(queryset, params):
+    """Filtre des annotations par position : ?covers=N, ?overlaps=début,fin ou ?within=début,fin."""
+    if 'covers' in params:
+        try:
+            queryset = queryset.covering(int(params['covers']))
+        except ValueError:
+            raise ValidationError({'covers': "Un entier est attendu"})
+    if 'overlaps' in params:
+        queryset = queryset.overlapping(*_parse_range(params['overlaps'], 'overlaps'))
+    if 'within' in params:
+        queryset = queryset.within(*_parse_range(params['within'], 'within'))
+    return queryset
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def text_annotations(request, text_id):
+    text = get_object_or_404(Text, pk=text_id)
+    # Seules les annotations de l'utilisateur ou de ses projets sont visibles
+    annotations = text.annotations.filter(Q(project__user=request.user) | Q(user=request.user))
+    annotations = filter_annotation_range(annotations.defer('search_vector'), request.query_params)
+    return Response(AnnotationSerializer(annotations.order_by('start_index'), many=True).data)
+
+class AnnotationViewSet(viewsets.ReadOnlyModelViewSet):
+    """Annotations de l'utilisateur, paginées par curseur et filtrables par texte, projet, auteur et date."""
+
+    serializer_class = AnnotationSerializer
+    permission_classes = [IsAuthenticated]
+    filter_backends = [DjangoFilterBackend, OrderingFilter]
+    filterset_class = AnnotationFilter
+    ordering_fields = ['created_at', 'start_index']
+    pagination_class = AnnotationCursorPagination
+
+    def get_queryset(self):
+        # Les annotations d'un projet sont toujours celles de son propriétaire : le filtre sur user seul
+        # suit l'index (user, created_at) de la pagination par clé, sans jointure avec les projets.
+        # Le sérialiseur ne lit que des colonnes de l'annotation (clés étrangères comprises) :
+        # une page coûte une seule requête, sans préchargement
+        queryset = Annotation.objects.filter(user=self.request.user).defer('search_vector')
+        return filter_annotation_range(queryset, self.request.query_params)
+
+SEARCH_RESULTS_LIMIT = 50
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def search(request):
+    terms = request.query_params.get('q', '').strip()
+    if not terms:
+        return Response({'error': 'Le paramètre q est requis'}, status=status.HTTP_400_BAD_REQUEST)
+    try:
+        limit = min(int(request.query_params.get('limit', 20)), SEARCH_RESULTS_LIMIT)
+    except ValueError:
+        return Response({'error': 'Le paramètre limit doit être un entier'}, status=status.HTTP_400_BAD_REQUEST)
+    configs = search_configs(request.query_params.get('lang'))
+
+    projects = Project.objects.filter(user=request.user)
+    annotations = Annotation.objects.filter(Q(project__user=request.user) | Q(user=request.user))
+
+    if connection.vendor == 'postgresql':
+        query = search_query(terms, configs)
+        headline = {'config': configs[0], 'start_sel': '<mark>', 'stop_sel': '</mark>', 'max_fragments': 2}
+        projects = projects.filter(search_vector=query).annotate(
+            rank=SearchRank(F('search_vector'), query),
+            # Extrait tiré du texte brut dérivé, l'extrait de la liste à défaut
+            snippet=SearchHeadline(Concat(
+                'description', Value(' '), Left(Coalesce('derived__plain_text', 'excerpt'), SNIPPET_TEXT_LIMIT),
+                output_field=TextField(),
+            ), query, **headline),
+        ).order_by('-rank')
+        annotations = annotations.filter(search_vector=query).annotate(
+            rank=SearchRank(F('search_vector'), query),
+            snippet=SearchHeadline(
+                Concat('selected_text', Value(' '), 'description', output_field=TextField()), query, **headline,
+            ),
+        ).order_by('-rank')
+    else:
+        # Repli sans index plein texte pour les autres bases
+        projects = projects.filter(
+            Q(title__icontains=terms) | Q(description__icontains=terms) | Q(excerpt__icontains=terms)
+        ).annotate(rank=Value(0.0), snippet=F('excerpt')).order_by('-updated_at')
+        annotations = annotations.filter(
+            Q(title__icontains=terms) | Q(description__icontains=terms) | Q(selected_text__icontains=terms)
+        ).annotate(rank=Value(0.0), snippet=F('selected_text')).order_by('-created_at')
+
+    return Response({
+        'projects': list(projects.values('id', 'title', 'rank', 'snippet')[:limit]),
+        'annotations': list(annotations.values('id', 'project', 'text', 'title', 'rank', 'snippet')[:limit]),
+    })
+
+BULK_ANNOTATION_LIMIT = 10000
+
+@api_view(['POST'])
+@parser_classes([JSONParser, NDJSONParser])
+def bulk_add_annotations(request):
+    items = request.data
+    if not isinstance(items, list):
+        return Response({'error': 'Une liste d\'annotations est attendue'}, status=status.HTTP_400_BAD_REQUEST)
+    if len(items) > BULK_ANNOTATION_LIMIT:
+        return Response(
+            {'error': f'Au plus {BULK_ANNOTATION_LIMIT} annotations par requête'},
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+
+    user = request.user if request.user.is_authenticated else None
+    valid = []
+    errors = []
+    for index, item in enumerate(items):
+        serializer = AnnotationIngestSerializer(data=item)
+        if serializer.is_valid():
+            valid.append((index, serializer.validated_data))
+        else:
+            errors.append({'index': index, 'errors': serializer.errors})
+
+    # Les annotations ne peuvent être rattachées qu'aux projets de l'utilisateur
+    project_ids = {data['project'] for _, data in valid if data.get('project') is not None}
+    if project_ids:
+        allowed = {None}
+        if user:
+            allowed.update(Project.objects.filter(user=user, id__in=project_ids).values_list('id', flat=True))
+        errors.extend(
+            {'index': index, 'errors': {'project': ['Projet introuvable.']}}
+            for index, data in valid if data.get('project') not in allowed
+        )
+        errors.sort(key=lambda error: error['index'])
+        valid = [(index, data) for index, data in valid if data.get('project') in allowed]
+
+    if not valid:
+        return Response({'created': 0, 'errors': errors}, status=status.HTTP_400_BAD_REQUEST)
+
+    with transaction.atomic():
+        # Une seule ligne Text par texte sélectionné identique dans le lot
+        texts = {}
+        for _, data in valid:
+            texts.setdefault(data['selectedText'], Text(content=data['selectedText']))
+        Text.objects.bulk_create(texts.values(), batch_size=1000)
+
+        annotations = Annotation.objects.bulk_create([
+            AnnotationIngestSerializer.build(data, texts[data['selectedText']], user=user) for _, data in valid
+        ], batch_size=1000)
+        Annotation.objects.filter(id__in=[annotation.id for annotation in annotations]).update_search_vectors()
+        if user is not None:
+            UserWorkspaceStats.record(user.pk, annotations=len(annotations))
+
+    return Response({
+        'created': len(annotations),
+        'results': [
+            {'index': index, 'id': annotation.id, 'textId': annotation.text_id}
+            for (index, _), annotation in zip(valid, annotations)
+        ],
+        'errors': errors,
+    }, status=status.HTTP_201_CREATED)
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def export_workspace(request):
+    """Exporte projets, textes et annotations de l'utilisateur en NDJSON (?type=zip pour une archive)."""
+    if request.query_params.get('type') == 'zip':
+        response = StreamingHttpResponse(export_zip(request.user), content_type='application/zip')
+        filename = 'workspace.zip'
+    else:
+        response = StreamingHttpResponse(export_ndjson(request.user), content_type='application/x-ndjson')
+        filename = 'workspace.ndjson'
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def import_workspace(request):
+    """Importe un export NDJSON ou zip ; le corps est lu en flux sans passer par les parsers."""
+    try:
+        if request.content_type == 'application/zip':
+            # zipfile a besoin d'un fichier positionnable
+            with tempfile.TemporaryFile() as archive:
+                shutil.copyfileobj(request.stream, archive)
+                archive.seek(0)
+                counts = WorkspaceImporter(request.user).run(iter_archive_lines(archive))
+        else:
+            counts = WorkspaceImporter(request.user).run(request.stream or [])
+    except WorkspaceImportError as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    return Response(counts, status=status.HTTP_201_CREATED)
+
+def job_accepted(request, job):
+    """Réponse 202 pointant vers l'état de la tâche mise en file."""
+    response = Response(JobSerializer(job).data, status=status.HTTP_202_ACCEPTED)
+    response['Location'] = request.build_absolute_uri(reverse('job-detail', args=[job.pk]))
+    return response
+
+class JobViewSet(mixins.DestroyModelMixin, viewsets.ReadOnlyModelViewSet):
+    """État des tâches de fond de l'utilisateur ; une tâche encore en attente peut être annulée."""
+
+    serializer_class = JobSerializer
+    permission_classes = [IsAuthenticated]
+    filterset_fields = ['kind', 'status']
+
+    def get_queryset(self):
+        return Job.objects.filter(user=self.request.user).order_by('-created_at')
+
+    def perform_destroy(self, instance):
+        if not Job.objects.filter(pk=instance.pk, status=Job.QUEUED).delete()[0]:
+            raise ValidationError({'status': "Seule une tâche en attente peut être annulée"})
+
+def save_project_update(serializer, user, request=None):
+    with transaction.atomic():
+        # Les modifications s'appliquent à la ligne verrouillée : le contenu précédent (delta de révision,
+        # recalage des annotations) est celui de la dernière sauvegarde validée, pas celui lu avant le verrou
+        serializer.instance = Project.objects.select_for_update().get(pk=serializer.instance.pk)
+        if request is not None:
+            check_preconditions(request, serializer.instance)
+        previous_content = serializer.instance.editor_content
+        serializer.instance.defer_derived = True
+        project = serializer.save(revision=serializer.instance.revision + 1)
+        record_revision(project, previous_content, user=user)
+        reindex_later(project, user)
+    return project
 
 class ProjectViewSet(viewsets.ModelViewSet):
     serializer_class = ProjectSerializer
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
     filter_backends = [DjangoFilterBackend]
     filterset_fields = [] 
+    pagination_class = ProjectCursorPagination
+    throttle_classes = [BucketThrottle]
+    throttle_scope = 'project_save'
 
     def get_queryset(self):
         user = self.request.user
         if user.is_authenticated:
-            return Project.objects.filter(user=user).order_by('-created_at')
+            queryset = Project.objects.filter(user=user).order_by('-created_at')
+            if self.action in (
+                'list', 'annotations', 'revisions', 'revision_detail', 'derived', 'reindex', 'chunks', 'update_chunks',
+            ):
+                # Le contenu complet n'est servi que par la route de détail
+                queryset = queryset.defer('editor_content')
+            elif self.action in ('retrieve', 'content') and has_validators(self.request):
+                # Le contenu n'est chargé que si la copie du client n'est plus à jour
+                queryset = queryset.defer('editor_content')
+            elif self.action in ('update', 'partial_update'):
+                # Le contenu est relu sous verrou par save_project_update
+                queryset = queryset.defer('editor_content')
+            return queryset
         return Project.objects.none()
 
+    def get_throttles(self):
+        # Seules les sauvegardes sont limitées, pas la lecture
+        if self.request.method in permissions.SAFE_METHODS:
+            return []
+        return super().get_throttles()
+
+    def get_serializer_class(self):
+        if self.action == 'list':
+            return ProjectSummarySerializer
+        return ProjectSerializer
+
     def perform_create(self, serializer):
-        serializer.save(user=self.request.user)
+        with transaction.atomic():
+            project = serializer.save(user=self.request.user)
+            record_revision(project, None, user=self.request.user)
 
-class MyTokenObtainPairView(TokenObtainPairView):
-    serializer_class = MyTokenObtainPairSerializer
+    def retrieve(self, request, *args, **kwargs):
+        if not readcache.enabled():
+            project = self.get_object()
+            response = conditional_response(request, project)
+            if response is None:
+                response = set_validators(Response(self.get_serializer(project).data), project)
+            return response
 
-    def post(self, request, *args, **kwargs):
-        serializer = self.get_serializer(data=request.data)
-        try:
-            serializer.is_valid(raise_exception=True)
-        except Exception:
-            return Response({"detail": "Nom d'utilisateur ou mot de passe incorrect"}, status=status.HTTP_401_UNAUTHORIZED)
+        cache = readcache.get_cache()
+        key = readcache.project_key(kwargs['pk'])
+        version, entry = cache.get('project', key)
+        if entry is not None and request.user.is_authenticated and entry['user_id'] == request.user.pk:
+            validators = entry['validators']
+            return conditional_response(request, validators) or set_validators(Response(entry['data']), validators)
 
-        token = serializer.validated_data
+        project = self.get_object()
+        response = conditional_response(request, project)
+        if response is None:
+            data = self.get_serializer(project).data
+            entry = readcache.project_entry(project, data)
+            if entry is not None:
+                cache.set(key, version, entry)
+            response = set_validators(Response(data), project)
+        return response
 
-        response = Response({"detail": "Connexion réussie"}, status=status.HTTP_200_OK)
+    def update(self, request, *args, **kwargs):
+        partial = kwargs.pop('partial', False)
+        serializer = self.get_serializer(self.get_object(), data=request.data, partial=partial)
+        serializer.is_valid(raise_exception=True)
+        project = save_project_update(serializer, request.user, request)
+        return set_validators(Response(serializer.data), project)
 
-        # Définir les cookies JWT
-        response.set_cookie(
-            key=settings.SIMPLE_JWT['AUTH_COOKIE'],
-            value=token['access'],
-            httponly=settings.SIMPLE_JWT['AUTH_COOKIE_HTTP_ONLY'],
-            secure=settings.SIMPLE_JWT['AUTH_COOKIE_SECURE'],
-            samesite=settings.SIMPLE_JWT['AUTH_COOKIE_SAMESITE'],
-            max_age=settings.SIMPLE_JWT['ACCESS_TOKEN_LIFETIME'].total_seconds(),
+    @action(detail=True, methods=['patch'], url_path='content')
+    def patch_content(self, request, pk=None):
+        serializer = ProjectPatchSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        base_revision = serializer.validated_data['base_revision']
+
+        with transaction.atomic():
+            project = get_object_or_404(self.get_queryset().select_for_update(), pk=pk)
+            self.check_object_permissions(request, project)
+            check_preconditions(request, project)
+
+            # Refuser un patch calculé sur une révision obsolète
+            if project.revision != base_revision:
+                return Response(
+                    {"detail": "Le projet a été modifié depuis la révision de base", "revision": project.revision},
+                    status=status.HTTP_409_CONFLICT,
+                )
+
+            patch = serializer.validated_data['patch']
+            try:
+                document = json.loads(project.editor_content) if project.editor_content else {}
+                document = apply_patch(document, patch)
+            except (ValueError, JsonPatchError) as e:
+                return Response({"detail": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+            previous_content = project.editor_content
+            project.editor_content = json.dumps(document, ensure_ascii=False, separators=(',', ':'))
+            project.revision += 1
+            project.defer_derived = True
+            project.save(update_fields=['editor_content', 'revision', 'updated_at'])
+            # Un document vide n'a pas de base sur laquelle rejouer le patch
+            record_revision(project, previous_content, user=request.user, patch=patch if previous_content else None)
+            reindex_later(project, request.user)
+
+        return set_validators(
+            Response({'id': project.id, 'revision': project.revision, 'updated_at': project.updated_at}), project,
         )
 
+    @patch_content.mapping.get
+    def content(self, request, pk=None):
+        """Contenu brut de l'éditeur, servi tel qu'il est stocké quand le client accepte gzip."""
+        project = self.get_object()
+        response = conditional_response(request, project)
+        if response is not None:
+            return response
+
+        stored = project.stored_content()
+        if stored is None:
+            response = HttpResponse(status=status.HTTP_204_NO_CONTENT)
+        elif stored.is_gzip and 'gzip' in request.META.get('HTTP_ACCEPT_ENCODING', ''):
+            response = HttpResponse(stored.payload, content_type='application/json')
+            response['Content-Encoding'] = 'gzip'
+        else:
+            response = HttpResponse(stored.decode(), content_type='application/json')
+        response['Vary'] = 'Accept-Encoding'
+        return set_validators(response, project)
+
+    @action(detail=True, methods=['get'], url_path='derived')
+    def derived(self, request, pk=None):
+        """Texte brut, comptages et plan du projet, sans relire le contenu s'il n'a pas changé."""
+        project = self.get_object()
+        response = conditional_response(request, project)
+        if response is None:
+            derived = project.get_derived_data()
+            response = set_validators(Response(ProjectDerivedDataSerializer(derived).data), project)
+        return response
+
+    @action(detail=True, methods=['get'], url_path='chunks')
+    def chunks(self, request, pk=None):
+        """Contenu découpé : manifeste et premiers morceaux, ou morceaux demandés par « Range: chunks=a-b »."""
+        project = self.get_object()
+        envelope = project.chunk_envelope() if project.chunked else None
+        if envelope is None:
+            return Response({'detail': "Le contenu de ce projet n'est pas découpé"}, status=status.HTTP_409_CONFLICT)
+        response = conditional_response(request, project)
+        if response is not None:
+            return response
+
+        chunks = project.chunks.order_by('index')
+        if 'HTTP_RANGE' in request.META:
+            count = chunks.count()
+            try:
+                start, end = parse_chunk_range(request.META['HTTP_RANGE'], count)
+            except ValueError:
+                response = HttpResponse(status=status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE)
+                response['Content-Range'] = f'chunks */{count}'
+                return response
+            selected = chunks.filter(index__gte=start, index__lte=end).values_list('index', 'start_block', 'data')
+            # Une ligne NDJSON par morceau, écrite sans désérialiser les blocs stockés
+            lines = (
+                f'{{"index":{index},"start_block":{start_block},"blocks":{data.decode()}}}\n'.encode('utf-8')
+                for index, start_block, data in selected.iterator(chunk_size=4)
+            )
+            response = StreamingHttpResponse(
+                lines, status=status.HTTP_206_PARTIAL_CONTENT, content_type='application/x-ndjson',
+            )
+            response['Content-Range'] = f'chunks {start}-{end}/{count}'
+            return set_validators(response, project)
+
+        try:
+            first = max(0, int(request.query_params.get('first', settings.PROJECT_CHUNKS_FIRST)))
+        except ValueError:
+            raise ValidationError({'first': "Un entier est attendu"})
+        manifest = list(chunks.values('index', 'start_block', 'block_count', 'size', 'hash'))
+        response = Response({
+            'id': project.id,
+            'revision': project.revision,
+            'envelope': json.loads(envelope),
+            'manifest': manifest,
+            'chunks': [
+                {'index': index, 'start_block': start_block, 'blocks': json.loads(data.decode())}
+                for index, start_block, data in chunks.filter(index__lt=first).values_list(
+                    'index', 'start_block', 'data',
+                )
+            ],
+        })
+        response['Accept-Ranges'] = 'chunks'
+        return set_validators(response, project)
+
+    @chunks.mapping.put
+    def update_chunks(self, request, pk=None):
+        """Remplace les blocs de quelques morceaux : les autres ne sont ni relus ni réécrits."""
+        serializer = ProjectChunksUpdateSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        changes = {change['index']: change['blocks'] for change in serializer.validated_data['chunks']}
+
+        with transaction.atomic():
+            project = get_object_or_404(self.get_queryset().select_for_update(), pk=pk)
+            self.check_object_permissions(request, project)
+            check_preconditions(request, project)
+            if not project.chunked or project.chunk_envelope() is None:
+                return Response(
+                    {'detail': "Le contenu de ce projet n'est pas découpé"}, status=status.HTTP_409_CONFLICT,
+                )
+            if project.revision != serializer.validated_data['base_revision']:
+                return Response(
+                    {"detail": "Le projet a été modifié depuis la révision de base", "revision": project.revision},
+                    status=status.HTTP_409_CONFLICT,
+                )
+            try:
+                patch = project.replace_chunks(changes)
+            except ValueError as e:
+                return Response({"detail": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+            project.revision += 1
+            project.save(update_fields=['revision', 'content_hash', 'content_size', 'updated_at'])
+            record_revision(project, None, user=request.user, patch=patch)
+            # Résumé, index de recherche, commentaires et données dérivées sont recalculés en tâche de fond
+            reindex_later(project, request.user)
+
+        return set_validators(Response({
+            'id': project.id,
+            'revision': project.revision,
+            'updated_at': project.updated_at,
+            'manifest': list(
+                project.chunks.order_by('index').values('index', 'start_block', 'block_count', 'size', 'hash'),
+            ),
+        }), project)
+
+    @action(detail=True, methods=['post'], url_path='reindex')
+    def reindex(self, request, pk=None):
+        """Met en file le recalcul du résumé, de l'index de recherche et des données dérivées."""
+        project = self.get_object()
+        # Une demande déjà en attente pour ce projet est renvoyée telle quelle
+        return job_accepted(request, enqueue_once('project.reindex', {'project': project.pk}, user=request.user))
+
+    @action(detail=False, methods=['post'], url_path='reindex')
+    def reindex_all(self, request):
+        # L'utilisateur figure dans la charge : deux espaces de travail ne sont pas des tâches identiques
+        return job_accepted(request, enqueue_once('workspace.reindex', {'user': request.user.pk}, user=request.user))
+
+    @action(detail=True, methods=['get'], url_path='annotations')
+    def annotations(self, request, pk=None):
+        project = self.get_object()
+        annotations = filter_annotation_range(project.annotations.all(), request.query_params).order_by('start_index')
+        return Response(AnnotationSerializer(annotations, many=True).data)
+
+    @action(detail=True, methods=['get'], url_path='revisions')
+    def revisions(self, request, pk=None):
+        project = self.get_object()
+        revisions = project.revisions.defer('data').order_by('-revision')
+        return Response(ProjectRevisionSerializer(revisions, many=True).data)
+
+    @action(detail=True, methods=['get'], url_path=r'revisions/(?P<revision>\d+)')
+    def revision_detail(self, request, pk=None, revision=None):
+        project = self.get_object()
+        entry = get_object_or_404(project.revisions.defer('data'), revision=revision)
+        data = ProjectRevisionSerializer(entry).data
+        data['editor_content'] = reconstruct_content(project, entry.revision)
+        return Response(data)
+
+    @action(detail=True, methods=['post'], url_path=r'revisions/(?P<revision>\d+)/restore')
+    def restore_revision(self, request, pk=None, revision=None):
+        with transaction.atomic():
+            project = get_object_or_404(self.get_queryset().select_for_update(), pk=pk)
+            self.check_object_permissions(request, project)
+            if not project.revisions.filter(revision=revision).exists():
+                return Response({"detail": "Révision introuvable"}, status=status.HTTP_404_NOT_FOUND)
+
+            previous_content = project.editor_content
+            project.editor_content = reconstruct_content(project, int(revision))
+            project.revision += 1
+            project.defer_derived = True
+            project.save(update_fields=['editor_content', 'revision', 'updated_at'])
+            record_revision(project, previous_content, user=request.user)
+            reindex_later(project, request.user)
+
+        return set_validators(Response(self.get_serializer(project).data), project)
+
+def set_auth_cookies(response, access, refresh=None):
+    """Cookies JWT d'accès et, s'il est fourni, de rafraîchissement."""
+    cookies = [(settings.SIMPLE_JWT['AUTH_COOKIE'], access, settings.SIMPLE_JWT['ACCESS_TOKEN_LIFETIME'])]
+    if refresh is not None:
+        cookies.append(
+            (settings.SIMPLE_JWT['AUTH_COOKIE_REFRESH'], refresh, settings.SIMPLE_JWT['REFRESH_TOKEN_LIFETIME']),
+        )
+    for key, value, lifetime in cookies:
         response.set_cookie(
-            key=settings.SIMPLE_JWT['AUTH_COOKIE_REFRESH'],
-            value=token['refresh'],
+            key=key,
+            value=value,
             httponly=settings.SIMPLE_JWT['AUTH_COOKIE_HTTP_ONLY'],
             secure=settings.SIMPLE_JWT['AUTH_COOKIE_SECURE'],
             samesite=settings.SIMPLE_JWT['AUTH_COOKIE_SAMESITE'],
-            max_age=settings.SIMPLE_JWT['REFRESH_TOKEN_LIFETIME'].total_seconds(),
+            max_age=lifetime.total_seconds(),
         )
+    return response
 
-        return response
+class MyTokenObtainPairView(TokenObtainPairView):
+    serializer_class = MyTokenObtainPairSerializer
+    throttle_classes = [BucketThrottle]
+    throttle_scope = 'login'
 
-class MyTokenRefreshView(TokenRefreshView):
     def post(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
         try:
-            response = super().post(request, *args, **kwargs)
-            if response.status_code == 200:
-                response.set_cookie(
-                    key=settings.SIMPLE_JWT['AUTH_COOKIE'],
-                    value=response.data['access'],
-                    httponly=settings.SIMPLE_JWT['AUTH_COOKIE_HTTP_ONLY'],
-                    secure=settings.SIMPLE_JWT['AUTH_COOKIE_SECURE'],
-                    samesite=settings.SIMPLE_JWT['AUTH_COOKIE_SAMESITE'],
-                    max_age=settings.SIMPLE_JWT['ACCESS_TOKEN_LIFETIME'].total_seconds(),
-                )
+            serializer.is_valid(raise_exception=True)
         except Exception:
+            return Response({"detail": "Nom d'utilisateur ou mot de passe incorrect"}, status=status.HTTP_401_UNAUTHORIZED)
+
+        token = serializer.validated_data
+        response = Response({"detail": "Connexion réussie"}, status=status.HTTP_200_OK)
+        return set_auth_cookies(response, token['access'], token['refresh'])
+
+class MyTokenRefreshView(TokenRefreshView):
+    def post(self, request, *args, **kwargs):
+        """Nouveau jeton d'accès (et de rafraîchissement, par rotation) sans lecture en base."""
+        raw_token = request.data.get('refresh') or request.COOKIES.get(settings.SIMPLE_JWT['AUTH_COOKIE_REFRESH'])
+        if not raw_token:
+            return Response({"detail": "Erreur de rafraîchissement du token"}, status=status.HTTP_401_UNAUTHORIZED)
+        try:
+            refresh = rotate(raw_token)
+        except InvalidToken:
             return Response({"detail": "Erreur de rafraîchissement du token"}, status=status.HTTP_401_UNAUTHORIZED)
-        return response
+
+        access = str(refresh.access_token)
+        data = {'access': access}
+        if settings.JWT_ROTATE_REFRESH:
+            data['refresh'] = str(refresh)
+        return set_auth_cookies(Response(data), access, data.get('refresh'))
 
 class UserView(generics.RetrieveAPIView):
     serializer_class = UserSerializer
@@ -130,20 +677,40 @@ class UserView(generics.RetrieveAPIView):
 class LogoutView(APIView):
 
     def post(self, request):
+        # Les jetons de rafraîchissement de cette connexion ne sont plus acceptés
+        raw_token = request.COOKIES.get(settings.SIMPLE_JWT['AUTH_COOKIE_REFRESH'])
+        if raw_token:
+            revoke_refresh_token(raw_token)
         response = Response({"detail": "Déconnexion réussie"}, status=status.HTTP_200_OK)
         response.delete_cookie('access_token')
         response.delete_cookie('refresh_token')
         return response
 
 class UserProjectListView(generics.ListAPIView):
-    serializer_class = ProjectSerializer
+    serializer_class = ProjectSummarySerializer
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
+    pagination_class = ProjectCursorPagination
 
     def get_queryset(self):
         user_id = self.kwargs.get('user_id')
-        return Project.objects.filter(user__id=user_id).order_by('-created_at')
+        return Project.objects.filter(user__id=user_id).defer('editor_content').order_by('-created_at')
+
+    def list(self, request, *args, **kwargs):
+        # Liste lisible sans authentification : chaque page est servie par le cache de lecture
+        if not readcache.enabled():
+            return super().list(request, *args, **kwargs)
+        cache = readcache.get_cache()
+        key = readcache.user_projects_key(self.kwargs.get('user_id'))
+        variant = request.build_absolute_uri()
+        version, data = cache.get('user_projects', key, variant)
+        if data is None:
+            data = super().list(request, *args, **kwargs).data
+            cache.set(key, version, data, variant)
+        return Response(data)
 
 class RegisterView(generics.CreateAPIView):
     queryset = User.objects.all()
     serializer_class = RegisterSerializer
-    permission_classes = [permissions.AllowAny]
\ No newline at end of file
+    permission_classes = [permissions.AllowAny]
+    throttle_classes = [BucketThrottle]
+    throttle_scope = 'register'
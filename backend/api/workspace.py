@@ -0,0 +1,244 @@
+import json
+import zipfile
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import DatabaseError, transaction
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .models import Text, Annotation, Project, ProjectDerivedData, UserWorkspaceStats
+from .readcache import invalidate_user_projects
+from .revisions import record_revision
+
+FORMAT = 'scriptalium-workspace'
+VERSION = 1
+# Nom du fichier NDJSON dans l'archive zip
+ARCHIVE_MEMBER = 'workspace.ndjson'
+BATCH_SIZE = 500
+# Un lot est aussi envoyé dès que ses lignes dépassent cette taille, pour borner la mémoire de l'import
+BATCH_BYTES = 8 * 1024 * 1024
+# Taille des morceaux envoyés au client pendant l'export
+CHUNK_SIZE = 64 * 1024
+
+PROJECT_FIELDS = ['title', 'description', 'editor_content', 'created_at', 'updated_at']
+TEXT_FIELDS = ['content', 'created_at']
+ANNOTATION_FIELDS = [
+    'node_uuid', 'node_hash', 'comments', 'title', 'description', 'start_index', 'end_index',
+    'selected_text', 'detached', 'created_at',
+]
+DATETIME_FIELDS = {'created_at', 'updated_at'}
+
+
+class WorkspaceImportError(Exception):
+    pass
+
+
+def workspace_querysets(user):
+    """Projets, textes et annotations d'un utilisateur, dans l'ordre où les références doivent être importées."""
+    projects = Project.objects.filter(user=user).order_by('id')
+    annotations = Annotation.objects.filter(Q(project__user=user) | Q(user=user)).order_by('id')
+    texts = Text.objects.filter(id__in=annotations.order_by().values('text_id')).order_by('id')
+    return projects, texts, annotations
+
+
+def _record(kind, instance, fields, **references):
+    record = {'type': kind, 'id': instance.pk}
+    record.update((field, getattr(instance, field)) for field in fields)
+    record.update(references)
+    return record
+
+
+def export_records(user):
+    """Enregistrements de l'espace de travail, lus par curseur côté serveur pour garder une mémoire constante."""
+    yield {'type': 'meta', 'format': FORMAT, 'version': VERSION, 'exported_at': timezone.now()}
+    projects, texts, annotations = workspace_querysets(user)
+    for project in projects.only('id', *PROJECT_FIELDS).iterator(chunk_size=BATCH_SIZE):
+        yield _record('project', project, PROJECT_FIELDS)
+    for text in texts.only('id', *TEXT_FIELDS).iterator(chunk_size=BATCH_SIZE):
+        yield _record('text', text, TEXT_FIELDS)
+    for annotation in annotations.only('id', 'text_id', 'project_id', *ANNOTATION_FIELDS).iterator(
+        chunk_size=BATCH_SIZE
+    ):
+        yield _record(
+            'annotation', annotation, ANNOTATION_FIELDS, text=annotation.text_id, project=annotation.project_id,
+        )
+
+
+def export_ndjson(user):
+    """Export NDJSON regroupé en morceaux d'environ CHUNK_SIZE octets."""
+    chunk = []
+    size = 0
+    for record in export_records(user):
+        line = json.dumps(record, cls=DjangoJSONEncoder, ensure_ascii=False).encode('utf-8') + b'\n'
+        chunk.append(line)
+        size += len(line)
+        if size >= CHUNK_SIZE:
+            yield b''.join(chunk)
+            chunk = []
+            size = 0
+    if chunk:
+        yield b''.join(chunk)
+
+
+class _StreamBuffer:
+    """Destination non positionnable : zipfile y écrit et le générateur la vide au fil de l'eau."""
+
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b''.join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def export_zip(user):
+    buffer = _StreamBuffer()
+    with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED) as archive:
+        info = zipfile.ZipInfo(ARCHIVE_MEMBER, date_time=timezone.localtime().timetuple()[:6])
+        info.compress_type = zipfile.ZIP_DEFLATED
+        with archive.open(info, 'w', force_zip64=True) as member:
+            for chunk in export_ndjson(user):
+                member.write(chunk)
+                data = buffer.drain()
+                if data:
+                    yield data
+    yield buffer.drain()
+
+
+def iter_archive_lines(fileobj):
+    """Lignes NDJSON d'une archive d'export ; `fileobj` doit être positionnable."""
+    try:
+        archive = zipfile.ZipFile(fileobj)
+        member = archive.open(ARCHIVE_MEMBER)
+    except (zipfile.BadZipFile, KeyError):
+        raise WorkspaceImportError(f"Archive invalide : {ARCHIVE_MEMBER} est attendu")
+    with archive, member:
+        yield from member
+
+
+def _fields(record, fields, number):
+    values = {}
+    for field in fields:
+        if field not in record:
+            continue
+        value = record[field]
+        if field in DATETIME_FIELDS and value is not None:
+            value = parse_datetime(value)
+            if value is None:
+                raise WorkspaceImportError(f"Date invalide ({number}) : {field}")
+        values[field] = value
+    return values
+
+
+def _reference(mapping, record, field, number):
+    old_id = record.get(field)
+    if old_id is None:
+        return None
+    if old_id not in mapping:
+        raise WorkspaceImportError(f"Référence inconnue ({number}) : {field} {old_id}")
+    return mapping[old_id]
+
+
+class WorkspaceImporter:
+    """Importe un export NDJSON pour `user` par lots de bulk_create, en renumérotant les identifiants."""
+
+    def __init__(self, user):
+        self.user = user
+        self.project_ids = {}
+        self.text_ids = {}
+        self.pending = []
+        self.pending_type = None
+        self.pending_bytes = 0
+        self.counts = {'projects': 0, 'texts': 0, 'annotations': 0}
+
+    def run(self, lines):
+        """Importe toutes les lignes dans une seule transaction : un import invalide ne laisse aucune donnée."""
+        try:
+            with transaction.atomic():
+                for number, line in enumerate(lines, start=1):
+                    if isinstance(line, bytes):
+                        line = line.decode('utf-8')
+                    line = line.strip()
+                    if not line:
+                        continue
+                    try:
+                        record = json.loads(line)
+                    except ValueError as e:
+                        raise WorkspaceImportError(f"Ligne NDJSON invalide ({number}) : {e}")
+                    if not isinstance(record, dict):
+                        raise WorkspaceImportError(f"Ligne NDJSON invalide ({number}) : un objet est attendu")
+                    self.add(record, number, len(line))
+                self.flush()
+        except (DatabaseError, TypeError, ValueError) as e:
+            raise WorkspaceImportError(f"Import impossible : {e}")
+        return self.counts
+
+    def add(self, record, number, size=0):
+        kind = record.get('type')
+        if kind == 'meta':
+            if record.get('format') != FORMAT or record.get('version') != VERSION:
+                raise WorkspaceImportError("Format d'export non pris en charge")
+            return
+        if kind not in ('project', 'text', 'annotation'):
+            raise WorkspaceImportError(f"Type d'enregistrement inconnu ({number}) : {kind}")
+        if kind != self.pending_type or len(self.pending) >= BATCH_SIZE or self.pending_bytes >= BATCH_BYTES:
+            self.flush()
+            self.pending_type = kind
+        self.pending.append((record, number))
+        self.pending_bytes += size
+
+    def flush(self):
+        if self.pending:
+            getattr(self, f'_create_{self.pending_type}s')(self.pending)
+        self.pending = []
+        self.pending_bytes = 0
+
+    def _create_projects(self, batch):
+        projects = []
+        summaries = []
+        for record, number in batch:
+            project = Project(user=self.user, **_fields(record, PROJECT_FIELDS, number))
+            summaries.append(project.compute_summary()[1:])
+            projects.append(project)
+        Project.objects.bulk_create(projects)
+        invalidate_user_projects(self.user.pk)
+        UserWorkspaceStats.record(
+            self.user.pk, projects=len(projects), words=sum(project.word_count for project in projects),
+        )
+        derived = []
+        for (record, _), project, (text, parsed) in zip(batch, projects, summaries):
+            self.project_ids[record.get('id')] = project.id
+            project.update_search_vector(text)
+            record_revision(project, None, user=self.user)
+            derived.append(ProjectDerivedData.build(project, text, parsed))
+        ProjectDerivedData.objects.bulk_create(derived)
+        self.counts['projects'] += len(projects)
+
+    def _create_texts(self, batch):
+        texts = Text.objects.bulk_create([Text(**_fields(record, TEXT_FIELDS, number)) for record, number in batch])
+        for (record, _), text in zip(batch, texts):
+            self.text_ids[record.get('id')] = text.id
+        self.counts['texts'] += len(texts)
+
+    def _create_annotations(self, batch):
+        annotations = Annotation.objects.bulk_create([
+            Annotation(
+                user=self.user,
+                text_id=_reference(self.text_ids, record, 'text', number),
+                project_id=_reference(self.project_ids, record, 'project', number),
+                **_fields(record, ANNOTATION_FIELDS, number),
+            )
+            for record, number in batch
+        ])
+        Annotation.objects.filter(id__in=[annotation.id for annotation in annotations]).update_search_vectors()
+        UserWorkspaceStats.record(self.user.pk, annotations=len(annotations))
+        self.counts['annotations'] += len(annotations)
@@ -0,0 +1,18 @@
+# Configuration lue par gunicorn depuis le répertoire de travail (/app dans l'image)
+import sys
+
+# Chaque worker ouvre ses propres connexions : l'application n'est pas chargée dans le maître
+preload_app = False
+
+
+def post_fork(server, worker):
+    # Si l'application a quand même été préchargée (--preload), ne pas réutiliser dans le worker
+    # les connexions ou le pool ouverts par le maître
+    if 'django.db' not in sys.modules:
+        return
+    from django.db import connections
+
+    for connection in connections.all(initialized_only=True):
+        connection.close()
+        if hasattr(connection, 'close_pool'):
+            connection.close_pool()
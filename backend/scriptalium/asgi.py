@@ -13,4 +13,21 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'scriptalium.settings')
 
-application = get_asgi_application()
+# Initialiser Django avant d'importer les consumers qui dépendent des modèles
+django_asgi_app = get_asgi_application()
+
+from channels.routing import ProtocolTypeRouter, URLRouter  # noqa: E402
+from channels.security.websocket import OriginValidator  # noqa: E402
+from channels.sessions import CookieMiddleware  # noqa: E402
+from django.conf import settings  # noqa: E402
+
+from api.authentication import CookieJWTAuthMiddleware  # noqa: E402
+from api.routing import websocket_urlpatterns  # noqa: E402
+
+application = ProtocolTypeRouter({
+    'http': django_asgi_app,
+    'websocket': OriginValidator(
+        CookieMiddleware(CookieJWTAuthMiddleware(URLRouter(websocket_urlpatterns))),
+        settings.CORS_ALLOWED_ORIGINS,
+    ),
+})
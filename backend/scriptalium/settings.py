@@ -61,6 +61,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'api.middleware.InstrumentationMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -71,6 +72,13 @@ MIDDLEWARE = [
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
+# Instrumentation des requêtes exposée sur /metrics (par processus, label worker)
+METRICS_ENABLED = config('METRICS_ENABLED', default=True, cast=bool)
+# Avertissement dans le journal api.metrics au-delà de ce nombre de requêtes SQL
+METRICS_QUERY_BUDGET = config('METRICS_QUERY_BUDGET', default=20, cast=int)
+# Jeton attendu dans l'en-tête Authorization: Bearer ; sans jeton, /metrics refuse tout accès
+METRICS_TOKEN = config('METRICS_TOKEN', default='')
+
 ROOT_URLCONF = 'scriptalium.urls'
 
 TEMPLATES = [
@@ -90,23 +98,120 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'scriptalium.wsgi.application'
+ASGI_APPLICATION = 'scriptalium.asgi.application'
+
+# 'wsgi' (gunicorn synchrone) ou 'asgi' (gunicorn + workers uvicorn)
+SERVER_MODE = config('SERVER_MODE', default='wsgi')
+# Nombre de processus du serveur, lu aussi par gunicorn. Au-delà d'un, l'état partagé entre
+# requêtes (couche de canaux, caches) doit vivre dans Redis : manage.py check le vérifie.
+WEB_CONCURRENCY = config('WEB_CONCURRENCY', default=1, cast=int)
+# Redis commun à tous les processus : cache par défaut et couche de canaux
+REDIS_URL = config('REDIS_URL', default='')
+# Vues asynchrones pour les routes les plus sollicitées, activées par défaut en mode ASGI
+ASYNC_VIEWS = config('ASYNC_VIEWS', default=SERVER_MODE == 'asgi', cast=bool)
+
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+        },
+    }
+
+# Édition collaborative : chaque projet a un processus propriétaire, inscrit dans le cache par
+# défaut, auquel les autres processus transmettent les mises à jour par la couche de canaux.
+# La couche en mémoire ne convient qu'à un seul processus. Un message envoyé à un canal plein
+# (COLLAB_CHANNEL_CAPACITY messages en attente) est perdu : l'éditeur concerné est resynchronisé.
+COLLAB_CHANNEL_CAPACITY = config('COLLAB_CHANNEL_CAPACITY', default=1000, cast=int)
+if REDIS_URL:
+    CHANNEL_LAYERS = {
+        'default': {
+            'BACKEND': 'channels_redis.core.RedisChannelLayer',
+            # Sans délai de lecture : l'attente bloquante de la couche (5 s) atteindrait celui de redis-py
+            'CONFIG': {'hosts': [{'address': REDIS_URL, 'socket_timeout': None}], 'capacity': COLLAB_CHANNEL_CAPACITY},
+        },
+    }
+else:
+    CHANNEL_LAYERS = {
+        'default': {
+            'BACKEND': 'channels.layers.InMemoryChannelLayer',
+            'CONFIG': {'capacity': COLLAB_CHANNEL_CAPACITY},
+        },
+    }
+COLLAB_COMPACT_EVERY = config('COLLAB_COMPACT_EVERY', default=50, cast=int)
+# Durée (en secondes) de l'inscription du processus propriétaire d'un projet, renouvelée tant
+# que des éditeurs sont connectés ; un propriétaire arrêté est remplacé après ce délai
+COLLAB_OWNER_TTL = config('COLLAB_OWNER_TTL', default=30, cast=int)
+
+# Nombre de morceaux envoyés avec le manifeste d'un projet découpé ; les suivants sont demandés par Range
+PROJECT_CHUNKS_FIRST = config('PROJECT_CHUNKS_FIRST', default=1, cast=int)
+
+# Niveau de compression gzip (1 à 9) du contenu des projets stocké en base
+EDITOR_CONTENT_COMPRESSION_LEVEL = config('EDITOR_CONTENT_COMPRESSION_LEVEL', default=6, cast=int)
+
+# Historique des révisions : une image complète toutes les PROJECT_REVISION_KEYFRAME_INTERVAL
+# révisions, des patchs JSON entre deux. Reconstruire une révision rejoue au plus ce nombre de patchs.
+PROJECT_REVISION_KEYFRAME_INTERVAL = config('PROJECT_REVISION_KEYFRAME_INTERVAL', default=20, cast=int)
 
 
 # Database
 # https://docs.djangoproject.com/en/5.1/ref/settings/#databases
 
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.postgresql',
-        'NAME': config('DB_NAME'),
-        'USER': config('DB_USER'),
-        'PASSWORD': config('DB_PASSWORD'),
-        'HOST': config('DB_HOST', 'db'),
-        'PORT': config('DB_PORT', default='5432'),
+# Pool de connexions psycopg, un par processus worker (créé à la première requête, donc après le fork).
+# Sans pool, les connexions sont gardées DB_CONN_MAX_AGE secondes et vérifiées avant réutilisation,
+# sauf en mode ASGI : chaque fil de sync_to_async y garderait la sienne, jusqu'à épuiser le serveur.
+DB_POOL = config('DB_POOL', default=True, cast=bool)
+
+# 'sqlite' pour un essai local (par exemple les mesures de manage.py run_benchmark) ; PostgreSQL sinon
+DB_ENGINE = config('DB_ENGINE', default='postgresql')
+
+if DB_ENGINE == 'sqlite':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': config('SQLITE_PATH', default=str(BASE_DIR / 'db.sqlite3')),
+        }
+    }
+else:
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': config('DB_NAME'),
+            'USER': config('DB_USER'),
+            'PASSWORD': config('DB_PASSWORD'),
+            'HOST': config('DB_HOST', 'db'),
+            'PORT': config('DB_PORT', default='5432'),
+            # Le pool gère lui-même la durée de vie des connexions
+            'CONN_MAX_AGE': 0 if DB_POOL or SERVER_MODE == 'asgi' else config('DB_CONN_MAX_AGE', default=60, cast=int),
+            'CONN_HEALTH_CHECKS': True,
+            'OPTIONS': {},
+        }
+    }
+
+if DB_ENGINE != 'sqlite' and DB_POOL:
+    # CONN_HEALTH_CHECKS fait vérifier chaque connexion par le pool avant de la confier à une requête
+    DATABASES['default']['OPTIONS']['pool'] = {
+        'min_size': config('DB_POOL_MIN_SIZE', default=2, cast=int),
+        'max_size': config('DB_POOL_MAX_SIZE', default=10, cast=int),
+        # Attente maximale d'une connexion libre avant erreur
+        'timeout': config('DB_POOL_TIMEOUT', default=10, cast=float),
+        'max_idle': config('DB_POOL_MAX_IDLE', default=300, cast=float),
+        'max_lifetime': config('DB_POOL_MAX_LIFETIME', default=1800, cast=float),
     }
-}
 
 
+# Coût du hachage des mots de passe : chaque connexion paie PASSWORD_PBKDF2_ITERATIONS itérations
+# (870 000 par défaut, la valeur de Django 5.1). Les mots de passe sont recalculés au nouveau
+# réglage à la connexion suivante.
+PASSWORD_PBKDF2_ITERATIONS = config('PASSWORD_PBKDF2_ITERATIONS', default=870000, cast=int)
+PASSWORD_HASHERS = [
+    'api.hashers.PBKDF2PasswordHasher',
+    'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+    'django.contrib.auth.hashers.Argon2PasswordHasher',
+    'django.contrib.auth.hashers.BCryptSHA256PasswordHasher',
+    'django.contrib.auth.hashers.ScryptPasswordHasher',
+]
+
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
 
@@ -152,6 +257,47 @@ SIMPLE_JWT = {
     'AUTH_COOKIE_HTTP_ONLY': True, 
     'AUTH_COOKIE_SAMESITE': 'Lax',
 }
+# Rafraîchissement sans lecture en base : chaque jeton de rafraîchissement utilisé est remplacé
+# et révoqué (liste de révocation dans le cache JWT_REVOCATION_CACHE ; avec plusieurs processus,
+# manage.py check exige un cache partagé, Redis avec REDIS_URL).
+# Un jeton remplacé présenté de nouveau après JWT_REFRESH_REUSE_GRACE secondes révoque la session.
+JWT_ROTATE_REFRESH = config('JWT_ROTATE_REFRESH', default=True, cast=bool)
+JWT_REFRESH_REUSE_GRACE = config('JWT_REFRESH_REUSE_GRACE', default=30, cast=int)
+JWT_REVOCATION_CACHE = config('JWT_REVOCATION_CACHE', default='default')
+# Utilisateur construit à partir des claims du jeton, sans requête à chaque appel
+JWT_STATELESS_USER = config('JWT_STATELESS_USER', default=True, cast=bool)
+# Durée (en secondes) pendant laquelle le statut actif d'un utilisateur est mis en cache
+JWT_USER_STATUS_TTL = config('JWT_USER_STATUS_TTL', default=60, cast=int)
+
+# Limitation par seau à jetons : débit soutenu ('N/s|min|hour|day') et rafale autorisée
+# 'local' garde les seaux en mémoire du processus, 'cache' les partage via le cache Django
+THROTTLE_BACKEND = config('THROTTLE_BACKEND', default='local')
+THROTTLE_BUCKETS = {
+    'login': {'rate': '10/min', 'burst': 5},
+    'register': {'rate': '5/hour', 'burst': 3},
+    'project_save': {'rate': '60/min', 'burst': 20},
+}
+
+# Cache de lecture du détail des projets et des listes par utilisateur : LRU du processus
+# (READ_CACHE_MAX_BYTES octets sérialisés, READ_CACHE_TIMEOUT secondes) devant le cache Django
+# partagé READ_CACHE_SHARED, où sont tenues les versions invalidées après chaque écriture.
+# Sans cache partagé (ou avec un cache propre au processus), le cache de lecture est désactivé :
+# les autres processus serviraient l'ancienne version. Les contenus de plus de
+# READ_CACHE_MAX_CONTENT caractères ne sont pas mis en cache.
+READ_CACHE_ENABLED = config('READ_CACHE_ENABLED', default=True, cast=bool)
+READ_CACHE_MAX_BYTES = config('READ_CACHE_MAX_BYTES', default=64 * 1024 * 1024, cast=int)
+READ_CACHE_TIMEOUT = config('READ_CACHE_TIMEOUT', default=60, cast=int)
+READ_CACHE_MAX_CONTENT = config('READ_CACHE_MAX_CONTENT', default=1024 * 1024, cast=int)
+READ_CACHE_SHARED = config('READ_CACHE_SHARED', default='default' if REDIS_URL else '')
+
+# Tâches de fond (manage.py runworker) : tentatives, attente exponentielle entre deux essais,
+# intervalle d'interrogation de la file et délai après lequel une tâche bloquée est reprise
+JOB_MAX_ATTEMPTS = config('JOB_MAX_ATTEMPTS', default=5, cast=int)
+JOB_RETRY_BASE = config('JOB_RETRY_BASE', default=5, cast=float)
+JOB_RETRY_MAX = config('JOB_RETRY_MAX', default=600, cast=float)
+JOB_POLL_INTERVAL = config('JOB_POLL_INTERVAL', default=1.0, cast=float)
+JOB_LOCK_TIMEOUT = config('JOB_LOCK_TIMEOUT', default=600, cast=int)
+
 # Internationalization
 # https://docs.djangoproject.com/en/5.1/topics/i18n/
 
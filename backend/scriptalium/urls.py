@@ -1,4 +1,5 @@
 
+from django.conf import settings
 from django.contrib import admin
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
@@ -7,7 +8,15 @@ from api.views import (
     get_csrf_token,
     create_text,
     add_annotation,
+    bulk_add_annotations,
+    text_annotations,
+    search,
+    export_workspace,
+    import_workspace,
+    metrics,
     ProjectViewSet,
+    AnnotationViewSet,
+    JobViewSet,
     MyTokenObtainPairView,
     MyTokenRefreshView,
     UserView,
@@ -17,9 +26,12 @@ from api.views import (
 
 router = DefaultRouter()
 router.register(r'projects', ProjectViewSet, basename='project')
+router.register(r'annotations', AnnotationViewSet, basename='annotation')
+router.register(r'jobs', JobViewSet, basename='job')
 
 urlpatterns = [
     path('admin/', admin.site.urls),
+    path('metrics', metrics, name='metrics'),
     path('api/register/', RegisterView.as_view(), name='register'),
     path('api/auth/login/', MyTokenObtainPairView.as_view(), name='token_obtain_pair'),
     path('api/auth/token/refresh/', MyTokenRefreshView.as_view(), name='token_refresh'),
@@ -27,7 +39,22 @@ urlpatterns = [
     path('api/auth/logout/', LogoutView.as_view(), name='logout'),
     path('api/texts/', create_text, name='create_text'),
     path('api/texts/add-annotation/', add_annotation, name='add_annotation'),
+    path('api/texts/add-annotations/', bulk_add_annotations, name='bulk_add_annotations'),
+    path('api/texts/<int:text_id>/annotations/', text_annotations, name='text_annotations'),
     path('api/get-csrf-token/', get_csrf_token, name='get_csrf_token'), 
+    path('api/search/', search, name='search'),
+    path('api/export/', export_workspace, name='export_workspace'),
+    path('api/import/', import_workspace, name='import_workspace'),
     path('api/', include(router.urls)),
     path('api/projects/user/<int:user_id>/', UserProjectListView.as_view(), name='user-projects'),
-]
\ No newline at end of file
+]
+
+if settings.ASYNC_VIEWS:
+    from api import async_views
+
+    # Déclarées avant le routeur pour prendre la main sur les routes équivalentes
+    urlpatterns = [
+        path('api/projects/', async_views.project_list, name='project-list-async'),
+        path('api/projects/<int:pk>/', async_views.project_detail, name='project-detail-async'),
+        path('api/texts/add-annotation/', async_views.add_annotation, name='add_annotation_async'),
+    ] + urlpatterns
@@ -16,7 +16,8 @@ interface Project {
   id: number;
   title: string;
   description: string;
-  editor_content: string;
+  word_count: number;
+  excerpt: string;
   created_at: string;
   updated_at: string;
 }
@@ -26,6 +27,7 @@ export default function ProjectList() {
   const [isModalOpen, setIsModalOpen] = useState(false);
   const [newProject, setNewProject] = useState({ title: '', description: '' });
   const [projectToDelete, setProjectToDelete] = useState<number | null>(null);
+  const [nextPage, setNextPage] = useState<string | null>(null);
   const [csrfToken, setCsrfToken] = useState<string>('');
   const router = useRouter();
 
@@ -54,7 +56,8 @@ export default function ProjectList() {
             'X-CSRFToken': csrfToken,
           },
         });
-        setProjects(projectsResponse.data);
+        setProjects(projectsResponse.data.results);
+        setNextPage(projectsResponse.data.next);
       } catch (error) {
         router.push('/login');
       }
@@ -62,6 +65,19 @@ export default function ProjectList() {
     fetchData();
   }, [apiUrl, router]);
 
+  const loadMoreProjects = async () => {
+    if (!nextPage) {
+      return;
+    }
+    try {
+      const response = await axios.get(nextPage, { withCredentials: true });
+      setProjects(prev => [...prev, ...response.data.results]);
+      setNextPage(response.data.next);
+    } catch (error) {
+      // Gérer l'erreur ici si nécessaire
+    }
+  };
+
   const openModal = () => setIsModalOpen(true);
   const closeModal = () => setIsModalOpen(false);
 
@@ -79,7 +95,7 @@ export default function ProjectList() {
             'X-CSRFToken': csrfToken,
           },
         });
-        setProjects([...projects, response.data]);
+        setProjects([response.data, ...projects]);
         setNewProject({ title: '', description: '' });
         closeModal();
         router.push(`/editor/${response.data.id}`);
@@ -145,6 +161,13 @@ export default function ProjectList() {
                 </CardFooter>
               </Card>
             ))}
+            {nextPage && (
+              <div className="text-center">
+                <Button variant="outline" onClick={loadMoreProjects}>
+                  Charger plus de projets
+                </Button>
+              </div>
+            )}
           </div>
         </div>
       </main>
@@ -8,6 +8,7 @@ import { Button } from "@/components/ui/button";
 import { Notification } from '../notification/Notification';
 import { NavbarComponent } from "@/components/ui/navbar";
 import { Footer } from '@/components/ui/footer';
+import { diffEditorState } from '@/lib/editorPatch';
 
 const LexicalEditor = dynamic(() => import('@/components/editor/index'), { ssr: false });
 
@@ -16,6 +17,7 @@ interface Project {
   title: string;
   description: string;
   editor_content: string;
+  revision: number;
   created_at: string;
   updated_at: string;
 }
@@ -78,20 +80,42 @@ export default function EditorClient() {
     }
 
     try {
-      const updatedProject = {
-        ...project,
-        editor_content: content,
-      };
-      const response = await axios.put(`${apiUrl}/api/projects/${id}/`, updatedProject, {
-        withCredentials: true,
-        headers: {
-          'X-CSRFToken': csrfToken,
-        },
-      });
-      setProject(response.data);
+      const patch = project.editor_content ? diffEditorState(project.editor_content, content) : null;
+      if (patch) {
+        // Envoyer uniquement les blocs modifiés depuis la dernière révision connue
+        const response = await axios.patch(`${apiUrl}/api/projects/${id}/content/`, {
+          base_revision: project.revision,
+          patch,
+        }, {
+          withCredentials: true,
+          headers: {
+            'X-CSRFToken': csrfToken,
+          },
+        });
+        setProject({
+          ...project,
+          editor_content: content,
+          revision: response.data.revision,
+          updated_at: response.data.updated_at,
+        });
+      } else {
+        const updatedProject = {
+          ...project,
+          editor_content: content,
+        };
+        const response = await axios.put(`${apiUrl}/api/projects/${id}/`, updatedProject, {
+          withCredentials: true,
+          headers: {
+            'X-CSRFToken': csrfToken,
+          },
+        });
+        setProject(response.data);
+      }
       setNotification({ message: 'Projet sauvegardé avec succès.', type: 'success' });
     } catch (error) {
-      if (axios.isAxiosError(error)) {
+      if (axios.isAxiosError(error) && error.response?.status === 409) {
+        setNotification({ message: 'Le projet a été modifié ailleurs. Rechargez la page avant de sauvegarder.', type: 'error' });
+      } else if (axios.isAxiosError(error)) {
         console.error('Erreur Axios lors de la sauvegarde du projet:', error.response?.data || error.message);
         setNotification({ message: 'Erreur lors de la sauvegarde du projet.', type: 'error' });
       } else {
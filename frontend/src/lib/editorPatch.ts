@@ -0,0 +1,66 @@
+export interface PatchOperation {
+  op: 'add' | 'remove' | 'replace';
+  path: string;
+  value?: unknown;
+}
+
+interface SerializedRoot {
+  children: unknown[];
+  [key: string]: unknown;
+}
+
+// Calcule un patch JSON (RFC 6902) au niveau des blocs de premier niveau de l'éditeur.
+// Retourne null si l'un des deux états ne peut pas être comparé : il faut alors renvoyer le document complet.
+export function diffEditorState(previous: string, next: string): PatchOperation[] | null {
+  let previousRoot: SerializedRoot;
+  let nextRoot: SerializedRoot;
+  try {
+    previousRoot = JSON.parse(previous).root;
+    nextRoot = JSON.parse(next).root;
+  } catch {
+    return null;
+  }
+  if (!Array.isArray(previousRoot?.children) || !Array.isArray(nextRoot?.children)) {
+    return null;
+  }
+
+  const { children: previousChildren, ...previousAttributes } = previousRoot;
+  const { children: nextChildren, ...nextAttributes } = nextRoot;
+  if (JSON.stringify(previousAttributes) !== JSON.stringify(nextAttributes)) {
+    return [{ op: 'replace', path: '/root', value: nextRoot }];
+  }
+
+  // Les blocs inchangés en tête et en fin sont écartés : un bloc inséré ou supprimé au milieu
+  // du document ne décale plus tous les suivants
+  const previousBlocks = previousChildren.map((child) => JSON.stringify(child));
+  const nextBlocks = nextChildren.map((child) => JSON.stringify(child));
+  const limit = Math.min(previousBlocks.length, nextBlocks.length);
+  let prefix = 0;
+  while (prefix < limit && previousBlocks[prefix] === nextBlocks[prefix]) {
+    prefix++;
+  }
+  let suffix = 0;
+  while (
+    suffix < limit - prefix &&
+    previousBlocks[previousBlocks.length - 1 - suffix] === nextBlocks[nextBlocks.length - 1 - suffix]
+  ) {
+    suffix++;
+  }
+  const previousEnd = previousBlocks.length - suffix;
+  const nextEnd = nextBlocks.length - suffix;
+  const common = Math.min(previousEnd, nextEnd);
+
+  const operations: PatchOperation[] = [];
+  for (let i = prefix; i < common; i++) {
+    if (previousBlocks[i] !== nextBlocks[i]) {
+      operations.push({ op: 'replace', path: `/root/children/${i}`, value: nextChildren[i] });
+    }
+  }
+  for (let i = common; i < nextEnd; i++) {
+    operations.push({ op: 'add', path: `/root/children/${i}`, value: nextChildren[i] });
+  }
+  for (let i = previousEnd - 1; i >= common; i--) {
+    operations.push({ op: 'remove', path: `/root/children/${i}` });
+  }
+  return operations;
+}
@@ -49,6 +49,16 @@ async function handleRefreshToken(request: NextRequest) {
           path: '/',
         });
 
+        // Le backend remplace le jeton de rafraîchissement à chaque utilisation
+        if (data.refresh) {
+          nextResponse.cookies.set('refresh_token', data.refresh, {
+            httpOnly: true,
+            secure: process.env.NODE_ENV === 'production',
+            sameSite: 'lax',
+            path: '/',
+          });
+        }
+
         return nextResponse;
       } else {
         const errorData = await response.json();